@@ -2,6 +2,8 @@ import os.path as path
 
 class Code2Bin():
     """Translates Hack assembly language mnemonics into binary codes"""
+    bin_dicts = {}	# The dicts read from the data files, shared by all instances so that each data file is read once per process
+
     def __init__(self):
         """Build dict for translations"""
         self.comp_dict = self.build_bin_dict('comp.code2bin')
@@ -10,12 +12,15 @@ class Code2Bin():
 
     def build_bin_dict(self, data_file):
         """Read the contents of the data_file into bin_dict"""
+        if data_file in self.bin_dicts:
+            return self.bin_dicts[data_file]
         bin_dict = {}
         with open(path.join(path.dirname(path.realpath(__file__)), 'data', 'code2bin', data_file), 'r', encoding='utf_8') as dataf:
             for line in dataf:
                 command = line.strip().split('\t')[0]
                 binary = line.strip().split('\t')[1]
                 bin_dict[command] = binary
+        self.bin_dicts[data_file] = bin_dict
         return bin_dict
 
     def comp2bin(self, code):
@@ -3,8 +3,15 @@
 import sys
 from parser import Parser
 
-in_file_assembly = sys.argv[1]
-assert '.asm' in in_file_assembly
+def assemble(in_file_assembly):
+    """Translate the assembly file in_file_assembly into a hack file beside it"""
+    assert '.asm' in in_file_assembly
+    psr = Parser(in_file_assembly)
+    psr.parse()
 
-psr = Parser(in_file_assembly)
-psr.parse()
+def main():
+    in_file_assembly = sys.argv[1]
+    assemble(in_file_assembly)
+
+if __name__ == '__main__':
+    main()
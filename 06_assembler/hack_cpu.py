@@ -0,0 +1,154 @@
+from array import array
+from pathlib import Path
+
+from parser import Parser
+
+def alu(zx, nx, zy, ny, f, no):
+    """Returns the function of the Hack ALU for its six control bits, computing out from x (D) and y (A or M) as the ALU chip does"""
+    def compute(x, y):
+        if zx:
+            x = 0
+        if nx:
+            x = ~x
+        if zy:
+            y = 0
+        if ny:
+            y = ~y
+        out = x + y if f else x & y
+        if no:
+            out = ~out
+        return (out + 0x8000 & 0xFFFF) - 0x8000
+    return compute
+
+class HackCPU:
+    """
+    HackCPU: Emulates the Hack computer running a program of its ROM, the .hack file written by the assembler or the .asm file assembled by our Parser, so that a program can be run, tested or instrumented in the process instead of in the CPU emulator of the tools.
+    Each instruction is decoded once, when the program is loaded, into the op table ops: an A-instruction into the int it loads, a C-instruction into a tuple of the function computing its comp, taken from comp_functions, its dest bits and its jump bits. RAM is an array('h') of 32K words, the 16-bit signed values of the registers, so that M is read and written without any conversion, and a negative address reads the word of its low 15 bits as the Hack RAM does.
+    """
+    rom_size = 32768
+    ram_size = 32768	# The data memory, the screen memory map at 16384 and the keyboard at 24576, addressed by 15 bits
+    halt = None	# The op of the 0;JMP of the infinite loop @i, 0;JMP at address i + 1 which ends a Hack program, the run stops there
+    comp_functions = {	# {comp bits a c1 - c6: function(A, D, M) returning out}, the comp mnemonics of the assembler, the other control bits are computed by the alu function
+            0b0101010: lambda A, D, M: 0,
+            0b0111111: lambda A, D, M: 1,
+            0b0111010: lambda A, D, M: -1,
+            0b0001100: lambda A, D, M: D,
+            0b0110000: lambda A, D, M: A,
+            0b1110000: lambda A, D, M: M,
+            0b0001101: lambda A, D, M: ~D,
+            0b0110001: lambda A, D, M: ~A,
+            0b1110001: lambda A, D, M: ~M,
+            0b0001111: lambda A, D, M: (0x8000 - D & 0xFFFF) - 0x8000,
+            0b0110011: lambda A, D, M: (0x8000 - A & 0xFFFF) - 0x8000,
+            0b1110011: lambda A, D, M: (0x8000 - M & 0xFFFF) - 0x8000,
+            0b0011111: lambda A, D, M: (D + 0x8001 & 0xFFFF) - 0x8000,
+            0b0110111: lambda A, D, M: (A + 0x8001 & 0xFFFF) - 0x8000,
+            0b1110111: lambda A, D, M: (M + 0x8001 & 0xFFFF) - 0x8000,
+            0b0001110: lambda A, D, M: (D + 0x7FFF & 0xFFFF) - 0x8000,
+            0b0110010: lambda A, D, M: (A + 0x7FFF & 0xFFFF) - 0x8000,
+            0b1110010: lambda A, D, M: (M + 0x7FFF & 0xFFFF) - 0x8000,
+            0b0000010: lambda A, D, M: (D + A + 0x8000 & 0xFFFF) - 0x8000,
+            0b1000010: lambda A, D, M: (D + M + 0x8000 & 0xFFFF) - 0x8000,
+            0b0010011: lambda A, D, M: (D - A + 0x8000 & 0xFFFF) - 0x8000,
+            0b1010011: lambda A, D, M: (D - M + 0x8000 & 0xFFFF) - 0x8000,
+            0b0000111: lambda A, D, M: (A - D + 0x8000 & 0xFFFF) - 0x8000,
+            0b1000111: lambda A, D, M: (M - D + 0x8000 & 0xFFFF) - 0x8000,
+            0b0000000: lambda A, D, M: D & A,
+            0b1000000: lambda A, D, M: D & M,
+            0b0010101: lambda A, D, M: D | A,
+            0b1010101: lambda A, D, M: D | M,
+            }
+
+    def __init__(self, program=None):
+        self.ram = array('h', bytes(2 * self.ram_size))
+        self.ops = [0] * self.rom_size
+        self.reset()
+        if program is not None:
+            self.load(program)
+
+    def reset(self):
+        """Set the registers to 0, as the reset bit of the computer does, the RAM is kept"""
+        self.A = 0
+        self.D = 0
+        self.PC = 0
+        self.time = 0	# The number of instructions run since the program was loaded
+        self.halted = False
+
+    def read_program(self, program):
+        """Returns the instructions of the .hack or .asm file program as ints"""
+        program = Path(program)
+        assert program.suffix in {'.hack', '.asm'}, "Not a Hack program: {}".format(program)
+        if program.suffix == '.asm':
+            psr = Parser(str(program))
+            psr.read_in_file()
+            psr.translate()
+            binarys = psr.out_binarys
+        else:
+            with open(program, 'r', encoding='utf_8') as inf:
+                binarys = [line.strip() for line in inf if line.strip()]
+        assert len(binarys) <= self.rom_size, "The program does not fit in the ROM."
+        return [int(binary, 2) for binary in binarys]
+
+    def decode(self, instruction):
+        """Returns the op of the instruction"""
+        if not instruction & 0x8000:	# A-instruction
+            return instruction
+        comp = instruction >> 6 & 0b1111111
+        comp_function = self.comp_functions.get(comp)
+        if comp_function is None:	# Not a mnemonic of the assembler, computed by the ALU as the chip does
+            compute = alu(*(comp >> bit & 1 for bit in range(5, -1, -1)))
+            comp_function = (lambda A, D, M: compute(D, M)) if comp & 0b1000000 else (lambda A, D, M: compute(D, A))
+        return (comp_function, instruction >> 3 & 0b111, instruction & 0b111)
+
+    def load(self, program):
+        """Load the .hack or .asm file program into the ROM, decoding each instruction once, and reset the registers"""
+        instructions = self.read_program(program)
+        self.ops = [self.decode(instruction) for instruction in instructions] + [0] * (self.rom_size - len(instructions))	# The empty ROM holds @0 instructions
+        for address in range(len(instructions) - 1):
+            if instructions[address] == address and instructions[address + 1] == 0b1110101010000111:	# @address, 0;JMP
+                self.ops[address + 1] = self.halt
+        self.reset()
+
+    def run(self, max_cycles):
+        """Run at most max_cycles instructions from PC, returns the number of instructions run. The run stops at the infinite loop ending the program, halted is then True."""
+        ops = self.ops
+        ram = self.ram
+        A, D, pc = self.A, self.D, self.PC
+        halt = self.halt
+        cycles = 0
+        self.halted = False
+        while cycles < max_cycles and not self.halted:
+            try:
+                while cycles < max_cycles:
+                    op = ops[pc]
+                    cycles += 1
+                    if op.__class__ is int:	# A-instruction
+                        A = op
+                        pc += 1
+                        continue
+                    if op is halt:
+                        if A == pc - 1 or A == pc:	# Looping forever
+                            self.halted = True
+                            cycles -= 1
+                            break
+                        pc = A & 0x7FFF	# Jumped to from elsewhere, a plain 0;JMP
+                        continue
+                    comp_function, dest, jump = op
+                    out = comp_function(A, D, ram[A])
+                    address = A
+                    if dest:
+                        if dest & 0b001:	# M, at the address in A before it is written
+                            ram[A] = out
+                        if dest & 0b010:
+                            D = out
+                        if dest & 0b100:
+                            A = out
+                    if jump and jump & (0b100 if out < 0 else 0b010 if out == 0 else 0b001):
+                        pc = address & 0x7FFF
+                    else:
+                        pc += 1
+            except IndexError:	# The PC went past the end of the ROM, it wraps to 0 as its 15 bits do
+                pc = 0
+        self.A, self.D, self.PC = A, D, pc
+        self.time += cycles
+        return cycles
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+
+from hack_cpu import HackCPU
+
+def read_script(tst_file):
+    """Returns the commands of the test script tst_file, a command being the list of its words, and a repeat command ['repeat', times, commands of its block]"""
+    with open(tst_file, 'r', encoding='utf_8') as inf:
+        script = re.sub(r'/\*.*?\*/|//[^\n]*', '', inf.read(), flags=re.DOTALL)
+    tokens = re.findall(r'[{},;]|[^\s{},;]+', script)
+    blocks = [[]]
+    words = []
+    for token in tokens:
+        if token in {',', ';', '{'}:
+            if words:
+                blocks[-1].append(words)
+            if token == '{':
+                assert words and words[0] == 'repeat', "{}: only repeat takes a block, not {!r}".format(tst_file, ' '.join(words))
+                blocks.append([])
+            words = []
+        elif token == '}':
+            assert len(blocks) > 1, "{}: '}}' without a block".format(tst_file)
+            block = blocks.pop()
+            blocks[-1][-1].append(block)
+        else:
+            words.append(token)
+    assert len(blocks) == 1, "{}: block not closed".format(tst_file)
+    return blocks[0]
+
+def read_value(value):
+    """Returns the int of a value of a test script, decimal or in the %D, %X or %B format"""
+    bases = {'%D': 10, '%X': 16, '%B': 2}
+    if value[:2] in bases:
+        value = int(value[2:], bases[value[:2]])
+        return value - 0x10000 if value >= 0x8000 else value
+    return int(value)
+
+def format_value(value, value_format, left, width, right):
+    """Returns the column of the value in the output list, written in the format D, X, B or S right-aligned in width, with left and right spaces around it"""
+    if value_format == 'X':
+        value = '{:04X}'.format(value & 0xFFFF)
+    elif value_format == 'B':
+        value = '{:016b}'.format(value & 0xFFFF)
+    return ' ' * left + str(value).rjust(width)[-width:] + ' ' * right
+
+def format_header(location, left, width, right):
+    """Returns the column of the name of the location in the output list, cut to the column and centered in it, the odd space on the right"""
+    name = location[:left + width + right]
+    padding = left + width + right - len(name)
+    return ' ' * (padding // 2) + name + ' ' * (padding - padding // 2)
+
+def run_script(tst_file):
+    """Run the CPU emulator test script tst_file, the loaded program being a .hack or .asm file, writing its output file and comparing it to its compare file. Returns the message of the CPU emulator."""
+    tst_dir = Path(tst_file).parent
+    cpu = HackCPU()
+    registers = {'A', 'D', 'PC', 'time'}	# The attributes of the HackCPU a script reads, and sets but time
+    output_columns = []	# [(register or RAM address, format, left padding, width, right padding)]
+    outf = None
+    compare_lines = None
+    output_lines_num = 0
+
+    def read_location(location):
+        if location in registers:
+            return getattr(cpu, location)
+        match = re.fullmatch(r'RAM\[(\d+)\]', location)
+        assert match, "{}: unknown location {!r}".format(tst_file, location)
+        return cpu.ram[int(match.group(1))]
+
+    def run_commands(commands):
+        """Run the commands, returns False if an output differs from the compare file"""
+        nonlocal outf, compare_lines
+        for command in commands:
+            name = command[0]
+            if name == 'load':
+                cpu.load(tst_dir / command[1])
+            elif name == 'output-file':
+                outf = open(tst_dir / command[1], 'w', encoding='utf_8')
+            elif name == 'compare-to':
+                with open(tst_dir / command[1], 'r', encoding='utf_8') as inf:
+                    compare_lines = [line.rstrip('\r\n') for line in inf]
+            elif name == 'output-list':	# A new list of columns, written from the next line of the output file
+                output_columns.clear()
+                for column in command[1:]:
+                    location, spec = column.split('%')
+                    left, width, right = (int(size) for size in spec[1:].split('.'))
+                    output_columns.append((location, spec[0], left, width, right))
+                if not write_line('|' + '|'.join(format_header(location, left, width, right) for location, value_format, left, width, right in output_columns) + '|'):
+                    return False
+            elif name == 'set':
+                target, value = command[1], read_value(command[2])
+                if target in registers - {'time'}:
+                    setattr(cpu, target, value)
+                else:
+                    match = re.fullmatch(r'RAM\[(\d+)\]', target)
+                    assert match, "{}: unknown location {!r}".format(tst_file, target)
+                    cpu.ram[int(match.group(1))] = value
+            elif name == 'repeat':
+                times, block = int(command[1]), command[2]
+                if block == [['ticktock']]:	# Run the ticks at full speed
+                    cpu.run(times)
+                else:
+                    for _ in range(times):
+                        if not run_commands(block):
+                            return False
+            elif name == 'ticktock':
+                cpu.run(1)
+            elif name == 'output':
+                if not write_line('|' + '|'.join(format_value(read_location(location), *column) for location, *column in output_columns) + '|'):
+                    return False
+            elif name in {'echo', 'clear-echo'}:
+                pass
+            else:
+                assert False, "{}: unknown command {!r}".format(tst_file, name)
+        return True
+
+    def write_line(line):
+        """Write the line to the output file, returns False if it differs from the line of the compare file"""
+        nonlocal output_lines_num
+        if outf is not None:
+            outf.write(line + '\n')
+        output_lines_num += 1
+        if compare_lines is not None:
+            compare_line = compare_lines[output_lines_num - 1] if output_lines_num <= len(compare_lines) else ''
+            return line.split() == compare_line.split()
+        return True
+
+    try:
+        succeeded = run_commands(read_script(tst_file))
+    finally:
+        if outf is not None:
+            outf.close()
+    if not succeeded:
+        return 'Comparison failure at line {}'.format(output_lines_num)
+    if compare_lines is not None:
+        return 'End of script - Comparison ended successfully'
+    return 'End of script'
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Run a Hack program, or a CPU emulator test script')
+    arg_parser.add_argument('path_input', help='The path of the program *.hack or *.asm, or of the test script *.tst')
+    arg_parser.add_argument('--cycles', type=int, default=10000000, help='The most instructions to run the program for, it stops earlier at the infinite loop ending it')
+    arg_parser.add_argument('--set', nargs='+', default=[], metavar='ADDRESS=VALUE', help='Write the values to the RAM before running the program')
+    arg_parser.add_argument('--ram', nargs='+', type=int, default=[], metavar='ADDRESS', help='Print the words of the RAM at these addresses after running the program')
+    args = arg_parser.parse_args()
+
+    path_input = Path(args.path_input)
+    assert path_input.exists(), "Path not exists."
+    if path_input.suffix == '.tst':
+        message = run_script(path_input)
+        print(message)
+        if message.startswith('Comparison failure'):
+            sys.exit(1)
+        return
+    cpu = HackCPU(path_input)
+    for assignment in args.set:
+        address, value = assignment.split('=')
+        cpu.ram[int(address)] = read_value(value)
+    start = time.perf_counter()
+    cycles = cpu.run(args.cycles)
+    elapsed = time.perf_counter() - start
+    print('{} {} instructions in {:.3f} s, {:.0f} instructions/s'.format('Halted after' if cpu.halted else 'Ran', cycles, elapsed, cycles / elapsed if elapsed else 0))
+    for address in args.ram:
+        print('RAM[{}] = {}'.format(address, cpu.ram[address]))
+
+if __name__ == '__main__':
+    main()
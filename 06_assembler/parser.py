@@ -3,6 +3,8 @@ from symbol_table import SymbolTable
 
 class Parser():
     """Parser: Encapsulates access to the input code. Reads an assembly language command, parses it, and provides convenient access to the command's components (fields and symbols). In addition, removes all white space and comments."""
+    # Binary codes of the commands translated the same way in every program (C-commands and @decimal), shared by all the parsers of a process so that a long running process assembles each of them only once
+    command_binarys = {}
 
     def __init__(self, in_file):
         """Get the input file and gets ready to parse it. Instantiate a Code2bin for binary translation"""
@@ -21,6 +23,9 @@ class Parser():
                 if not command:
                     continue
                 self.code_contents.append(command)
+                if command in self.command_binarys:	# Already assembled in an earlier program, so not a label
+                    ROM_address += 1
+                    continue
                 cmd_type = self.command_type(command)
                 if cmd_type == 'L_COMMAND':	# cmd_type is 'L_COMMAND', add new entry to the symbol table
                     symbol = self.get_symbol(command)
@@ -68,12 +73,18 @@ class Parser():
         """Second pass, translate code_contents to binary contens"""
         self.out_binarys = []
         available_RAM_address = 16
+        command_binarys = self.command_binarys
         for command in self.code_contents:
+            binary_line = command_binarys.get(command)
+            if binary_line is not None:
+                self.out_binarys.append(binary_line)
+                continue
             cmd_type = self.command_type(command)
             if cmd_type == 'A_COMMAND':
                 symbol = self.get_symbol(command)
                 if symbol.isdigit():
                     binary_line =  '0{:015b}'.format(int(symbol))
+                    command_binarys[command] = binary_line
                     self.out_binarys.append(binary_line)
                 elif self.symb_table.contains(symbol):
                     binary_line =  '0{:015b}'.format(int(self.symb_table.get_address(symbol)))
@@ -89,6 +100,7 @@ class Parser():
                 comp_binary = self.code2bin.comp2bin(comp)
                 jump_binary = self.code2bin.jump2bin(jump)
                 binary_line =  '111' + comp_binary + dest_binary + jump_binary
+                command_binarys[command] = binary_line
                 self.out_binarys.append(binary_line)
 
     def write_out_binarys(self):
@@ -2,6 +2,8 @@ import os.path as path
 
 class SymbolTable():
     """SymbolTable: Keeps a correspondence between symbolic labels and numeric addresses."""
+    predefined_symbols = {}	# Read from the data file by the first instance, and copied by every instance
+
     def __init__(self):
         """Get the code_contents and creates a new empty symbol table"""
         self.symbol_table = {}
@@ -9,12 +11,16 @@ class SymbolTable():
 
     def add_predefined_symbols(self):
         """Initialize the symbol table with all the predefined symbols and their pre-allocated RAM addresses"""
+        if self.predefined_symbols:
+            self.symbol_table.update(self.predefined_symbols)
+            return
         cwd = path.dirname(path.realpath(__file__))
         predefined_symbol_file = path.join(cwd, 'data', 'predefined.symbols')
         with open(predefined_symbol_file, 'r', encoding='utf_8') as inf:
             for line in inf:
                 symbol, RAM_address = line.strip().split('\t')
-                self.symbol_table[symbol] = RAM_address
+                self.predefined_symbols[symbol] = RAM_address
+        self.symbol_table.update(self.predefined_symbols)
 
     def add_entry(self, symbol, address):
         """Adds the pair (symbol, address) to the table"""
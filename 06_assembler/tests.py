@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+
+import unittest
+import tempfile
+from pathlib import Path
+
+from hack_cpu import HackCPU, alu
+from code_to_bin import Code2Bin
+
+def wrap_int16(value):
+    return (value + 0x8000 & 0xFFFF) - 0x8000
+
+class HackCPUTest(unittest.TestCase):
+    values = (0, 1, -1, 2, 5, -7, 0x5555, -0x5556, 32767, -32768)
+    comps = {	# {comp mnemonic: out(A, D, M)}, as specified for the Hack ALU
+            '0': lambda A, D, M: 0, '1': lambda A, D, M: 1, '-1': lambda A, D, M: -1,
+            'D': lambda A, D, M: D, 'A': lambda A, D, M: A, 'M': lambda A, D, M: M,
+            '!D': lambda A, D, M: ~D, '!A': lambda A, D, M: ~A, '!M': lambda A, D, M: ~M,
+            '-D': lambda A, D, M: -D, '-A': lambda A, D, M: -A, '-M': lambda A, D, M: -M,
+            'D+1': lambda A, D, M: D + 1, 'A+1': lambda A, D, M: A + 1, 'M+1': lambda A, D, M: M + 1,
+            'D-1': lambda A, D, M: D - 1, 'A-1': lambda A, D, M: A - 1, 'M-1': lambda A, D, M: M - 1,
+            'D+A': lambda A, D, M: D + A, 'D+M': lambda A, D, M: D + M, 'D-A': lambda A, D, M: D - A,
+            'D-M': lambda A, D, M: D - M, 'A-D': lambda A, D, M: A - D, 'M-D': lambda A, D, M: M - D,
+            'D&A': lambda A, D, M: D & A, 'D&M': lambda A, D, M: D & M, 'D|A': lambda A, D, M: D | A, 'D|M': lambda A, D, M: D | M,
+            }
+
+    def run_program(self, asm_code, ram=None, max_cycles=10000):
+        """Run the program asm_code, its lines joined, on a HackCPU whose RAM holds {address: value} ram first, returns the HackCPU and the number of instructions run"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            program = Path(tmp_dir) / 'Prog.asm'
+            program.write_text('\n'.join(asm_code) + '\n')
+            cpu = HackCPU(program)
+        for address, value in (ram or {}).items():
+            cpu.ram[address] = value
+        return cpu, cpu.run(max_cycles)
+
+    def test_comp_mnemonics(self):
+        code_to_bin = Code2Bin()
+        for comp, out in self.comps.items():
+            comp_bits = int(code_to_bin.comp2bin(comp), 2)
+            comp_function = HackCPU().decode(0b1110000000010000 | comp_bits << 6)[0]
+            compute = alu(*(comp_bits >> bit & 1 for bit in range(5, -1, -1)))
+            for A, D, M in zip(self.values, self.values[3:] + self.values[:3], self.values[6:] + self.values[:6]):
+                with self.subTest(comp=comp, A=A, D=D, M=M):
+                    self.assertEqual(comp_function(A, D, M), wrap_int16(out(A, D, M)))
+                    self.assertEqual(compute(D, M if comp_bits & 0b1000000 else A), wrap_int16(out(A, D, M)))
+
+    def test_alu_control_bits_without_mnemonic(self):
+        computes = {	# {zx nx zy ny f no: out(x, y)}
+                0b000001: lambda x, y: ~(x & y),
+                0b000011: lambda x, y: ~(x + y),
+                0b100011: lambda x, y: ~y,
+                0b011000: lambda x, y: 0,
+                0b010100: lambda x, y: ~x & ~y,
+                0b111110: lambda x, y: -2,
+                0b110110: lambda x, y: ~y - 1,
+                }
+        for control_bits, out in computes.items():
+            for a_bit in (0, 1):
+                comp_function = HackCPU().decode(0b1110000000010000 | a_bit << 12 | control_bits << 6)[0]
+                for A, D, M in zip(self.values, self.values[3:] + self.values[:3], self.values[6:] + self.values[:6]):
+                    with self.subTest(control_bits=bin(control_bits), a_bit=a_bit, A=A, D=D, M=M):
+                        self.assertEqual(comp_function(A, D, M), wrap_int16(out(D, M if a_bit else A)))
+
+    def test_jumps(self):
+        jumps = {'JGT': lambda out: out > 0, 'JEQ': lambda out: out == 0, 'JGE': lambda out: out >= 0, 'JLT': lambda out: out < 0, 'JNE': lambda out: out != 0, 'JLE': lambda out: out <= 0, 'JMP': lambda out: True}
+        for jump, jumped in jumps.items():
+            asm_code = ['@R0', 'D=M', '@JUMPED', 'D;' + jump, '@R1', 'M=1', '(END)', '@END', '0;JMP', '(JUMPED)', '@R1', 'M=-1', '(HALT)', '@HALT', '0;JMP']
+            for value in self.values:
+                with self.subTest(jump=jump, value=value):
+                    cpu, cycles = self.run_program(asm_code, {0: value})
+                    self.assertTrue(cpu.halted)
+                    self.assertEqual(cpu.ram[1], -1 if jumped(value) else 1)
+
+    def test_halt(self):
+        cpu, cycles = self.run_program(['@5', 'D=A', '@R0', 'M=D', '(END)', '@END', '0;JMP'])
+        self.assertTrue(cpu.halted)
+        self.assertEqual(cycles, 5)	# The 0;JMP of the halt is not run
+        self.assertEqual((cpu.PC, cpu.time, cpu.ram[0]), (5, 5, 5))
+        self.assertEqual(cpu.run(100), 0)
+        self.assertTrue(cpu.halted)
+        # Jumped to, the 0;JMP after @4 jumps on to the address in A, which the jump wrote
+        cpu, cycles = self.run_program(['@6', 'D=A', '@5', 'A=D;JMP', '@4', '0;JMP', '@R0', 'M=-1', '(END)', '@END', '0;JMP'], max_cycles=100)
+        self.assertTrue(cpu.halted)
+        self.assertEqual((cpu.PC, cpu.ram[0]), (9, -1))
+        # Not halted before max_cycles, the run goes on from PC
+        cpu, cycles = self.run_program(['@R0', 'M=M+1', '@0', '0;JMP'], max_cycles=1001)
+        self.assertFalse(cpu.halted)
+        self.assertEqual((cycles, cpu.ram[0]), (1001, 250))
+        self.assertEqual(cpu.run(3), 3)
+        self.assertEqual(cpu.ram[0], 251)
+
+    def test_16_bit_wrap(self):
+        cpu, cycles = self.run_program(['@32767', 'D=A', 'D=D+1', '@R0', 'M=D', 'M=-M', '@R1', 'M=D-1', 'M=M+1', '@R2', 'M=0', 'M=M-1', 'M=!M', '(END)', '@END', '0;JMP'])
+        self.assertEqual(cpu.ram.typecode, 'h')
+        self.assertEqual((cpu.D, cpu.ram[0], cpu.ram[1], cpu.ram[2]), (-32768, -32768, -32768, 0))
+
+    def test_negative_address(self):
+        # A negative A addresses the word of its low 15 bits: -1 is 32767, -32768 is 0
+        cpu, cycles = self.run_program(['@0', 'A=!A', 'M=1', 'D=A', '@32767', 'D=D-A', 'A=D', 'M=D', '(END)', '@END', '0;JMP'])
+        self.assertEqual((cpu.ram[32767], cpu.ram[0]), (1, -32768))
+
+    def test_asm_and_hack_files(self):
+        test_dir = Path.cwd() / 'test/max'
+        for program in ('Max.asm', 'Max.hack', 'MaxL.asm', 'MaxL.hack'):
+            for a, b in ((3, 7), (7, 3), (-5, -9), (0, 0)):
+                with self.subTest(program=program, a=a, b=b):
+                    cpu = HackCPU(test_dir / program)
+                    cpu.ram[0], cpu.ram[1] = a, b
+                    cpu.run(1000)
+                    self.assertTrue(cpu.halted)
+                    self.assertEqual(cpu.ram[2], max(a, b))
+        self.assertEqual(HackCPU(test_dir / 'Max.asm').ops, HackCPU(test_dir / 'Max.hack').ops)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ from code_writer import CodeWriter
 
 arg_parser = argparse.ArgumentParser(description='Translate vm code into assembly code')
 arg_parser.add_argument('path_input', help='The path for vm file *.vm or the directory path which contains *.vm files')
+arg_parser.add_argument('--compare-routines', action='store_true', help='Write eq, gt and lt once, as shared routines jumped to by every comparison, for a smaller but slower program')
 args = arg_parser.parse_args()
 
 
@@ -29,6 +30,6 @@ else:	# Translate one vm file
     psr = Parser(vmfile)
     returned_contents = psr.parse()
 
-cw = CodeWriter(returned_contents, out_asm_file)
+cw = CodeWriter(returned_contents, out_asm_file, args.compare_routines)
 cw.write()
 print('Successfully translate to assembly ' + out_asm_file.as_posix())
@@ -1,8 +1,14 @@
+from parser import C_ARITHMETIC, C_PUSH, C_POP
+
 class CodeWriter:
     """CodeWriter: Translates VM commands into Hack assembly code."""
-    def __init__(self, code_contents, out_file):
+    end_of_program_label = '$$END'
+
+    def __init__(self, code_contents, out_file, use_compare_routines=False):
         self.out_file = out_file
         self.code_contents = code_contents
+        self.use_compare_routines = use_compare_routines	# Jump to one shared routine per comparison operator instead of writing the comparison at every eq, gt and lt
+        self.compare_operators_used = set()
         self.setup_for_asm_code_translation()
 
     def setup_for_asm_code_translation(self):
@@ -61,6 +67,8 @@ class CodeWriter:
                     'A=M-1',
                     self.asm_code_operator_dict[operator],
                 ]
+        elif self.use_compare_routines:	# operator is 'eq' or 'gt' or 'lt'
+            assembly_codes = self.translate_compare_call(filename, operator, command_index)
         else:	# operator is 'eq' or 'gt' or 'lt':
             op_upper = operator.upper()
             assembly_codes = [
@@ -81,10 +89,61 @@ class CodeWriter:
                 ]
         return assembly_codes
 
+    def translate_compare_call(self, filename, operator, command_index):
+        """Generate the assembly code of a comparison (eq, gt or lt) jumping to the shared routine of the operator, with the return address in D"""
+        self.compare_operators_used.add(operator)
+        return_label = 'RETURN_FROM_{}_{}_{}'.format(operator.upper(), filename, command_index)
+        assembly_codes = [
+                '@{}'.format(return_label),
+                'D=A',	# D=return address
+                '@$${}'.format(operator.upper()),
+                '0;JMP',	# jump to the shared routine of the operator
+                '({})'.format(return_label),
+                ]
+        return assembly_codes
+
+    def write_compare_routine(self, operator):
+        """Generate the shared routine of the comparison operator (eq, gt or lt): replaces X and Y on the stack by X operator Y, then jumps to the return address given in D"""
+        op_upper = operator.upper()
+        assembly_codes = [
+                '($${})'.format(op_upper),
+                '@R13',
+                'M=D',	# R13=return address
+                *self.asm_code_arithmetic_make_DeqY_MeqX_SPminus1,
+                'D=M-D',	# D=X-Y
+                'M=0',	# X=False
+                '@$${}_TRUE'.format(op_upper),
+                'D;J{}'.format(op_upper),	# if D compares to 0 using specified operator succeeds, jump to label specified above
+                '@R13',
+                'A=M',
+                '0;JMP',	# return with X=False
+                '($${}_TRUE)'.format(op_upper),
+                '@SP',
+                'A=M-1',
+                'M=-1',	# D compares to 0 succeeds, so M=True(-1)
+                '@R13',
+                'A=M',
+                '0;JMP',	# return with X=True
+                ]
+        return assembly_codes
+
+    def write_shared_routines(self):
+        """Generate the shared routines used by the program, after an endless loop which ends the program so that it does not run on into them"""
+        if not self.compare_operators_used:
+            return []
+        assembly_codes = [
+                '({})'.format(self.end_of_program_label),
+                '@{}'.format(self.end_of_program_label),
+                '0;JMP',
+                ]
+        for operator in sorted(self.compare_operators_used):
+            assembly_codes += self.write_compare_routine(operator)
+        return assembly_codes
+
     def translate_push_pop(self, filename, cmd_type, memory_segment, memory_index):
         """Generate the assembly code that is the translation of the given push or pop memory access command."""
         assembly_codes = []
-        if cmd_type == 'C_PUSH':
+        if cmd_type == C_PUSH:
             if memory_segment == 'constant':
                 assembly_codes = [
                         	  '@{}'.format(memory_index),	# A=constant i
@@ -115,7 +174,7 @@ class CodeWriter:
                                   'D=M',	# Get the content to D
                                   *self.asm_code_memory_push_content_in_D,
                                  ]
-        else:	# cmd_type == 'C_POP'
+        else:	# cmd_type == C_POP
             if memory_segment == 'static':
                 assembly_codes = [
                                   '@{}.{}'.format(filename, memory_index),	# Trick: static j should be translated to @filename.j
@@ -145,15 +204,15 @@ class CodeWriter:
         output_codes = []
         for filename, command_contents in self.code_contents.items():
             for command_index, command_content in enumerate(command_contents):
-                cmd_type = command_content[0]
-                command = command_content[-1]
+                cmd_type = command_content.cmd_type
+                command = command_content.command
                 assembly_codes = []
-                if cmd_type == 'C_ARITHMETIC':
-                    operator = command_content[1]
+                if cmd_type == C_ARITHMETIC:
+                    operator = command_content.arguments
                     # Pass filename and command_index to translate_arithmetic method for generating unique labels at runtime
                     assembly_codes = self.translate_arithmetic(filename, operator, command_index)
-                elif cmd_type == 'C_PUSH' or cmd_type == 'C_POP':
-                    memory_segment, memory_index = command_content[1]
+                elif cmd_type == C_PUSH or cmd_type == C_POP:
+                    memory_segment, memory_index = command_content.arguments
                     assembly_codes = self.translate_push_pop(filename, cmd_type, memory_segment, memory_index)
                 output_codes.append('// {}'.format(command))	# Write command itself as comment for inspection
                 output_codes += assembly_codes
@@ -162,6 +221,7 @@ class CodeWriter:
     def write(self):
         """Translate and write translated assembly code to out_file"""
         output_codes = self.translate()
+        output_codes += self.write_shared_routines()
         with open(self.out_file, 'w', encoding='utf_8') as outf:
             for code_line in output_codes:
                 outf.write(str(code_line) + '\n')
@@ -1,7 +1,35 @@
+C_ARITHMETIC, C_PUSH, C_POP, C_LABEL, C_GOTO, C_IF, C_FUNCTION, C_RETURN, C_CALL = range(9)	# The command types, small ints which the modules reading the commands compare cmd_type to
+
+class VMCommand:
+    """VMCommand: A parsed VM command, its command type, its arguments (the operator for an arithmetic command, None for return, the tuple of the words after the first one otherwise), the command itself for notes in output, and the vm file and line it was read from"""
+    __slots__ = ('cmd_type', 'arguments', 'command', 'in_file', 'line_number')
+
+    def __init__(self, cmd_type, arguments, command, in_file, line_number):
+        self.cmd_type = cmd_type
+        self.arguments = arguments
+        self.command = command
+        self.in_file = in_file
+        self.line_number = line_number
+
 class Parser:
     """
     Parser: Handles the parsing of a single .vm file, and encapsulates access to the input code. It reads VM commands, parses them, and provides convenient access to their components. In addition, it removes all white space and comments.
+    Each line is split into words once, and its first word is looked up in command_types for its command type. The arguments are checked as the command is parsed, so that a wrong command is reported with its file and line instead of being translated into wrong assembly code.
     """
+    command_types = {
+            **{operator: C_ARITHMETIC for operator in ('add', 'sub', 'neg', 'eq', 'gt', 'lt', 'and', 'or', 'not')},
+            'push': C_PUSH,
+            'pop': C_POP,
+            'label': C_LABEL,
+            'goto': C_GOTO,
+            'if-goto': C_IF,
+            'function': C_FUNCTION,
+            'return': C_RETURN,
+            'call': C_CALL,
+            }
+    arguments_nums = (0, 2, 2, 1, 1, 1, 2, 0, 2)	# The number of arguments of each command type
+    segment_sizes = {'argument': None, 'local': None, 'static': None, 'constant': 32768, 'this': None, 'that': None, 'pointer': 2, 'temp': 8}	# The indexes of a segment are below its size, None if it is only bounded by the memory
+
     def __init__(self, in_file):
         self.in_file = in_file
 
@@ -9,50 +37,58 @@ class Parser:
         """Removes all white space and comments"""
         return line.split('//')[0].strip()
 
-    def get_command_type(self, command):
-        """Returns the type of the current VM command. C_ARITHMETIC is returned for all the arithmetic commands."""
-        first_word_in_command = command.split(' ')[0]
-        if any(command==c for c in ('add', 'sub', 'neg', 'eq', 'gt', 'lt', 'and', 'or', 'not')):
-            return 'C_ARITHMETIC'
-        elif first_word_in_command == 'push':
-            return 'C_PUSH'
-        elif first_word_in_command == 'pop':
-            return 'C_POP'
-        elif first_word_in_command == 'label':
-            return 'C_LABEL'
-        elif first_word_in_command == 'goto':
-            return 'C_GOTO'
-        elif first_word_in_command == 'if-goto':
-            return 'C_IF'
-        elif first_word_in_command == 'function':
-            return 'C_FUNCTION'
-        elif first_word_in_command == 'call':
-            return 'C_CALL'
-        elif command == 'return':
-            return 'C_RETURN'
-
-    def get_arguments(self, command, cmd_type):
-        """Returns arguments of given command and cmd_type"""
-        if cmd_type == 'C_ARITHMETIC':
-            arguments = command
-        elif cmd_type == 'C_RETURN':
-            arguments = None
-        else:
-            arguments = command.split(' ')[1:]
-        return arguments
+    def error(self, line_number, message):
+        """Raise a SyntaxError locating the wrong command in its vm file"""
+        raise SyntaxError('{}:{}: {}'.format(self.in_file, line_number, message))
 
-    def parse(self):
-        """Read input file, parses commands, returns contents with command type and arguments (if any)"""
-        returned_contents = []
-        with open(self.in_file, 'r', encoding='utf_8') as inf:
-            for line in inf:
-                command = self.process(line)
+    def check_arguments(self, cmd_type, words, line_number):
+        """Check the number of arguments of the command, the segment and index of push and pop, and the number of function and call"""
+        arguments_num = len(words) - 1
+        if cmd_type == C_PUSH or cmd_type == C_POP:
+            segment_size = self.segment_sizes.get(words[1]) if arguments_num >= 2 else None
+            if arguments_num != 2:
+                self.error(line_number, '{} takes a segment and an index, not {!r}'.format(words[0], ' '.join(words[1:])))
+            if words[1] not in self.segment_sizes:
+                self.error(line_number, 'unknown segment {!r}'.format(words[1]))
+            if not words[2].isdecimal():
+                self.error(line_number, 'index {!r} is not a number'.format(words[2]))
+            if segment_size is not None and int(words[2]) >= segment_size:
+                self.error(line_number, 'index {} out of the {} segment'.format(words[2], words[1]))
+            if cmd_type == C_POP and words[1] == 'constant':
+                self.error(line_number, 'cannot pop to the constant segment')
+        elif arguments_num != self.arguments_nums[cmd_type]:
+            self.error(line_number, '{} takes {} arguments, not {}'.format(words[0], self.arguments_nums[cmd_type], arguments_num))
+        elif (cmd_type == C_FUNCTION or cmd_type == C_CALL) and not words[2].isdecimal():
+            self.error(line_number, '{} takes a number of {}, not {!r}'.format(words[0], 'local variables' if cmd_type == C_FUNCTION else 'arguments', words[2]))
+
+    def parse_arguments(self, command, line_number):
+        """Returns the command type and the arguments of the command, read from line line_number of the vm file"""
+        words = command.split()
+        cmd_type = self.command_types.get(words[0])
+        if cmd_type is None:
+            self.error(line_number, 'unknown command {!r}'.format(words[0]))
+        self.check_arguments(cmd_type, words, line_number)
+        if cmd_type == C_ARITHMETIC:
+            return cmd_type, words[0]
+        if cmd_type == C_RETURN:
+            return cmd_type, None
+        return cmd_type, tuple(words[1:])
+
+    def commands(self):
+        """Read input file line by line, yields the VMCommand of each command one at a time, so that a file is never held in memory as a whole. Most commands of a program are written many times, e.g. push constant 0 or add, so each different command is parsed once, into the table parsed_commands."""
+        parsed_commands = {}	# {command: (command type, arguments)}
+        in_file = self.in_file
+        with open(in_file, 'r', encoding='utf_8') as inf:
+            for line_number, line in enumerate(inf, 1):
+                command = line.split('//', 1)[0].strip() if '//' in line else line.strip()	# As process, without a call for each line
                 # If returned command is an empty line after processed, skip it
                 if not command:
                     continue
-                cmd_type = self.get_command_type(command)
-                arguments = self.get_arguments(command, cmd_type)
-                returned_content = [cmd_type, arguments] if arguments else [cmd_type]
-                returned_content.append(command)	# return command itself for notes in output
-                returned_contents.append(returned_content)
-        return {self.in_file.stem: returned_contents}	# Return filename as key and code_contents as value, filename will be further used in static memory segment translation
+                parsed_command = parsed_commands.get(command)
+                if parsed_command is None:
+                    parsed_command = parsed_commands[command] = self.parse_arguments(command, line_number)
+                yield VMCommand(parsed_command[0], parsed_command[1], command, in_file, line_number)
+
+    def parse(self):
+        """Read input file, parses commands, returns contents with command type and arguments (if any)"""
+        return {self.in_file.stem: list(self.commands())}	# Return filename as key and code_contents as value, filename will be further used in static memory segment translation
@@ -1,14 +1,20 @@
 #!/usr/bin/python3
 
 import unittest
+import shutil
+import tempfile
 from pathlib import Path
 import subprocess as sp
 
+from parser import Parser, C_ARITHMETIC, C_PUSH, C_POP
+
 class VMtranslator(unittest.TestCase):
 
     def setUp(self):
         self.cwd = Path.cwd()
-        self.given_cpu_emulator_tool = self.cwd.parent / 'tools/CPUEmulator.sh'
+        self.cpu_emulator = self.cwd.parent / 'tools/CPUEmulator.sh'	# The given CPU emulator, the reference the asm files are compared with
+        if shutil.which('java') is None:	# The Hack CPU emulator of the assembler otherwise
+            self.cpu_emulator = self.cwd.parent / '06_assembler/hack_emulator.py'
         self.my_vm_translator = self.cwd / 'VMtranslator.py'
 
     def run_test(self, vm_file):
@@ -18,8 +24,8 @@ class VMtranslator(unittest.TestCase):
         proc_translate = sp.run([self.my_vm_translator.as_posix(), vm_file.as_posix()], stdout=sp.PIPE, universal_newlines=True)
         self.assertEqual(proc_translate.stdout, 'Successfully translate to assembly ' + asm_file.as_posix() + '\n')
         self.assertTrue(asm_file.exists())
-        # Use given CPU emulator to compare generated asm file
-        proc_compare = sp.run([self.given_cpu_emulator_tool.as_posix(), tst_file], stdout=sp.PIPE, universal_newlines=True)
+        # Use the CPU emulator to compare generated asm file
+        proc_compare = sp.run([self.cpu_emulator.as_posix(), tst_file], stdout=sp.PIPE, universal_newlines=True)
         self.assertEqual(proc_compare.stdout, 'End of script - Comparison ended successfully\n')
 
     def test_stack_arithmetic_simple_add(self):
@@ -42,5 +48,23 @@ class VMtranslator(unittest.TestCase):
         vm_file = self.cwd / 'test/MemoryAccess/StaticTest/StaticTest.vm'
         self.run_test(vm_file)
 
+class VMParser(unittest.TestCase):
+
+    def parse_lines(self, lines):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vmfile = Path(tmp_dir) / 'Main.vm'
+            vmfile.write_text('\n'.join(lines) + '\n')
+            return Parser(vmfile).parse()['Main']
+
+    def test_commands(self):
+        command_contents = self.parse_lines(['// comment', 'push constant 7  // seven', '', 'pop static 2', 'add'])
+        self.assertEqual([(command_content.cmd_type, command_content.arguments, command_content.line_number) for command_content in command_contents], [(C_PUSH, ('constant', '7'), 2), (C_POP, ('static', '2'), 4), (C_ARITHMETIC, 'add', 5)])
+
+    def test_wrong_commands(self):
+        for command in ('push static 2 Foo', 'push constant', 'pop constant 1', 'push temp 8', 'push local x', 'push heap 0', 'add 1', 'jump'):
+            with self.subTest(command=command):
+                with self.assertRaisesRegex(SyntaxError, 'Main.vm:2: '):
+                    self.parse_lines(['push constant 1', command])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+
+import argparse
+from pathlib import Path
+
+from parser import Parser
+from peephole_optimizer import PeepholeOptimizer
+from constant_folder import ConstantFolder
+
+def optimize_vm(path_input, output_dir=None, peephole_optimizer=None, constant_folder=None, in_place=False):
+    """Rewrite the redundant sequences of commands of the vm file path_input, or of all the vm files in the directory path_input, each into a vm file of the same name in output_dir, by default the directory optimized beside the vm files, or in place with in_place, so that the original code is only overwritten when asked to. With constant_folder, the arithmetic on constants is computed first. Returns the list of the paths of the vm files written, the number of rewrites of each pattern being counted in peephole_optimizer.hits."""
+    if peephole_optimizer is None:
+        peephole_optimizer = PeepholeOptimizer()
+    if path_input.is_dir():	# Optimize all vm files in directory
+        vmfiles = [f for f in path_input.glob('*.vm')]
+        assert vmfiles, "No vm file in this directory."
+        vm_dir = path_input
+    else:	# Optimize one vm file
+        vmfiles = [path_input]
+        vm_dir = path_input.parent
+    assert not (in_place and output_dir is not None), "Either rewrite the vm files in place or to an output directory."
+    if not in_place:
+        if output_dir is None:
+            output_dir = vm_dir / 'optimized'
+        output_dir.mkdir(parents=True, exist_ok=True)
+    out_vm_files = []
+    for vmfile in vmfiles:
+        code_contents = Parser(vmfile).parse()	# Parse the whole file before it may be overwritten
+        if constant_folder is not None:
+            code_contents = constant_folder.fold(code_contents)
+        code_contents = peephole_optimizer.optimize(code_contents)
+        out_vm_file = vmfile if in_place else output_dir / vmfile.name
+        with open(out_vm_file, 'w', encoding='utf_8') as outf:
+            for command_content in code_contents[vmfile.stem]:
+                outf.write(command_content.command + '\n')
+        out_vm_files.append(out_vm_file)
+    return out_vm_files
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Rewrite the redundant sequences of commands of vm code')
+    arg_parser.add_argument('path_input', help='The path for vm file *.vm or the directory path which contains *.vm files')
+    arg_parser.add_argument('--output-dir', help='The directory to write the optimized vm files to, by default the directory optimized beside the input files')
+    arg_parser.add_argument('--in-place', action='store_true', help='Overwrite the input files with the optimized vm code, instead of writing it to the output directory')
+    arg_parser.add_argument('--fold-constants', action='store_true', help='Compute the arithmetic on constants, and the calls of the Math functions on constants, first')
+    arg_parser.add_argument('--jack-output', action='store_true', help='The vm files were compiled from Jack, so no value is passed in the temp segment across a call or a return, which lets more stores to temp be removed')
+    args = arg_parser.parse_args()
+
+    path_input = Path(args.path_input)
+    assert path_input.exists(), "Path not exists."
+    output_dir = None if args.output_dir is None else Path(args.output_dir)
+
+    peephole_optimizer = PeepholeOptimizer(args.jack_output)
+    constant_folder = ConstantFolder() if args.fold_constants else None
+    out_vm_files = optimize_vm(path_input, output_dir, peephole_optimizer, constant_folder, args.in_place)
+    if constant_folder is not None:
+        print('constant folding: {} commands removed'.format(constant_folder.folded_commands_num))
+    for pattern_name, hits in peephole_optimizer.hits.items():
+        print('{}: {} rewrites'.format(pattern_name, hits))
+    for out_vm_file in out_vm_files:
+        print('Successfully optimize to vm ' + out_vm_file.as_posix())
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,114 @@
 #!/usr/bin/python3
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
 from parser import Parser
 from code_writer import CodeWriter
+from inliner import Inliner
+from linker import Linker
+from peephole_optimizer import PeepholeOptimizer
+from constant_folder import ConstantFolder
 
-arg_parser = argparse.ArgumentParser(description='Translate vm code into assembly code')
-arg_parser.add_argument('path_input', help='The path for vm file *.vm or the directory path which contains *.vm files')
-args = arg_parser.parse_args()
-
-
-path_input = Path(args.path_input)
-assert path_input.exists(), "Path not exists."
-
-if path_input.is_dir():	# Translate all vm files in directory
-    vmfiles = [f for f in path_input.glob('*.vm')]
-    assert vmfiles, "No vm file in this directory."
-    out_asm_file = path_input / (path_input.name + '.asm')	# Out asm file name same as directory name
-    returned_contents = {}
-    for vmfile in vmfiles:
-        psr = Parser(vmfile)
-        parse_result = psr.parse()
-        returned_contents = {**returned_contents, **parse_result}	# Merge returned results to dict returned_contents
-else:	# Translate one vm file
-    vmfile = path_input
-    out_asm_file = path_input.with_suffix('.asm')
-    psr = Parser(vmfile)
-    returned_contents = psr.parse()
-
-cw = CodeWriter(returned_contents, out_asm_file)
-cw.write()
-print('Successfully translate to assembly ' + out_asm_file.as_posix())
+def read_vm(vmfiles):
+    """Returns the code contents of the vm files, the commands of each file being the Parser of the file, which reads them one at a time each time they are iterated over"""
+    return {vmfile.stem: Parser(vmfile) for vmfile in vmfiles}
+
+def scan_unit(filename, command_contents):
+    """Finds the functions of one vm file and the functions they call, in a worker process of translate_parallel"""
+    linker = Linker({filename: command_contents})
+    return linker.functions, linker.callees
+
+def translate_unit(filename, command_contents, reachable_functions, code_writer_options):
+    """Translates one vm file, in a worker process of translate_parallel, without the functions not in reachable_functions unless it is None. Returns the assembly code, as one piece, the comparison operators whose shared routines it jumps to, and {class name: [number of functions removed, ROM words saved]} for the file."""
+    linker = Linker({}, code_writer_options)
+    if reachable_functions is not None:
+        command_contents = linker.link_commands(filename, command_contents, reachable_functions)
+    code_writer = CodeWriter({filename: command_contents}, None, *code_writer_options)
+    assembly_codes = code_writer.translate()
+    return ['\n'.join(assembly_codes)] if assembly_codes else [], code_writer.compare_operators_used, linker.class_report	# Joined in one line, which is much faster to send back
+
+def translate_parallel(executor, code_contents, code_writer, eliminate_dead_functions, linker_report):
+    """Yields the assembly code of each vm file of code_contents, translated by the worker processes of executor, in the order of code_contents, adding the comparison operators used to code_writer for its shared routines. Each file is translated as a whole by one CodeWriter, which carries no state over from one file to the next, so the output is the same as the one of code_writer alone. With eliminate_dead_functions, the functions of every file are found first, in parallel too, for the reachable ones to be known."""
+    filenames = list(code_contents)
+    reachable_functions = None
+    if eliminate_dead_functions:
+        linker = Linker({})
+        for functions, callees in executor.map(scan_unit, filenames, code_contents.values()):
+            linker.functions.update(functions)
+            linker.callees.update(callees)
+        if linker.entry_function_name in linker.functions:
+            reachable_functions = linker.find_reachable_functions()
+    code_writer_options = (code_writer.use_trampolines, code_writer.use_compare_routines, code_writer.cache_stack_top)
+    for assembly_codes, compare_operators_used, class_report in executor.map(translate_unit, filenames, code_contents.values(), repeat(reachable_functions), repeat(code_writer_options)):
+        code_writer.compare_operators_used |= compare_operators_used
+        if linker_report is not None:
+            linker_report.update(class_report)
+        yield assembly_codes
+
+def translate_vm(path_input, eliminate_dead_functions=True, linker_report=None, inline_budget=0, use_trampolines=False, use_compare_routines=False, peephole_hits=None, cache_stack_top=False, fold_constants=False, jobs=1, jack_output=False):
+    """Translate the vm file path_input, or all the vm files in the directory path_input, into one asm file, returns the path of the asm file. The calls of the leaf functions of no more than inline_budget commands are inlined. With fold_constants, the arithmetic on constants is then computed by the ConstantFolder. With peephole_hits, the redundant sequences of commands are then rewritten by the PeepholeOptimizer, whose number of rewrites of each pattern is added to peephole_hits, temp being dead across the calls and returns with jack_output only. With eliminate_dead_functions, the functions which cannot be reached from Sys.init are not translated, and {class name: [number of functions removed, ROM words saved]} is added to linker_report if given. With use_trampolines, the calls and returns jump to shared routines, for a smaller but slower program, and so do the comparisons with use_compare_routines. With cache_stack_top, the top of the stack is kept in D across straight-line commands. Without inlining, folding and peephole optimization, the program is streamed from the vm files to the asm file, never held in memory as a whole. With jobs above 1, the vm files are parsed and translated by that many worker processes, into the same asm file."""
+    if path_input.is_dir():	# Translate all vm files in directory
+        vmfiles = [f for f in path_input.glob('*.vm')]
+        assert vmfiles, "No vm file in this directory."
+        out_asm_file = path_input / (path_input.name + '.asm')	# Out asm file name same as directory name
+    else:	# Translate one vm file
+        vmfiles = [path_input]
+        out_asm_file = path_input.with_suffix('.asm')
+
+    returned_contents = read_vm(vmfiles)
+    if inline_budget > 0:	# The Inliner looks at the commands of the whole program, kept in memory from then on
+        returned_contents = Inliner({filename: list(command_contents) for filename, command_contents in returned_contents.items()}, inline_budget).inline()
+    if fold_constants:
+        returned_contents = ConstantFolder().fold(returned_contents)
+    if peephole_hits is not None:
+        peephole_optimizer = PeepholeOptimizer(jack_output)
+        returned_contents = peephole_optimizer.optimize(returned_contents)
+        peephole_hits.update(peephole_optimizer.hits)
+    if jobs > 1:	# The Linker runs in the worker processes too
+        cw = CodeWriter({}, out_asm_file, use_trampolines, use_compare_routines, cache_stack_top)
+        with ProcessPoolExecutor(jobs) as executor:
+            cw.write(translate_parallel(executor, returned_contents, cw, eliminate_dead_functions, linker_report))
+        return out_asm_file
+    if eliminate_dead_functions:
+        linker = Linker(returned_contents, (use_trampolines, use_compare_routines, cache_stack_top))
+        returned_contents = linker.link_lazily(returned_contents)	# The vm files are read again by their Parsers
+
+    cw = CodeWriter(returned_contents, out_asm_file, use_trampolines, use_compare_routines, cache_stack_top)
+    cw.write()
+    if eliminate_dead_functions and linker_report is not None:	# The functions removed are counted as the commands are translated
+        linker_report.update(linker.class_report)
+    return out_asm_file
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Translate vm code into assembly code')
+    arg_parser.add_argument('path_input', help='The path for vm file *.vm or the directory path which contains *.vm files')
+    arg_parser.add_argument('--keep-dead-functions', action='store_true', help='Translate every function, even the ones which cannot be reached from Sys.init')
+    arg_parser.add_argument('--inline-budget', type=int, default=0, help='Inline the calls of the functions calling no other function whose vm code is no more than this number of commands (0: no inlining)')
+    arg_parser.add_argument('--trampolines', action='store_true', help='Write the frame handling of call and return once, in shared $$CALL and $$RETURN routines, for a smaller but slower program')
+    arg_parser.add_argument('--compare-routines', action='store_true', help='Write eq, gt and lt once, as shared routines jumped to by every comparison, for a smaller but slower program')
+    arg_parser.add_argument('--cache-stack-top', action='store_true', help='Keep the top of the stack in D across straight-line vm commands, writing it to the stack only before labels, jumps, calls and returns')
+    arg_parser.add_argument('--fold-constants', action='store_true', help='Compute the arithmetic on constants, and the calls of the Math functions on constants, before translating')
+    arg_parser.add_argument('--peephole', action='store_true', help='Rewrite the redundant sequences of vm commands before translating them, and print the number of rewrites of each pattern')
+    arg_parser.add_argument('--jack-output', action='store_true', help='The vm files were compiled from Jack, so no value is passed in the temp segment across a call or a return, which lets the peephole optimizer remove more stores to temp')
+    arg_parser.add_argument('--jobs', type=int, default=1, help='Parse and translate the vm files in this number of worker processes (1: in this process)')
+    args = arg_parser.parse_args()
+
+    path_input = Path(args.path_input)
+    assert path_input.exists(), "Path not exists."
+
+    linker_report = {}
+    peephole_hits = {} if args.peephole else None
+    out_asm_file = translate_vm(path_input, not args.keep_dead_functions, linker_report, args.inline_budget, args.trampolines, args.compare_routines, peephole_hits, args.cache_stack_top, args.fold_constants, args.jobs, args.jack_output)
+    for pattern_name, hits in (peephole_hits or {}).items():
+        print('{}: {} rewrites'.format(pattern_name, hits))
+    for class_name, (functions_num, rom_words) in sorted(linker_report.items()):
+        print('{}: {} functions removed, {} ROM words saved'.format(class_name, functions_num, rom_words))
+    if linker_report:
+        print('Total: {} ROM words saved'.format(sum(rom_words for functions_num, rom_words in linker_report.values())))
+    print('Successfully translate to assembly ' + out_asm_file.as_posix())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+import os
+import time
+import tempfile
+from pathlib import Path
+
+from parser import Parser
+from VMtranslator import translate_vm
+
+def generate_vm_class(class_name, functions_num):
+    """Generate the vm code of a machine-generated class with functions_num similar functions"""
+    lines = []
+    for i in range(functions_num):
+        lines += [
+                'function {}.f{} 2'.format(class_name, i),
+                'push argument 0',
+                'push constant {}'.format(i),
+                'add',
+                'pop local 0',
+                'label LOOP_{}'.format(i),
+                'push local 0',
+                'push static {}'.format(i % 4),
+                'lt',
+                'not',
+                'if-goto END_{}'.format(i),
+                'push local 0',
+                'push constant 1',
+                'call Math.multiply 2',
+                'pop local 1',
+                'push that 3',
+                'pop this 2',
+                'goto LOOP_{}'.format(i),
+                'label END_{}'.format(i),
+                'push local 1',
+                'return',
+                ]
+    return '\n'.join(lines) + '\n'
+
+def generate_vm_program(program_dir, classes_num, functions_num):
+    """Generate a program of classes_num classes of functions_num functions, which are all called by Sys.init"""
+    sys_lines = ['function Sys.init 0']
+    for c in range(classes_num):
+        class_name = 'Class{}'.format(c)
+        (program_dir / (class_name + '.vm')).write_text(generate_vm_class(class_name, functions_num))
+        for i in range(functions_num):
+            sys_lines += ['push constant {}'.format(i), 'call {}.f{} 1'.format(class_name, i), 'pop temp 0']
+    sys_lines += ['label HALT', 'goto HALT']
+    (program_dir / 'Sys.vm').write_text('\n'.join(sys_lines) + '\n')
+    (program_dir / 'Math.vm').write_text('function Math.multiply 0\npush argument 0\nreturn\n')
+
+def benchmark_parse_time():
+    """Parse a large generated vm file"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vmfile = Path(tmp_dir) / 'Main.vm'
+        vmfile.write_text(generate_vm_class('Main', 15000))
+        start = time.perf_counter()
+        lines_num = sum(1 for command_content in Parser(vmfile).commands())
+        elapsed = time.perf_counter() - start
+        print('Parse time: {} lines in {:.3f} s, {:.0f} lines/s'.format(lines_num, elapsed, lines_num / elapsed))
+
+def benchmark_parallel_translation():
+    """Translate a generated program of 64 vm files with a growing number of worker processes, the output must be the same as the one of a serial translation"""
+    print('Translate time by worker processes ({} CPUs):'.format(os.cpu_count()))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        program_dir = Path(tmp_dir) / 'Program'
+        program_dir.mkdir()
+        generate_vm_program(program_dir, 62, 200)
+        serial_codes = None
+        for jobs in (1, 2, 4, 8):
+            start = time.perf_counter()
+            out_asm_file = translate_vm(program_dir, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            assembly_codes = out_asm_file.read_bytes()
+            if serial_codes is None:
+                serial_codes, serial_elapsed = assembly_codes, elapsed
+            assert assembly_codes == serial_codes, "The output of {} worker processes differs from the serial one.".format(jobs)
+            print('\t{:>6} jobs: {:8.3f} s, {:6.2f}x'.format(jobs, elapsed, serial_elapsed / elapsed))
+
+def main():
+    benchmark_parse_time()
+    benchmark_parallel_translation()
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,30 @@
+from itertools import islice
+from parser import C_ARITHMETIC, C_PUSH, C_POP, C_LABEL, C_GOTO, C_IF, C_FUNCTION, C_RETURN, C_CALL
+
 class CodeWriter:
     """CodeWriter: Translates VM commands into Hack assembly code."""
-    def __init__(self, code_contents, out_file):
+    call_trampoline_label = '$$CALL'
+    return_trampoline_label = '$$RETURN'
+    end_of_program_label = '$$END'
+    bootstrap_label = '$$BOOTSTRAP'	# Namespaces the return address label of the call of Sys.init in the bootstrap code
+    max_address_increments = 6	# A fused pop to argument, local, this or that i steps A to the address i times at most, a farther one keeps the address in R13
+
+    lookahead_commands_num = 2	# A comparison is fused with the not and the if-goto following it at most, so no more commands are read ahead
+    write_chunk_lines = 4096	# The assembly code is written to out_file in chunks of this many lines at least
+
+    stack_spilling_commands = {C_LABEL, C_GOTO, C_FUNCTION, C_CALL, C_RETURN}	# With cache_stack_top, the top of the stack is written back to the stack before these commands
+
+    def __init__(self, code_contents, out_file, use_trampolines=False, use_compare_routines=False, cache_stack_top=False):
         self.out_file = out_file
         self.code_contents = code_contents
+        self.use_trampolines = use_trampolines	# Jump to one shared $$CALL and $$RETURN routine instead of writing the frame handling at every call and return
+        self.use_compare_routines = use_compare_routines	# Jump to one shared routine per comparison operator instead of writing the comparison at every eq, gt and lt
+        self.compare_operators_used = set()
+        self.cache_stack_top = cache_stack_top	# Keep the top of the stack in D, instead of in RAM, across straight-line commands
+        self.top_in_D = False	# With cache_stack_top, is the top of the stack in D, SP pointing to where it would be written?
         self.setup_for_asm_code_translation()
-        self.function_call_times = 0	# Use this to count the function calls, which helps to generate unique function return label
+        self.function_name = None	# The function being translated, or the vm file before its first function command, which namespaces the return address labels of its calls
+        self.function_calls_num = 0	# Counts the calls of the function being translated, which helps to generate unique function return label
 
     def setup_for_asm_code_translation(self):
         """Initialize common stuff which will be used in asm code translation"""
@@ -79,6 +99,8 @@ class CodeWriter:
 
     def translate_arithmetic(self, filename, operator, command_index):
         """Generate the assembly code that is the translation of the given arithmetic command."""
+        if self.cache_stack_top:
+            return self.translate_arithmetic_cached(filename, operator, command_index)
         assembly_codes = []
         if operator in ['add', 'sub', 'and', 'or']:
             assembly_codes = [
@@ -91,6 +113,8 @@ class CodeWriter:
                     'A=M-1',
                     self.asm_code_operator_dict[operator],
                 ]
+        elif self.use_compare_routines:	# operator is 'eq' or 'gt' or 'lt'
+            assembly_codes = self.translate_compare_call(filename, operator, command_index)
         else:	# operator is 'eq' or 'gt' or 'lt':
             op_upper = operator.upper()
             assembly_codes = [
@@ -111,10 +135,131 @@ class CodeWriter:
                 ]
         return assembly_codes
 
+    def spill_stack_top(self):
+        """Generate the assembly code writing the top of the stack cached in D back to the stack, if it is cached"""
+        if not self.top_in_D:
+            return []
+        self.top_in_D = False
+        return self.asm_code_memory_push_content_in_D
+
+    def asm_code_memory_pop_D(self):
+        """Generate the assembly code popping the top of the stack to D, which caches it, if it is not cached yet"""
+        if self.top_in_D:
+            return []
+        self.top_in_D = True
+        return [
+                '@SP',
+                'AM=M-1',	# SP--, A=M-1
+                'D=M',	# D=top of the stack
+                ]
+
+    def translate_arithmetic_cached(self, filename, operator, command_index):
+        """
+        Generate the assembly code of the arithmetic command with the top of the stack cached in D: Y is taken from D, the result is left in D, and only X is read from the stack, e.g. "push local 0, push local 1, add" never writes local 1 to the stack.
+        A neg or not of a top which is not cached is done in the stack, and a comparison through the shared routines takes its operands from the stack.
+        """
+        if operator in ['neg', 'not']:
+            if not self.top_in_D:
+                return ['@SP', 'A=M-1', self.asm_code_operator_dict[operator]]
+            return ['D=-D' if operator == 'neg' else 'D=!D']
+        if operator not in ['add', 'sub', 'and', 'or'] and self.use_compare_routines:
+            return self.spill_stack_top() + self.translate_compare_call(filename, operator, command_index)
+        assembly_codes = [
+                *self.asm_code_memory_pop_D(),	# D=Y
+                '@SP',
+                'AM=M-1',	# SP--, A points to X
+                ]
+        if operator in ['add', 'sub', 'and', 'or']:
+            assembly_codes.append({'add': 'D=D+M', 'sub': 'D=M-D', 'and': 'D=D&M', 'or': 'D=D|M'}[operator])	# D=X operator Y
+        else:	# operator is 'eq' or 'gt' or 'lt':
+            op_upper = operator.upper()
+            assembly_codes += [
+                    'D=M-D',	# D=X-Y
+                    '@IS_{}_{}_{}'.format(op_upper, filename, command_index),
+                    'D;J{}'.format(op_upper),	# if D compares to 0 using specified operator succeeds, jump to label specified above
+                    'D=0',	# if D compares to 0 using specified operator fails, D=False
+                    '@END_COMPARE_{}_{}_{}'.format(op_upper, filename, command_index),
+                    '0;JMP',	# jump to label END_COMPARE
+                    '(IS_{}_{}_{})'.format(op_upper, filename, command_index),
+                    'D=-1',	# D compares to 0 succeeds, so D=True(-1)
+                    '(END_COMPARE_{}_{}_{})'.format(op_upper, filename, command_index)
+                    ]
+        return assembly_codes
+
+    def translate_push_pop_cached(self, filename, cmd_type, memory_segment, memory_index):
+        """Generate the assembly code of the push or pop command with the top of the stack cached in D: a push writes the top cached before to the stack and reads the pushed value to D, a pop writes D to the memory entry"""
+        if cmd_type == C_PUSH:
+            assembly_codes = self.spill_stack_top()
+            self.top_in_D = True
+            if memory_segment == 'constant' and memory_index in {'0', '1'}:
+                return assembly_codes + ['D={}'.format(memory_index)]
+            return assembly_codes + self.asm_code_memory_load_D(filename, memory_segment, memory_index)
+        if memory_segment in self.dynamic_memory_base_dict and int(memory_index) > self.max_address_increments:	# The address is computed in D, so the popped value is kept in R13
+            assembly_codes = [
+                    *self.asm_code_memory_pop_D(),
+                    '@R13',
+                    'M=D',	# R13=popped value
+                    '@{}'.format(memory_index),	# A=memory_index
+                    'D=A',	# D=memory_index
+                    '@{}'.format(self.dynamic_memory_base_dict[memory_segment]),
+                    'D=D+M',	# Get the address: memory index + momory base, and stored in D
+                    '@R14',
+                    'M=D',	# R14=address
+                    '@R13',
+                    'D=M',
+                    '@R14',
+                    'A=M',
+                    'M=D',	# *address=popped value
+                    ]
+        else:
+            assembly_codes = self.asm_code_memory_pop_D() + self.asm_code_memory_store(filename, memory_segment, memory_index, 'D')
+        self.top_in_D = False
+        return assembly_codes
+
+    def translate_compare_call(self, filename, operator, command_index):
+        """Generate the assembly code of a comparison (eq, gt or lt) jumping to the shared routine of the operator, with the return address in D"""
+        self.compare_operators_used.add(operator)
+        return_label = 'RETURN_FROM_{}_{}_{}'.format(operator.upper(), filename, command_index)
+        assembly_codes = [
+                '@{}'.format(return_label),
+                'D=A',	# D=return address
+                '@$${}'.format(operator.upper()),
+                '0;JMP',	# jump to the shared routine of the operator
+                '({})'.format(return_label),
+                ]
+        return assembly_codes
+
+    def write_compare_routine(self, operator):
+        """Generate the shared routine of the comparison operator (eq, gt or lt): replaces X and Y on the stack by X operator Y, then jumps to the return address given in D"""
+        op_upper = operator.upper()
+        assembly_codes = [
+                '($${})'.format(op_upper),
+                '@R13',
+                'M=D',	# R13=return address
+                *self.asm_code_arithmetic_make_DeqY_MeqX_SPminus1,
+                'D=M-D',	# D=X-Y
+                'M=0',	# X=False
+                '@$${}_TRUE'.format(op_upper),
+                'D;J{}'.format(op_upper),	# if D compares to 0 using specified operator succeeds, jump to label specified above
+                '@R13',
+                'A=M',
+                '0;JMP',	# return with X=False
+                '($${}_TRUE)'.format(op_upper),
+                '@SP',
+                'A=M-1',
+                'M=-1',	# D compares to 0 succeeds, so M=True(-1)
+                '@R13',
+                'A=M',
+                '0;JMP',	# return with X=True
+                ]
+        return assembly_codes
+
     def translate_push_pop(self, filename, cmd_type, memory_segment, memory_index):
         """Generate the assembly code that is the translation of the given push or pop memory access command."""
+        if self.cache_stack_top:
+            return self.translate_push_pop_cached(filename, cmd_type, memory_segment, memory_index)
         assembly_codes = []
-        if cmd_type == 'C_PUSH':
+        if cmd_type == C_PUSH:
             if memory_segment == 'constant':
                 assembly_codes = [
                         	  '@{}'.format(memory_index),	# A=constant i
@@ -145,7 +290,7 @@ class CodeWriter:
                                   'D=M',	# Get the content to D
                                   *self.asm_code_memory_push_content_in_D,
                                  ]
-        else:	# cmd_type == 'C_POP'
+        else:	# cmd_type == C_POP
             if memory_segment == 'static':
                 assembly_codes = [
                                   '@{}.{}'.format(filename, memory_index),	# Trick: static j should be translated to @filename.j
@@ -170,6 +315,61 @@ class CodeWriter:
                                  ]
         return assembly_codes
 
+    def asm_code_memory_load_D(self, filename, memory_segment, memory_index):
+        """Put the content of memory_segment memory_index to D, without touching the stack"""
+        if memory_segment == 'constant':
+            return ['@{}'.format(memory_index), 'D=A']	# D=constant i
+        elif memory_segment == 'static':
+            return ['@{}.{}'.format(filename, memory_index), 'D=M']
+        elif memory_segment == 'pointer' or memory_segment == 'temp':
+            return ['@{}'.format(int(self.fixed_memory_base_dict[memory_segment]) + int(memory_index)), 'D=M']	# The address is a fixed number
+        elif memory_index == '0':	# memory_segment in ['argument', 'local', 'this', 'that']
+            return ['@{}'.format(self.dynamic_memory_base_dict[memory_segment]), 'A=M', 'D=M']
+        elif memory_index == '1':
+            return ['@{}'.format(self.dynamic_memory_base_dict[memory_segment]), 'A=M+1', 'D=M']
+        return [
+                '@{}'.format(memory_index),	# A=memory_index
+                'D=A',	# D=memory_index
+                '@{}'.format(self.dynamic_memory_base_dict[memory_segment]),
+                'A=D+M',	# Get the address: memory index + momory base
+                'D=M',	# Get the content to D
+                ]
+
+    def asm_code_memory_store(self, filename, memory_segment, memory_index, computation):
+        """Write computation (D, 0 or 1) to memory_segment memory_index, without touching the stack. The address of argument, local, this or that i is reached by stepping A i times, or through D if computation is a constant."""
+        if memory_segment == 'static':
+            return ['@{}.{}'.format(filename, memory_index), 'M={}'.format(computation)]
+        elif memory_segment == 'pointer' or memory_segment == 'temp':
+            return ['@{}'.format(int(self.fixed_memory_base_dict[memory_segment]) + int(memory_index)), 'M={}'.format(computation)]
+        base_pointer = self.dynamic_memory_base_dict[memory_segment]
+        if memory_index == '0':
+            return ['@{}'.format(base_pointer), 'A=M', 'M={}'.format(computation)]
+        elif computation != 'D' and int(memory_index) > 1:
+            return ['@{}'.format(memory_index), 'D=A', '@{}'.format(base_pointer), 'A=D+M', 'M={}'.format(computation)]
+        return ['@{}'.format(base_pointer), 'A=M+1'] + ['A=A+1'] * (int(memory_index) - 1) + ['M={}'.format(computation)]
+
+    def translate_push_pop_fused(self, push_filename, push_segment, push_index, pop_filename, pop_segment, pop_index):
+        """
+        Writes assembly code that effects a push followed by a pop, e.g. "push local 2, pop this 1" which the compiler writes for every let statement, as a direct move which never touches the stack.
+        A constant 0 or 1 is written directly to the popped entry. If the address of the popped entry is too far to be stepped to, it is computed first and kept in R13 while the pushed value is read.
+        """
+        if push_segment == 'constant' and push_index in {'0', '1'}:
+            return self.asm_code_memory_store(pop_filename, pop_segment, pop_index, push_index)
+        if pop_segment in self.dynamic_memory_base_dict and int(pop_index) > self.max_address_increments:
+            return [
+                    '@{}'.format(pop_index),	# A=memory_index
+                    'D=A',	# D=memory_index
+                    '@{}'.format(self.dynamic_memory_base_dict[pop_segment]),
+                    'D=D+M',	# Get the address: memory index + momory base, and stored in D
+                    '@R13',
+                    'M=D',	# R13=address
+                    *self.asm_code_memory_load_D(push_filename, push_segment, push_index),
+                    '@R13',
+                    'A=M',
+                    'M=D',	# *address=pushed value
+                    ]
+        return self.asm_code_memory_load_D(push_filename, push_segment, push_index) + self.asm_code_memory_store(pop_filename, pop_segment, pop_index, 'D')
+
     def translate_label(self, filename, label_name):
         """Writes assembly code that effects the label command."""
         assembly_codes = [
@@ -187,6 +387,9 @@ class CodeWriter:
 
     def translate_if_goto(self, filename, label_name):
         """Writes assembly code that effects the if-goto command."""
+        if self.top_in_D:	# The condition is already in D
+            self.top_in_D = False
+            return ['@{}_{}'.format(label_name, filename), 'D;JNE']
         assembly_codes = [
                 '@SP',
                 'AM=M-1',	# SP--, A=M-1
@@ -196,8 +399,41 @@ class CodeWriter:
                 ]
         return assembly_codes
 
+    def translate_compare_if_goto(self, filename, operator, is_negated, label_name):
+        """
+        Writes assembly code that effects a comparison (eq, gt or lt), optionally followed by not, followed by if-goto. The comparison is not turned into a boolean on the stack, its result is used directly by a single jump.
+        This is how the compiler writes the condition of if and while statements, e.g. "lt, not, if-goto L" jumps to L if X >= Y.
+        """
+        if is_negated:
+            jump = {'eq': 'JNE', 'gt': 'JLE', 'lt': 'JGE'}[operator]
+        else:
+            jump = 'J' + operator.upper()
+        assembly_codes = [
+                *self.asm_code_memory_pop_D(),	# D=Y, unless it is cached in D already
+                '@SP',
+                'AM=M-1',	# SP--, A=M-1
+                'D=M-D',	# D=X-Y
+                '@{}_{}'.format(label_name, filename),
+                'D;{}'.format(jump),	# If X compares to Y using the (negated) operator, then jump
+                ]
+        self.top_in_D = False
+        return assembly_codes
+
+    def match_compare_if_goto(self, command_contents, command_index):
+        """If the comparison at command_index is followed by an optional not and an if-goto, returns (is_negated, label_name, number of the commands following the comparison), otherwise returns None"""
+        following_contents = command_contents[command_index + 1:command_index + 3]
+        is_negated = bool(following_contents) and following_contents[0].cmd_type == C_ARITHMETIC and following_contents[0].arguments == 'not'
+        if is_negated:
+            following_contents = following_contents[1:]
+        if following_contents and following_contents[0].cmd_type == C_IF:
+            label_name, = following_contents[0].arguments
+            return is_negated, label_name, 2 if is_negated else 1
+        return None
+
     def translate_function(self, function_name, local_variable_num):
         """Writes assembly code that effects the function command."""
+        self.function_name = function_name
+        self.function_calls_num = 0
         assembly_codes = [
                 '({})'.format(function_name),	# Generate a label of function_name
                 ] + int(local_variable_num) * self.asm_code_memory_push_0	# Initialize all local_variable_num of varibles to 0 by push 0 to stack
@@ -205,8 +441,10 @@ class CodeWriter:
 
     def translate_call_function(self, function_name, function_arg_num):
         """Writes assembly code that effects the call command."""
-        self.function_call_times += 1	# Every time this function is called, function_call_times += 1
-        return_address_label = 'return_address_{}_{}'.format(function_name, self.function_call_times)	# Use function_call_times to generate uniqu return label
+        self.function_calls_num += 1
+        return_address_label = '{}$ret.{}'.format(self.function_name, self.function_calls_num)	# Unique within the calling function, so that it does not depend on the other vm files
+        if self.use_trampolines:
+            return self.translate_call_trampoline(function_name, function_arg_num, return_address_label)
         assembly_codes = [
                 '@{}'.format(return_address_label),
                 'D=A',
@@ -233,9 +471,64 @@ class CodeWriter:
                 ]
         return assembly_codes
 
+    def translate_call_trampoline(self, function_name, function_arg_num, return_address_label):
+        """Writes assembly code that effects the call command through the shared $$CALL routine: R13=function_arg_num, R14=function_name, D=return address"""
+        assembly_codes = [
+                '@{}'.format(function_arg_num),
+                'D=A',
+                '@R13',
+                'M=D',	# R13=function_arg_num
+                '@{}'.format(function_name),
+                'D=A',
+                '@R14',
+                'M=D',	# R14=function address
+                '@{}'.format(return_address_label),
+                'D=A',	# D=return address
+                '@{}'.format(self.call_trampoline_label),
+                '0;JMP',
+                '({})'.format(return_address_label),	# Define return_address_label
+                ]
+        return assembly_codes
+
+    def write_call_trampoline(self):
+        """Writes the shared $$CALL routine: saves the frame of the caller, repositions ARG and LCL and jumps to the function, given R13=function_arg_num, R14=function address and D=return address"""
+        assembly_codes = [
+                '({})'.format(self.call_trampoline_label),
+                *self.asm_code_memory_push_content_in_D,		# push return address to stack
+                *self.asm_code_memory_push_content_in_pointer('LCL'),		# push content of LCL to stack
+                *self.asm_code_memory_push_content_in_pointer('ARG'),		# push content of ARG to stack
+                *self.asm_code_memory_push_content_in_pointer('THIS'),		# push content of THIS to stack
+                *self.asm_code_memory_push_content_in_pointer('THAT'),		# push content of THAT to stack
+                '@R13',
+                'D=M',
+                '@5',
+                'D=D+A',	# D=function_arg_num + 5
+                '@SP',
+                'D=M-D',	# D=SP - function_arg_num - 5
+                '@ARG',
+                'M=D',	# Reposition ARG, ARG=SP - function_arg_num - 5
+                '@SP',
+                'D=M',
+                '@LCL',
+                'M=D',	# Reposition LCL, LCL=SP
+                '@R14',
+                'A=M',
+                '0;JMP',	# Jump to the function
+                ]
+        return assembly_codes
+
+    def write_return_trampoline(self):
+        """Writes the shared $$RETURN routine, which effects the return command, the return address being kept in R14"""
+        return ['({})'.format(self.return_trampoline_label)] + self.translate_return_frame('R14')
+
     def translate_return(self):
         """Writes assembly code that effects the return command."""
-        return_temp_var = 'return_temp_var_{}'.format(self.function_call_times)
+        if self.use_trampolines:
+            return ['@{}'.format(self.return_trampoline_label), '0;JMP']
+        return self.translate_return_frame('R14')
+
+    def translate_return_frame(self, return_temp_var):
+        """Restores the frame of the caller and jumps to the return address, which is first kept in the variable return_temp_var"""
         assembly_codes = [
                 *self.asm_code_memory_restore_pointer_value(return_temp_var, 5),	# Put the return address of the caller to the temp location (R5) in RAM: R5=*(LCL-5)
                 '@SP',
@@ -262,47 +555,82 @@ class CodeWriter:
                 ]
         return assembly_codes
 
+    def translate_file(self, filename, command_contents):
+        """Translate the vm commands of one file to assembly, yields the assembly code of each command (or of the commands fused with it) in turn. command_contents may be any iterable, e.g. the generator of Parser.commands, only the few commands a fusion looks at are read ahead."""
+        commands = iter(command_contents)
+        self.function_name = filename	# No state is carried over from the vm files translated before, so that the files can be translated in any order, or in parallel
+        self.function_calls_num = 0
+        window = list(islice(commands, self.lookahead_commands_num + 1))	# The command to translate, followed by the commands read ahead
+        command_index = 0
+        while window:
+            command_content = window[0]
+            cmd_type = command_content.cmd_type
+            command = command_content.command
+            assembly_codes = []
+            fused_commands_num = 0	# The number of the commands following it translated together with it
+            compare_if_goto = None
+            push_pop = cmd_type == C_PUSH and len(window) > 1 and window[1].cmd_type == C_POP
+            if cmd_type == C_ARITHMETIC and command_content.arguments in {'eq', 'gt', 'lt'}:
+                compare_if_goto = self.match_compare_if_goto(window, 0)
+            if compare_if_goto:
+                is_negated, label_name, fused_commands_num = compare_if_goto
+                fused_commands = window[1:1 + fused_commands_num]
+                assembly_codes = ['// {}'.format(fused_command.command) for fused_command in fused_commands]
+                assembly_codes += self.translate_compare_if_goto(filename, command_content.arguments, is_negated, label_name)
+            elif push_pop:
+                fused_commands_num = 1
+                pop_content = window[1]
+                push_segment, push_index, *push_static_filename = command_content.arguments	# An inlined command names the file of the static variable it accesses
+                pop_segment, pop_index, *pop_static_filename = pop_content.arguments
+                assembly_codes = ['// {}'.format(pop_content.command)]
+                assembly_codes += self.translate_push_pop_fused(push_static_filename[0] if push_static_filename else filename, push_segment, push_index, pop_static_filename[0] if pop_static_filename else filename, pop_segment, pop_index)
+            elif cmd_type == C_ARITHMETIC:
+                operator = command_content.arguments
+                # Pass filename and command_index to translate_arithmetic method for generating unique labels at runtime
+                assembly_codes = self.translate_arithmetic(filename, operator, command_index)
+            elif cmd_type == C_PUSH or cmd_type == C_POP:
+                memory_segment, memory_index, *static_filename = command_content.arguments	# An inlined command names the file of the static variable it accesses
+                assembly_codes = self.translate_push_pop(static_filename[0] if static_filename else filename, cmd_type, memory_segment, memory_index)
+
+            elif cmd_type == C_LABEL:
+                label_name, = command_content.arguments
+                assembly_codes = self.translate_label(filename, label_name)	# Add filename to label name to ensure the label is unique
+            elif cmd_type == C_GOTO:
+                label_name, = command_content.arguments
+                assembly_codes = self.translate_goto(filename, label_name)	# Add filename to label name to ensure the label is unique
+            elif cmd_type == C_IF:
+                label_name, = command_content.arguments
+                assembly_codes = self.translate_if_goto(filename, label_name)	# Add filename to label name to ensure the label is unique
+
+            elif cmd_type == C_FUNCTION:
+                function_name, local_variable_num = command_content.arguments
+                assembly_codes = self.translate_function(function_name, local_variable_num)
+            elif cmd_type == C_CALL:
+                function_name, function_arg_num = command_content.arguments
+                assembly_codes = self.translate_call_function(function_name, function_arg_num)
+            else:	# cmd_type == C_RETURN:
+                assembly_codes = self.translate_return()
+            if cmd_type in self.stack_spilling_commands or push_pop:	# A label can be jumped to, and the others do not read the top of the stack from D
+                assembly_codes = self.spill_stack_top() + assembly_codes
+
+            yield ['// {}'.format(command), *assembly_codes]	# Write command itself as comment for inspection
+            command_index += 1 + fused_commands_num	# The indexes of the fused commands are skipped, so that the labels stay the same however the commands are read
+            del window[:1 + fused_commands_num]
+            window += islice(commands, 1 + fused_commands_num)
+        yield self.spill_stack_top()	# The stack is left in RAM at the end of each file
+
     def translate(self):
         """Translate vm code to assembly"""
         output_codes = []
         for filename, command_contents in self.code_contents.items():
-            for command_index, command_content in enumerate(command_contents):
-                cmd_type = command_content[0]
-                command = command_content[-1]
-                assembly_codes = []
-                if cmd_type == 'C_ARITHMETIC':
-                    operator = command_content[1]
-                    # Pass filename and command_index to translate_arithmetic method for generating unique labels at runtime
-                    assembly_codes = self.translate_arithmetic(filename, operator, command_index)
-                elif cmd_type == 'C_PUSH' or cmd_type == 'C_POP':
-                    memory_segment, memory_index = command_content[1]
-                    assembly_codes = self.translate_push_pop(filename, cmd_type, memory_segment, memory_index)
-
-                elif cmd_type == 'C_LABEL':
-                    label_name, = command_content[1]
-                    assembly_codes = self.translate_label(filename, label_name)	# Add filename to label name to ensure the label is unique
-                elif cmd_type == 'C_GOTO':
-                    label_name, = command_content[1]
-                    assembly_codes = self.translate_goto(filename, label_name)	# Add filename to label name to ensure the label is unique
-                elif cmd_type == 'C_IF':
-                    label_name, = command_content[1]
-                    assembly_codes = self.translate_if_goto(filename, label_name)	# Add filename to label name to ensure the label is unique
-
-                elif cmd_type == 'C_FUNCTION':
-                    function_name, local_variable_num = command_content[1]
-                    assembly_codes = self.translate_function(function_name, local_variable_num)
-                elif cmd_type == 'C_CALL':
-                    function_name, function_arg_num = command_content[1]
-                    assembly_codes = self.translate_call_function(function_name, function_arg_num)
-                else:	# cmd_type == 'C_RETURN':
-                    assembly_codes = self.translate_return()
-
-                output_codes.append('// {}'.format(command))	# Write command itself as comment for inspection
+            for assembly_codes in self.translate_file(filename, command_contents):
                 output_codes += assembly_codes
         return output_codes
 
     def write_bootstrap_code(self):
         """Writes assembly code that effects the VM initialization, also called bootstrap code. This code must be placed at the beginning of the output file."""
+        self.function_name = self.bootstrap_label
+        self.function_calls_num = 0
         assembly_codes = [
                 '// SP=256',
                 '@256',
@@ -314,15 +642,43 @@ class CodeWriter:
                 ]
         return assembly_codes
 
-    def write(self):
-        """Translate and write translated assembly code to out_file"""
+    def write_shared_routines(self):
+        """Generate the shared routines used by the program, after an endless loop which ends a program without bootstrap code so that it does not run on into them"""
+        assembly_codes = []
+        if self.use_trampolines:
+            assembly_codes += self.write_call_trampoline() + self.write_return_trampoline()
+        for operator in sorted(self.compare_operators_used):
+            assembly_codes += self.write_compare_routine(operator)
+        if not assembly_codes:
+            return []
+        return [
+                '({})'.format(self.end_of_program_label),
+                '@{}'.format(self.end_of_program_label),
+                '0;JMP',
+                *assembly_codes,
+                ]
+
+    def generate(self, translated_files=None):
+        """Yields the assembly code of the whole program in pieces, bootstrap code first, so that it is never held in memory as a whole. translated_files, if given, yields the assembly code of each vm file translated elsewhere, e.g. in parallel by other CodeWriters, instead of code_contents being translated."""
         sys_vm_file = self.out_file.parent / 'Sys.vm'
         if sys_vm_file.exists():
-            # if Sys.vm exists, write bootstrap code at beginning of the output_codes
-            output_codes = self.write_bootstrap_code() + self.translate()
+            # if Sys.vm exists, write bootstrap code at beginning of the output
+            yield self.write_bootstrap_code()
+        if translated_files is not None:
+            yield from translated_files
         else:
-            output_codes = self.translate()
+            for filename, command_contents in self.code_contents.items():
+                yield from self.translate_file(filename, command_contents)
+        yield self.write_shared_routines()	# After all the functions, so that a program without bootstrap code still starts with its own code, and once all the routines used are known
 
+    def write(self, translated_files=None):
+        """Translate and write translated assembly code to out_file, as it is generated"""
         with open(self.out_file, 'w', encoding='utf_8') as outf:
-            for code_line in output_codes:
-                outf.write(str(code_line) + '\n')
+            chunk_codes = []
+            for assembly_codes in self.generate(translated_files):
+                chunk_codes += assembly_codes
+                if len(chunk_codes) >= self.write_chunk_lines:
+                    outf.write('\n'.join(chunk_codes) + '\n')
+                    chunk_codes = []
+            if chunk_codes:
+                outf.write('\n'.join(chunk_codes) + '\n')
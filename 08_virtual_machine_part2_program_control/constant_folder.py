@@ -0,0 +1,115 @@
+from parser import Parser, C_ARITHMETIC, C_PUSH, C_IF, C_CALL
+
+class ConstantFolder:
+    """
+    ConstantFolder: Computes the arithmetic on constants of the VM commands when translating, instead of on the Hack CPU at runtime, e.g. "push constant 16, push constant 32, call Math.multiply 2" becomes "push constant 512". It works on the code contents given by the Parser of any vm file, not only the ones written by our compiler.
+    The stack is simulated over each basic block: the values of the push constant commands are kept instead of written, the arithmetic commands and the known calls of the Math functions on kept values are computed, and an if-goto on a kept value becomes a goto or nothing. The kept values are written before any other command, so the stack is unchanged at labels, jumps, calls and returns. A value is written as the fewest legal commands: push constant 0 - 32767, push constant -value then neg for a negative one, and push constant 32767 then not for -32768.
+    """
+    unary_operators = {
+            'neg': lambda y: -y,
+            'not': lambda y: ~y,
+            }
+    binary_operators = {
+            'add': lambda x, y: x + y,
+            'sub': lambda x, y: x - y,
+            'and': lambda x, y: x & y,
+            'or': lambda x, y: x | y,
+            'eq': lambda x, y: -1 if x == y else 0,
+            'gt': lambda x, y: -1 if x > y else 0,
+            'lt': lambda x, y: -1 if x < y else 0,
+            }
+
+    def __init__(self):
+        self.parser = Parser(None)
+        self.folded_commands_num = 0	# The number of commands removed from all the files
+        self.math_functions = {	# {function name: (number of arguments, function returning the value or None if it is left to run)}
+                'Math.multiply': (2, lambda x, y: x * y),
+                'Math.divide': (2, self.divide),
+                'Math.min': (2, min),
+                'Math.max': (2, max),
+                'Math.abs': (1, abs),
+                'Math.sqrt': (1, self.square_root),
+                }
+
+    def to_word(self, value):
+        """Returns value wrapped to a 16-bit two's complement word, as the Hack CPU computes it"""
+        return (value + 0x8000) % 0x10000 - 0x8000
+
+    def divide(self, x, y):
+        """Math.divide, which truncates towards 0. A division by 0 is an error of the OS, and -32768 has no positive counterpart for the OS to work on, so these are left to run."""
+        if y == 0 or x == -0x8000 or y == -0x8000:
+            return None
+        quotient = abs(x) // abs(y)
+        return quotient if (x < 0) == (y < 0) else -quotient
+
+    def square_root(self, x):
+        """Math.sqrt, the integer part of the square root of x, which must not be negative"""
+        if x < 0:
+            return None
+        root = 0
+        while (root + 1) * (root + 1) <= x:
+            root += 1
+        return root
+
+    def evaluate(self, command_content, constants):
+        """Returns the value the command computes from the kept values on top of the stack, which it pops from constants, or None if it cannot be computed"""
+        cmd_type = command_content.cmd_type
+        if cmd_type == C_ARITHMETIC and command_content.arguments in self.unary_operators and constants:
+            return self.to_word(self.unary_operators[command_content.arguments](constants.pop()))
+        if cmd_type == C_ARITHMETIC and command_content.arguments in self.binary_operators and len(constants) >= 2:
+            y = constants.pop()
+            x = constants.pop()
+            return self.to_word(self.binary_operators[command_content.arguments](x, y))
+        if cmd_type == C_CALL and command_content.arguments[0] in self.math_functions:
+            arguments_num, math_function = self.math_functions[command_content.arguments[0]]
+            if int(command_content.arguments[1]) == arguments_num and len(constants) >= arguments_num:
+                value = math_function(*constants[-arguments_num:])
+                if value is not None:
+                    del constants[-arguments_num:]
+                    return self.to_word(value)
+        return None
+
+    def write_constants(self, constants):
+        """Returns the commands pushing the values to the stack"""
+        commands = []
+        for value in constants:
+            if value >= 0:
+                commands.append('push constant {}'.format(value))
+            elif value == -0x8000:
+                commands += ['push constant 32767', 'not']
+            else:
+                commands += ['push constant {}'.format(-value), 'neg']
+        return [self.parser.parse_command(command) for command in commands]
+
+    def fold_commands(self, command_contents):
+        """Returns the commands of one vm file with the arithmetic on constants computed"""
+        folded_commands = []
+        constants = []	# The values of the top of the stack pushed by push constant commands, not written yet
+        commands_num = 0	# command_contents may be any iterable, e.g. a Parser, so its commands are counted as they are read
+        for command_content in command_contents:
+            commands_num += 1
+            cmd_type = command_content.cmd_type
+            if cmd_type == C_PUSH and command_content.arguments[0] == 'constant':
+                constants.append(self.to_word(int(command_content.arguments[1])))
+                continue
+            value = self.evaluate(command_content, constants)
+            if value is not None:
+                constants.append(value)
+                continue
+            if cmd_type == C_IF and constants:	# The jump is known
+                condition = constants.pop()
+                folded_commands += self.write_constants(constants)
+                constants = []
+                if condition != 0:
+                    folded_commands.append(self.parser.parse_command('goto ' + command_content.arguments[0]))
+                continue
+            folded_commands += self.write_constants(constants)
+            constants = []
+            folded_commands.append(command_content)
+        folded_commands += self.write_constants(constants)
+        self.folded_commands_num += commands_num - len(folded_commands)
+        return folded_commands
+
+    def fold(self, code_contents):
+        """Returns the code contents with the commands of every vm file folded"""
+        return {filename: self.fold_commands(command_contents) for filename, command_contents in code_contents.items()}
@@ -0,0 +1,131 @@
+from parser import Parser, C_ARITHMETIC, C_PUSH, C_POP, C_LABEL, C_GOTO, C_IF, C_RETURN, C_CALL
+from linker import Linker
+
+class Inliner:
+    """
+    Inliner: Replaces the calls of small leaf functions (functions calling no other function, e.g. Memory.peek, Memory.poke or Math.abs) by their commands, so that the call and return sequences, which take about 100 instructions, are not run for a body of a few commands.
+    The inlined function has no frame of its own: its arguments, popped from the stack, and its local variables are kept in the temp segment, which is not preserved across a call anyway, in the entries its own commands do not use. Its labels are made unique to the call site, its static variables still belong to its file, and the pointers it changes (this and that) are restored when it returns, as a return does. A function is inlined only if its commands, function and return included, are no more than budget.
+    """
+    temp_size = 8	# temp 0 - 7
+
+    def __init__(self, code_contents, budget):
+        self.code_contents = code_contents
+        self.budget = budget
+        self.parser = Parser(None, static_file_operand=True)
+        self.inline_index = 0	# Counts the call sites inlined, to make their labels unique
+        self.find_inlinable_functions()
+
+    def find_inlinable_functions(self):
+        """Find the functions small enough to be inlined whose commands can all be inlined: {function name: (filename, number of local variables, commands of the body)}"""
+        linker = Linker(self.code_contents)
+        self.inlinable_functions = {}
+        for function_name, (filename, function_start, function_end) in linker.functions.items():
+            body = self.code_contents[filename][function_start + 1:function_end]
+            if function_end - function_start > self.budget or linker.callees[function_name]:
+                continue
+            if not body or body[-1].cmd_type != C_RETURN or not self.is_stack_balanced(body):
+                continue
+            local_vars_num = int(self.code_contents[filename][function_start].arguments[1])
+            self.inlinable_functions[function_name] = (filename, local_vars_num, body)
+
+    def is_stack_balanced(self, body):
+        """Is the working stack empty at every label and jump of the body, and holding only the returned value at every return? This is how the compiler writes statements, and the inlined body must not leave anything on the stack of the caller, where a return would have dropped it."""
+        depth = 0
+        for command_content in body:
+            cmd_type = command_content.cmd_type
+            if cmd_type == C_PUSH:
+                depth += 1
+            elif cmd_type == C_POP:
+                depth -= 1
+            elif cmd_type == C_ARITHMETIC:
+                depth -= 0 if command_content.arguments in {'neg', 'not'} else 1
+            elif cmd_type == C_IF:
+                depth -= 1
+            if depth < 0:
+                return False
+            if cmd_type in {C_LABEL, C_GOTO, C_IF} and depth != 0:
+                return False
+            if cmd_type == C_RETURN:
+                if depth != 1:
+                    return False
+                depth = 0	# The commands after a return are reached by a label only
+        return True
+
+    def allocate_temps(self, body, arguments_num, local_vars_num):
+        """Returns the map {(segment, index): temp index} of the arguments, the local variables, and the pointers the body changes, or None if the temp entries left unused by the body are too few"""
+        used_temps = set()
+        changed_pointers = set()
+        for command_content in body:
+            if command_content.cmd_type in {C_PUSH, C_POP}:
+                memory_segment, memory_index = command_content.arguments[:2]
+                if memory_segment == 'temp':
+                    used_temps.add(int(memory_index))
+                elif memory_segment == 'pointer' and command_content.cmd_type == C_POP:
+                    changed_pointers.add(memory_index)
+                elif memory_segment == 'argument' and int(memory_index) >= arguments_num:
+                    return None
+        free_temps = [temp_index for temp_index in range(self.temp_size) if temp_index not in used_temps]
+        variables = [('argument', str(i)) for i in range(arguments_num)] + [('local', str(i)) for i in range(local_vars_num)] + [('pointer', pointer) for pointer in sorted(changed_pointers)]
+        if len(variables) > len(free_temps):
+            return None
+        return dict(zip(variables, free_temps))
+
+    def inline_call(self, function_name, arguments_num):
+        """Returns the commands replacing the call of function_name with arguments_num arguments, or None if it cannot be inlined there"""
+        filename, local_vars_num, body = self.inlinable_functions[function_name]
+        temps = self.allocate_temps(body, arguments_num, local_vars_num)
+        if temps is None:
+            return None
+        self.inline_index += 1
+        label_prefix = 'INLINE_{}_'.format(self.inline_index)
+        end_label_name = label_prefix + 'END'
+        saved_pointers = [(pointer, temp_index) for (memory_segment, pointer), temp_index in temps.items() if memory_segment == 'pointer']
+        commands = []
+        for pointer, temp_index in saved_pointers:
+            commands += ['push pointer {}'.format(pointer), 'pop temp {}'.format(temp_index)]
+        for i in reversed(range(arguments_num)):	# The last argument is on top of the stack
+            commands.append('pop temp {}'.format(temps[('argument', str(i))]))
+        for i in range(local_vars_num):
+            commands += ['push constant 0', 'pop temp {}'.format(temps[('local', str(i))])]
+        for command_index, command_content in enumerate(body):
+            cmd_type = command_content.cmd_type
+            if cmd_type in {C_PUSH, C_POP}:
+                memory_segment, memory_index = command_content.arguments
+                word = 'push' if cmd_type == C_PUSH else 'pop'
+                if (memory_segment, memory_index) in temps and memory_segment != 'pointer':
+                    commands.append('{} temp {}'.format(word, temps[(memory_segment, memory_index)]))
+                elif memory_segment == 'static':	# A static variable of the file of the inlined function
+                    commands.append('{} static {} {}'.format(word, memory_index, filename))
+                else:
+                    commands.append(command_content.command)
+            elif cmd_type in {C_LABEL, C_GOTO, C_IF}:
+                label_name, = command_content.arguments
+                commands.append('{} {}'.format(command_content.command.split(' ')[0], label_prefix + label_name))
+            elif cmd_type == C_RETURN:	# The returned value is left on top of the stack
+                for pointer, temp_index in saved_pointers:
+                    commands += ['push temp {}'.format(temp_index), 'pop pointer {}'.format(pointer)]
+                if command_index < len(body) - 1:
+                    commands.append('goto ' + end_label_name)
+            else:
+                commands.append(command_content.command)
+        if any(command_content.cmd_type == C_RETURN for command_content in body[:-1]):
+            commands.append('label ' + end_label_name)
+        return [self.parser.parse_command(command) for command in commands]
+
+    def inline(self):
+        """Returns the code contents with the calls of the inlinable functions replaced by their commands. The inlined functions are left, the Linker removes them once they are not called anymore."""
+        if not self.inlinable_functions:
+            return self.code_contents
+        inlined_contents = {}
+        for filename, command_contents in self.code_contents.items():
+            inlined_commands = []
+            for command_content in command_contents:
+                if command_content.cmd_type == C_CALL and command_content.arguments[0] in self.inlinable_functions:
+                    function_name, arguments_num = command_content.arguments
+                    commands = self.inline_call(function_name, int(arguments_num))
+                    if commands is not None:
+                        inlined_commands += commands
+                        continue
+                inlined_commands.append(command_content)
+            inlined_contents[filename] = inlined_commands
+        return inlined_contents
@@ -0,0 +1,88 @@
+from code_writer import CodeWriter
+from parser import C_FUNCTION, C_CALL
+
+class Linker:
+    """
+    Linker: Removes the functions which can never run from a whole program, before it is translated. Starting from Sys.init, which the bootstrap code calls, every function called by a reachable function is reachable, the VM language having no other way to jump to a function. The other functions are dropped, with their commands, from the code contents given by the Parser of each vm file.
+    Both passes read the commands of each file in order, once: the first one, when the Linker is created, finds the functions and their calls, and the second one, link_commands, drops the unreachable functions as the commands are read again, so that a program streamed from its vm files is never held in memory as a whole.
+    """
+    entry_function_name = 'Sys.init'
+
+    def __init__(self, code_contents, code_writer_options=()):
+        self.code_contents = code_contents
+        self.code_writer_options = code_writer_options	# The options the CodeWriter translates the program with, use_trampolines, use_compare_routines and cache_stack_top, which the functions removed are counted with too
+        self.functions = {}	# {function name: (filename, index of its function command, index after its last command)}
+        self.callees = {}	# {function name: set of the names of the functions it calls}
+        self.class_report = {}	# {class name: [number of functions removed, ROM words saved]}, counted as the functions are removed
+        self.split_functions()
+
+    def split_functions(self):
+        """Find the commands of each function and the functions it calls, a function runs until the next function command of its file"""
+        for filename, command_contents in self.code_contents.items():
+            function_name = None
+            command_index = -1
+            for command_index, command_content in enumerate(command_contents):
+                cmd_type = command_content.cmd_type
+                if cmd_type == C_FUNCTION:
+                    if function_name is not None:
+                        self.functions[function_name] = (filename, function_start, command_index)
+                    function_name = command_content.arguments[0]
+                    function_start = command_index
+                    self.callees[function_name] = set()
+                elif cmd_type == C_CALL and function_name is not None:
+                    self.callees[function_name].add(command_content.arguments[0])
+            if function_name is not None:
+                self.functions[function_name] = (filename, function_start, command_index + 1)
+
+    def find_reachable_functions(self):
+        """Returns the set of the names of the functions reachable from Sys.init"""
+        reachable_functions = {self.entry_function_name}
+        function_names = [self.entry_function_name]
+        while function_names:
+            for callee in self.callees.get(function_names.pop(), ()):
+                if callee not in reachable_functions:
+                    reachable_functions.add(callee)
+                    function_names.append(callee)
+        return reachable_functions
+
+    def link_commands(self, filename, command_contents, reachable_functions):
+        """Yields the commands of one vm file, read again, which are not in an unreachable function. The commands of each function removed are kept until the next function command only, to count the ROM words it saves in class_report."""
+        removed_commands = None	# The commands of the function being removed
+        for command_content in command_contents:
+            if command_content.cmd_type == C_FUNCTION:
+                if removed_commands is not None:
+                    self.count_removed_function(filename, removed_commands)
+                removed_commands = None if command_content.arguments[0] in reachable_functions else []
+            if removed_commands is None:
+                yield command_content
+            else:
+                removed_commands.append(command_content)
+        if removed_commands is not None:
+            self.count_removed_function(filename, removed_commands)
+
+    def link_lazily(self, code_contents):
+        """Returns the code contents, read again from code_contents, with the commands of each file filtered by link_commands as they are read. A program without Sys.init has no bootstrap code to start from, so nothing is removed."""
+        if self.entry_function_name not in self.functions:
+            return code_contents
+        reachable_functions = self.find_reachable_functions()
+        return {filename: self.link_commands(filename, command_contents, reachable_functions) for filename, command_contents in code_contents.items()}
+
+    def link(self):
+        """Returns the code contents without the unreachable functions, and the list of the names of the functions removed. A program without Sys.init has no bootstrap code to start from, so nothing is removed."""
+        if self.entry_function_name not in self.functions:
+            return self.code_contents, []
+        reachable_functions = self.find_reachable_functions()
+        removed_functions = [function_name for function_name in self.functions if function_name not in reachable_functions]
+        linked_contents = {filename: list(self.link_commands(filename, command_contents, reachable_functions)) for filename, command_contents in self.code_contents.items()}
+        return linked_contents, removed_functions
+
+    def count_rom_words(self, filename, function_commands):
+        """Returns the number of Hack instructions the commands of a function of filename are translated to with the options of the program, which is the number of ROM words it takes"""
+        assembly_codes = CodeWriter({filename: function_commands}, None, *self.code_writer_options).translate()
+        return sum(1 for code_line in assembly_codes if not code_line.startswith('//') and not code_line.startswith('('))
+
+    def count_removed_function(self, filename, function_commands):
+        """Add the function removed from filename to class_report, the class of a function being the vm file it is in"""
+        class_counts = self.class_report.setdefault(filename, [0, 0])
+        class_counts[0] += 1
+        class_counts[1] += self.count_rom_words(filename, function_commands)
@@ -0,0 +1,94 @@
+from parser import C_ARITHMETIC, C_PUSH, C_POP, C_LABEL, C_GOTO, C_IF, C_FUNCTION, C_RETURN, C_CALL
+
+class PeepholeOptimizer:
+    """
+    PeepholeOptimizer: Rewrites the redundant sequences of a few VM commands, in the code contents given by the Parser of each vm file, before they are translated. A pattern is a name, the number of commands it looks at and a rewrite function, which is given that many commands and returns the commands replacing them, or None if they do not match.
+    The commands are read one by one and the patterns are tried on the last commands kept each time one is added or replaced, so that a rewrite exposing another match, e.g. not; not; not; not, is rewritten again. A rewrite function may look at the commands not read yet through is_temp_dead. The number of rewrites of each pattern is counted in hits.
+    With jack_output, the vm files are known to be compiled from Jack: the compiler only keeps a value in temp within a statement, never for another function, so temp is dead at a call or a return. Any vm file may pass a value to the function it calls in temp, so this is not assumed otherwise.
+    """
+    def __init__(self, jack_output=False):
+        self.jack_output = jack_output
+        self.patterns = []	# [(pattern name, number of commands, rewrite function)] in the order they are tried
+        self.hits = {}	# {pattern name: number of rewrites}
+        self.command_contents = []	# The commands of the vm file being optimized
+        self.next_command_index = 0	# Index in command_contents of the next command to read
+        self.add_pattern('goto-next-label', 2, self.rewrite_goto_next_label)
+        self.add_pattern('unreachable-command', 2, self.rewrite_unreachable_command)
+        self.add_pattern('push-pop-same', 2, self.rewrite_push_pop_same)
+        self.add_pattern('double-negation', 2, self.rewrite_double_negation)
+        self.add_pattern('identity-constant', 2, self.rewrite_identity_constant)
+        self.add_pattern('dead-temp-store', 2, self.rewrite_dead_temp_store)
+
+    def add_pattern(self, pattern_name, commands_num, rewrite):
+        """Append the pattern to the pattern table, its name must be unique"""
+        assert pattern_name not in self.hits, "Pattern {} added twice.".format(pattern_name)
+        self.patterns.append((pattern_name, commands_num, rewrite))
+        self.hits[pattern_name] = 0
+
+    def rewrite_goto_next_label(self, commands):
+        """goto L; label L -> label L"""
+        if commands[0].cmd_type == C_GOTO and commands[1].cmd_type == C_LABEL and commands[0].arguments == commands[1].arguments:
+            return commands[1:]
+
+    def rewrite_unreachable_command(self, commands):
+        """goto L or return, followed by a command which is neither a label nor a function -> goto L or return, the command can never run"""
+        if commands[0].cmd_type in {C_GOTO, C_RETURN} and commands[1].cmd_type not in {C_LABEL, C_FUNCTION}:
+            return commands[:1]
+
+    def rewrite_push_pop_same(self, commands):
+        """push segment i; pop segment i -> nothing, the entry is written back unchanged"""
+        if commands[0].cmd_type == C_PUSH and commands[1].cmd_type == C_POP and commands[0].arguments == commands[1].arguments:
+            return []
+
+    def rewrite_double_negation(self, commands):
+        """not; not or neg; neg -> nothing"""
+        if commands[0].cmd_type == C_ARITHMETIC and commands[0].arguments in {'not', 'neg'} and commands[1].command == commands[0].arguments:
+            return []
+
+    def rewrite_identity_constant(self, commands):
+        """push constant 0; add or sub or or -> nothing, the top of the stack is left unchanged"""
+        if commands[0].command == 'push constant 0' and commands[1].cmd_type == C_ARITHMETIC and commands[1].arguments in {'add', 'sub', 'or'}:
+            return []
+
+    def rewrite_dead_temp_store(self, commands):
+        """push constant c; pop temp i -> nothing, if temp i is written again before it is read, e.g. push constant 0; pop temp 0 left by a void function inlined in a do statement"""
+        if commands[0].cmd_type == C_PUSH and commands[0].arguments[0] == 'constant' and commands[1].cmd_type == C_POP and commands[1].arguments[0] == 'temp' and self.is_temp_dead(commands[1].arguments[1]):
+            return []
+
+    def is_temp_dead(self, temp_index):
+        """Is temp temp_index written by the commands not read yet before it is read, or, with jack_output only, left when the function calls another one or returns? The commands reached by a jump are not followed, so a label or a jump reached first means it may be read, and so does a call or a return of any vm file."""
+        for command_content in self.command_contents[self.next_command_index:]:
+            cmd_type = command_content.cmd_type
+            if cmd_type in {C_PUSH, C_POP} and command_content.arguments[:2] == ('temp', temp_index):
+                return cmd_type == C_POP
+            if cmd_type in {C_CALL, C_RETURN, C_FUNCTION}:
+                return self.jack_output
+            if cmd_type in {C_LABEL, C_GOTO, C_IF}:
+                return False
+        return False
+
+    def optimize_commands(self, command_contents):
+        """Returns the commands of one vm file rewritten until no pattern matches"""
+        optimized_commands = []
+        self.command_contents = list(command_contents)	# is_temp_dead looks at the commands not read yet, so command_contents, e.g. a Parser, is read as a whole
+        for command_index, command_content in enumerate(self.command_contents):
+            self.next_command_index = command_index + 1
+            optimized_commands.append(command_content)
+            matched = True
+            while matched:
+                matched = False
+                for pattern_name, commands_num, rewrite in self.patterns:
+                    if len(optimized_commands) < commands_num:
+                        continue
+                    rewritten_commands = rewrite(optimized_commands[-commands_num:])
+                    if rewritten_commands is not None:
+                        del optimized_commands[-commands_num:]
+                        optimized_commands += rewritten_commands
+                        self.hits[pattern_name] += 1
+                        matched = True
+                        break
+        return optimized_commands
+
+    def optimize(self, code_contents):
+        """Returns the code contents with the commands of every vm file optimized"""
+        return {filename: self.optimize_commands(command_contents) for filename, command_contents in code_contents.items()}
@@ -1,14 +1,120 @@
 #!/usr/bin/python3
 
 import unittest
+import shutil
+import tempfile
 from pathlib import Path
 import subprocess as sp
 
+from parser import Parser
+from VMoptimizer import optimize_vm
+from VMtranslator import translate_vm
+from code_writer import CodeWriter
+from constant_folder import ConstantFolder
+from peephole_optimizer import PeepholeOptimizer
+from inliner import Inliner
+from linker import Linker
+
+sys_vm_code = '''function Sys.init 0
+push constant 5000
+pop pointer 1
+call Main.main 0
+pop that 0
+label HALT
+goto HALT
+'''
+main_vm_code = '''function Main.main 2
+push constant 0
+pop local 0
+push constant 0
+pop local 1
+label LOOP
+push local 0
+push constant 10
+lt
+not
+if-goto END
+push local 1
+push local 0
+call Main.double 1
+add
+pop local 1
+push local 0
+push constant 1
+add
+pop local 0
+goto LOOP
+label END
+push local 1
+push constant 3
+push constant 4
+call Math.multiply 2
+add
+not
+not
+push constant 0
+add
+return
+function Main.double 0
+push argument 0
+push argument 0
+add
+return
+function Main.unused 0
+push constant 1
+return
+'''
+math_vm_code = '''function Math.multiply 1
+push constant 0
+pop local 0
+label LOOP
+push argument 1
+push constant 0
+eq
+if-goto END
+push local 0
+push argument 0
+add
+pop local 0
+push argument 1
+push constant 1
+sub
+pop argument 1
+goto LOOP
+label END
+push local 0
+return
+'''
+
+def parse_commands(vm_code):
+    """Returns the VMCommands of the lines of vm_code"""
+    parser = Parser(None)
+    return [parser.parse_command(command) for command in vm_code.splitlines()]
+
+def command_lines(command_contents):
+    return [command_content.command for command_content in command_contents]
+
+def run_program(vm_codes, ram_addresses, **options):
+    """Translate the program of the vm files {class name: vm code} vm_codes with the options of translate_vm, and run it on the Hack CPU emulator of the assembler until it halts. Returns the words of the RAM at ram_addresses and the number of instructions run."""
+    cpu_emulator = Path.cwd().parent / '06_assembler/hack_emulator.py'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        program_dir = Path(tmp_dir) / 'Program'
+        program_dir.mkdir()
+        for class_name, vm_code in vm_codes.items():
+            (program_dir / (class_name + '.vm')).write_text(vm_code)
+        out_asm_file = translate_vm(program_dir, **options)
+        proc_run = sp.run([cpu_emulator.as_posix(), out_asm_file.as_posix(), '--ram', *(str(address) for address in ram_addresses)], stdout=sp.PIPE, universal_newlines=True, check=True)
+    lines = proc_run.stdout.splitlines()
+    assert lines[0].startswith('Halted after '), lines[0]
+    return [int(line.split(' = ')[1]) for line in lines[1:]], int(lines[0].split()[2])
+
 class VMtranslator(unittest.TestCase):
 
     def setUp(self):
         self.cwd = Path.cwd()
-        self.given_cpu_emulator_tool = self.cwd.parent / 'tools/CPUEmulator.sh'
+        self.cpu_emulator = self.cwd.parent / 'tools/CPUEmulator.sh'	# The given CPU emulator, the reference the asm files are compared with
+        if shutil.which('java') is None:	# The Hack CPU emulator of the assembler otherwise
+            self.cpu_emulator = self.cwd.parent / '06_assembler/hack_emulator.py'
         self.my_vm_translator = self.cwd / 'VMtranslator.py'
 
     def run_test(self, vm_path_input):
@@ -22,8 +128,8 @@ class VMtranslator(unittest.TestCase):
         proc_translate = sp.run([self.my_vm_translator.as_posix(), vm_path_input.as_posix()], stdout=sp.PIPE, universal_newlines=True)
         self.assertEqual(proc_translate.stdout, 'Successfully translate to assembly ' + asm_file.as_posix() + '\n')
         self.assertTrue(asm_file.exists())
-        # Use given CPU emulator to compare generated asm file
-        proc_compare = sp.run([self.given_cpu_emulator_tool.as_posix(), tst_file], stdout=sp.PIPE, universal_newlines=True)
+        # Use the CPU emulator to compare generated asm file
+        proc_compare = sp.run([self.cpu_emulator.as_posix(), tst_file], stdout=sp.PIPE, universal_newlines=True)
         self.assertEqual(proc_compare.stdout, 'End of script - Comparison ended successfully\n')
 
     def test_program_flow_basic_loop_test(self):
@@ -50,5 +156,286 @@ class VMtranslator(unittest.TestCase):
         vm_dir = self.cwd / 'test/FunctionCalls/StaticsTest'
         self.run_test(vm_dir)
 
+class VMParser(unittest.TestCase):
+
+    def parse_lines(self, lines):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vmfile = Path(tmp_dir) / 'Main.vm'
+            vmfile.write_text('\n'.join(lines) + '\n')
+            return Parser(vmfile).parse()['Main']
+
+    def test_wrong_commands(self):
+        for command in ('push static 2 Foo', 'pop static 2 Foo', 'push constant', 'pop constant 1', 'push temp 8', 'push local x', 'push heap 0', 'add 1', 'jump'):
+            with self.subTest(command=command):
+                with self.assertRaisesRegex(SyntaxError, 'Main.vm:2: '):
+                    self.parse_lines(['push constant 1', command])
+
+    def test_static_file_operand_of_inliner(self):
+        with self.assertRaises(SyntaxError):
+            Parser(None).parse_command('push static 2 Foo')
+        command_content = Parser(None, static_file_operand=True).parse_command('push static 2 Foo')
+        self.assertEqual(command_content.arguments, ('static', '2', 'Foo'))
+
+class VMoptimizer(unittest.TestCase):
+    vm_code = 'function Main.f 0\npush constant 0\npop temp 0\ncall Main.g 0\npush temp 1\nnot\nnot\nreturn\n'
+
+    def optimize_source(self, jack_output=False, output_dir=None, in_place=False):
+        """Optimize the vm file Main.vm of vm_code, returns its code and the code of the vm file written"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vmfile = Path(tmp_dir) / 'Main.vm'
+            vmfile.write_text(self.vm_code)
+            out_vm_files = optimize_vm(vmfile, output_dir and Path(tmp_dir) / output_dir, PeepholeOptimizer(jack_output), in_place=in_place)
+            self.assertEqual(len(out_vm_files), 1)
+            return vmfile.read_text(), out_vm_files[0].relative_to(tmp_dir), out_vm_files[0].read_text()
+
+    def test_written_beside_input_by_default(self):
+        vm_code, out_vm_file, optimized_code = self.optimize_source()
+        self.assertEqual(vm_code, self.vm_code)
+        self.assertEqual(out_vm_file, Path('optimized/Main.vm'))
+        self.assertNotIn('not', optimized_code)
+        vm_code, out_vm_file, optimized_code = self.optimize_source(output_dir='out')
+        self.assertEqual(vm_code, self.vm_code)
+        self.assertEqual(out_vm_file, Path('out/Main.vm'))
+
+    def test_in_place_only_when_asked(self):
+        vm_code, out_vm_file, optimized_code = self.optimize_source(in_place=True)
+        self.assertEqual(out_vm_file, Path('Main.vm'))
+        self.assertEqual(vm_code, optimized_code)
+        self.assertNotIn('not', vm_code)
+
+    def test_temp_dead_across_call_for_jack_output_only(self):
+        # Main.g may read temp 0 in any vm file, but not in one compiled from Jack
+        self.assertIn('pop temp 0', self.optimize_source()[2])
+        self.assertNotIn('pop temp 0', self.optimize_source(jack_output=True)[2])
+
+class ConstantFolderTest(unittest.TestCase):
+
+    def fold(self, vm_code):
+        return command_lines(ConstantFolder().fold_commands(parse_commands(vm_code)))
+
+    def test_arithmetic_and_math_calls(self):
+        self.assertEqual(self.fold('push constant 16\npush constant 32\ncall Math.multiply 2'), ['push constant 512'])
+        self.assertEqual(self.fold('push constant 7\npush constant 2\nsub\nneg\npush constant 3\nand'), ['push constant 3'])
+        self.assertEqual(self.fold('push constant 100\ncall Math.sqrt 1\npush constant 7\ncall Math.divide 2'), ['push constant 1'])
+        self.assertEqual(self.fold('push constant 5\npush constant 3\ngt\npush constant 2\npush constant 3\nlt\nand'), ['push constant 1', 'neg'])
+        for operator, value in (('eq', 'push constant 1'), ('gt', 'push constant 0'), ('lt', 'push constant 0')):
+            with self.subTest(operator=operator):
+                self.assertEqual(self.fold('push constant 3\npush constant 3\n{}\nneg'.format(operator)), [value])
+
+    def test_words_written_with_legal_commands(self):
+        self.assertEqual(self.fold('push constant 32767\npush constant 1\nadd'), ['push constant 32767', 'not'])
+        self.assertEqual(self.fold('push constant 0\npush constant 5\nsub'), ['push constant 5', 'neg'])
+
+    def test_left_to_run(self):
+        # A division by 0, the square root of a negative number, and calls on values not known
+        for vm_code in ('push constant 1\npush constant 0\ncall Math.divide 2', 'push constant 1\nneg\ncall Math.sqrt 1', 'push local 0\npush constant 2\ncall Math.multiply 2'):
+            with self.subTest(vm_code=vm_code):
+                self.assertEqual(self.fold(vm_code)[-1], vm_code.splitlines()[-1])
+
+    def test_known_jump(self):
+        self.assertEqual(self.fold('push constant 1\npush constant 2\nlt\nif-goto L\nlabel L'), ['goto L', 'label L'])
+        self.assertEqual(self.fold('push constant 7\npush constant 1\npush constant 2\ngt\nif-goto L\nlabel L'), ['push constant 7', 'label L'])
+
+    def test_values_written_before_other_commands(self):
+        constant_folder = ConstantFolder()
+        folded_commands = command_lines(constant_folder.fold_commands(parse_commands('push constant 2\npush constant 3\nlabel L\nadd\npush constant 1\npush constant 1\nadd\ncall Main.f 1')))
+        self.assertEqual(folded_commands, ['push constant 2', 'push constant 3', 'label L', 'add', 'push constant 2', 'call Main.f 1'])
+        self.assertEqual(constant_folder.folded_commands_num, 2)
+
+    def test_program(self):
+        self.assertEqual(run_program({'Sys': sys_vm_code, 'Main': main_vm_code, 'Math': math_vm_code}, [5000], fold_constants=True)[0], [102])
+
+class PeepholeOptimizerTest(unittest.TestCase):
+
+    def optimize(self, vm_code, jack_output=False):
+        """Returns the commands of vm_code optimized, and the patterns rewriting them"""
+        peephole_optimizer = PeepholeOptimizer(jack_output)
+        optimized_commands = command_lines(peephole_optimizer.optimize_commands(parse_commands(vm_code)))
+        return optimized_commands, {pattern_name for pattern_name, hits in peephole_optimizer.hits.items() if hits}
+
+    def test_patterns(self):
+        vm_codes = {
+                'goto L\nlabel L': (['label L'], {'goto-next-label'}),
+                'goto L\npush constant 1\nadd\nlabel M': (['goto L', 'label M'], {'unreachable-command'}),
+                'return\npush constant 1\nfunction Main.g 0': (['return', 'function Main.g 0'], {'unreachable-command'}),
+                'push local 2\npop local 2': ([], {'push-pop-same'}),
+                'push local 2\npop local 1': (['push local 2', 'pop local 1'], set()),
+                'not\nnot\nneg\nneg': ([], {'double-negation'}),
+                'not\nneg': (['not', 'neg'], set()),
+                'push constant 0\nadd\npush constant 0\nsub\npush constant 0\nor': ([], {'identity-constant'}),
+                'push constant 0\nand': (['push constant 0', 'and'], set()),
+                'push constant 0\npop temp 0\npush local 0\npop temp 0': (['push local 0', 'pop temp 0'], {'dead-temp-store'}),
+                'push constant 0\npop temp 0\npush temp 0\npop temp 0': (['push constant 0', 'pop temp 0'], {'push-pop-same'}),
+                'push constant 0\npop temp 0\nlabel L\npop temp 0': (['push constant 0', 'pop temp 0', 'label L', 'pop temp 0'], set()),
+                }
+        for vm_code, (optimized_commands, pattern_names) in vm_codes.items():
+            with self.subTest(vm_code=vm_code):
+                self.assertEqual(self.optimize(vm_code), (optimized_commands, pattern_names))
+
+    def test_rewrites_exposing_matches(self):
+        self.assertEqual(self.optimize('not\nnot\nnot\nnot'), ([], {'double-negation'}))
+        self.assertEqual(self.optimize('push local 0\nnot\nnot\npop local 0'), ([], {'double-negation', 'push-pop-same'}))
+        self.assertEqual(self.optimize('goto L\npush constant 1\nlabel L'), (['label L'], {'unreachable-command', 'goto-next-label'}))
+
+    def test_program(self):
+        for jack_output in (False, True):
+            with self.subTest(jack_output=jack_output):
+                self.assertEqual(run_program({'Sys': sys_vm_code, 'Main': main_vm_code, 'Math': math_vm_code}, [5000], peephole_hits={}, jack_output=jack_output)[0], [102])
+
+class InlinerTest(unittest.TestCase):
+
+    def inline(self, code_contents, budget=10):
+        return {filename: command_lines(command_contents) for filename, command_contents in Inliner({filename: parse_commands(vm_code) for filename, vm_code in code_contents.items()}, budget).inline().items()}
+
+    def test_leaf_function_inlined(self):
+        inlined_commands = self.inline({'Main': main_vm_code})['Main']
+        self.assertNotIn('call Main.double 1', inlined_commands)
+        self.assertEqual(inlined_commands.count('function Main.double 0'), 1)	# Left for the Linker
+        self.assertIn('call Math.multiply 2', inlined_commands)	# Not a function of the program
+
+    def test_budget(self):
+        self.assertIn('call Main.double 1', self.inline({'Main': main_vm_code}, budget=4)['Main'])
+        self.assertNotIn('call Main.double 1', self.inline({'Main': main_vm_code}, budget=5)['Main'])
+
+    def test_not_inlined(self):
+        vm_codes = {	# A function calling another one, not returning once, with a return leaving the stack unbalanced, or using more temps than are left
+                'calling': 'function Main.f 0\ncall Main.g 0\nreturn\nfunction Main.g 0\npush constant 1\nreturn',
+                'not returning': 'function Main.f 0\nlabel L\ngoto L',
+                'unbalanced': 'function Main.f 0\npush constant 1\npush constant 2\nreturn',
+                'temps': 'function Main.f 8\npush temp 0\nreturn',
+                }
+        for reason, vm_code in vm_codes.items():
+            with self.subTest(reason=reason):
+                self.assertIn('call Main.f 0', self.inline({'Main': vm_code + '\nfunction Main.main 0\ncall Main.f 0\nreturn'})['Main'])
+
+    def test_frame_in_temps(self):
+        inlined_commands = self.inline({
+                'Main': 'function Main.main 0\npush constant 1\npush constant 2\ncall Foo.f 2\nreturn',
+                'Foo': 'function Foo.f 1\npush argument 0\npop pointer 1\npush argument 1\npop local 0\nlabel L\npush local 0\npush static 3\nadd\nreturn',
+                }, budget=20)['Main']
+        self.assertEqual(inlined_commands, [
+                'function Main.main 0', 'push constant 1', 'push constant 2',
+                'push pointer 1', 'pop temp 3',	# that is restored at the return
+                'pop temp 1', 'pop temp 0', 'push constant 0', 'pop temp 2',
+                'push temp 0', 'pop pointer 1', 'push temp 1', 'pop temp 2', 'label INLINE_1_L', 'push temp 2', 'push static 3 Foo', 'add',
+                'push temp 3', 'pop pointer 1',
+                'return',
+                ])
+
+    def test_program(self):
+        vm_codes = {'Sys': sys_vm_code, 'Main': main_vm_code, 'Math': math_vm_code}
+        ram, cycles = run_program(vm_codes, [5000])
+        for inline_budget in (5, 30):
+            with self.subTest(inline_budget=inline_budget):
+                inlined_ram, inlined_cycles = run_program(vm_codes, [5000], inline_budget=inline_budget)
+                self.assertEqual(inlined_ram, ram)
+                self.assertLess(inlined_cycles, cycles)
+
+class LinkerTest(unittest.TestCase):
+
+    def test_unreachable_functions_removed(self):
+        linker = Linker({'Sys': parse_commands(sys_vm_code), 'Main': parse_commands(main_vm_code), 'Math': parse_commands(math_vm_code)})
+        self.assertEqual(linker.find_reachable_functions(), {'Sys.init', 'Main.main', 'Main.double', 'Math.multiply'})
+        linked_contents, removed_functions = linker.link()
+        self.assertEqual(removed_functions, ['Main.unused'])
+        self.assertEqual(command_lines(linked_contents['Main'])[-1], 'return')
+        self.assertNotIn('function Main.unused 0', command_lines(linked_contents['Main']))
+        self.assertEqual(list(linker.class_report), ['Main'])
+        functions_num, rom_words = linker.class_report['Main']
+        self.assertEqual(functions_num, 1)
+        self.assertGreater(rom_words, 0)
+
+    def test_without_sys_init(self):
+        linker = Linker({'Main': parse_commands(main_vm_code)})
+        linked_contents, removed_functions = linker.link()
+        self.assertEqual(removed_functions, [])
+        self.assertEqual(command_lines(linked_contents['Main']), main_vm_code.splitlines())
+
+    def test_program(self):
+        vm_codes = {'Sys': sys_vm_code, 'Main': main_vm_code, 'Math': math_vm_code}
+        linker_report = {}
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(run_program(vm_codes, [5000], linker_report=linker_report, jobs=jobs)[0], [102])
+                self.assertEqual(linker_report['Main'][0], 1)
+        self.assertEqual(run_program(vm_codes, [5000], eliminate_dead_functions=False)[0], [102])
+
+    def count_rom_words(self, vm_codes, **options):
+        """Returns the number of Hack instructions of the program of the vm files {class name: vm code} vm_codes translated with the options of translate_vm"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            program_dir = Path(tmp_dir) / 'Program'
+            program_dir.mkdir()
+            for class_name, vm_code in vm_codes.items():
+                (program_dir / (class_name + '.vm')).write_text(vm_code)
+            assembly_codes = translate_vm(program_dir, **options).read_text().splitlines()
+        return sum(1 for code_line in assembly_codes if code_line and not code_line.startswith('//') and not code_line.startswith('('))
+
+    def test_rom_words_saved(self):
+        dead_vm_code = 'function Dead.f 1\npush argument 0\npush constant 3\ncall Math.multiply 2\npush local 0\nlt\nif-goto END\ncall Main.double 1\npop local 0\nlabel END\npush local 0\nreturn\n'
+        vm_codes = {'Sys': sys_vm_code, 'Main': main_vm_code, 'Math': math_vm_code, 'Dead': dead_vm_code}
+        for options in ({}, {'use_trampolines': True}, {'use_compare_routines': True}, {'cache_stack_top': True}, {'use_trampolines': True, 'use_compare_routines': True, 'cache_stack_top': True}):
+            for jobs in (1, 2):
+                with self.subTest(jobs=jobs, **options):
+                    linker_report = {}
+                    rom_words = self.count_rom_words(vm_codes, linker_report=linker_report, jobs=jobs, **options)
+                    self.assertEqual(sorted(linker_report), ['Dead', 'Main'])
+                    self.assertEqual(sum(rom_words for functions_num, rom_words in linker_report.values()), self.count_rom_words(vm_codes, eliminate_dead_functions=False, **options) - rom_words)
+
+class CompareIfGoto(unittest.TestCase):
+    values = ((-3, -3), (-3, 2), (2, -3), (0, 0), (7, 7), (100, -100), (300, -200))	# X - Y overflows for values farther apart, in the fused and the unfused comparisons alike
+
+    def comparisons_vm_code(self):
+        """Returns Main.main writing to that k whether the comparison k of values with each operator and negation jumps, 1 or 0, and the expected words"""
+        commands = ['function Main.main 0']
+        expected_ram = []
+        for operator, compare in (('eq', lambda x, y: x == y), ('gt', lambda x, y: x > y), ('lt', lambda x, y: x < y)):
+            for is_negated in (False, True):
+                for x, y in self.values:
+                    k = len(expected_ram)
+                    for value in (x, y):
+                        commands += ['push constant {}'.format(abs(value)), 'pop temp 0', 'push temp 0'] + (['neg'] if value < 0 else [])	# Through temp, so that it is not folded
+                    commands += [operator] + (['not'] if is_negated else []) + ['if-goto TRUE_{}'.format(k), 'push constant 0', 'pop that {}'.format(k), 'goto NEXT_{}'.format(k), 'label TRUE_{}'.format(k), 'push constant 1', 'pop that {}'.format(k), 'label NEXT_{}'.format(k)]
+                    expected_ram.append(int(compare(x, y) != is_negated))
+        commands += ['push constant 0', 'return']
+        return '\n'.join(commands) + '\n', expected_ram
+
+    def test_fused_into_one_jump(self):
+        for vm_code, jump in (('lt\nnot\nif-goto L', 'D;JGE'), ('gt\nif-goto L', 'D;JGT'), ('eq\nnot\nif-goto L', 'D;JNE')):
+            with self.subTest(vm_code=vm_code):
+                assembly_codes = CodeWriter({'Main': parse_commands(vm_code)}, None).translate()
+                self.assertEqual([code_line for code_line in assembly_codes if ';J' in code_line], [jump])
+                self.assertFalse(any(code_line.startswith('(IS_') for code_line in assembly_codes))
+
+    def test_not_fused(self):
+        assembly_codes = CodeWriter({'Main': parse_commands('lt\npop local 0\nlabel L')}, None).translate()
+        self.assertTrue(any(code_line.startswith('(IS_LT_') for code_line in assembly_codes))
+
+    def test_program(self):
+        vm_code, expected_ram = self.comparisons_vm_code()
+        vm_codes = {'Sys': sys_vm_code.replace('pop that 0', 'pop temp 0'), 'Main': vm_code}
+        for options in ({}, {'cache_stack_top': True}, {'use_compare_routines': True}, {'fold_constants': True, 'peephole_hits': {}}):
+            with self.subTest(options=options):
+                self.assertEqual(run_program(vm_codes, range(5000, 5000 + len(expected_ram)), **options)[0], expected_ram)
+
+class CacheStackTop(unittest.TestCase):
+
+    def test_top_kept_in_D(self):
+        command_contents = parse_commands('push local 0\npush local 1\nadd\npop local 2')
+        assembly_codes = CodeWriter({'Main': command_contents}, None, cache_stack_top=True).translate()
+        self.assertEqual(sum(1 for code_line in assembly_codes if code_line == '@SP'), 3)	# Local 0 is written to the stack by the push of local 1, and read by the add, local 1 is never written
+        self.assertEqual(assembly_codes[-4:], ['@LCL', 'A=M+1', 'A=A+1', 'M=D'])	# The sum is popped from D
+        self.assertLess(len(assembly_codes), len(CodeWriter({'Main': command_contents}, None).translate()))
+        # The top of the stack is written to the stack before a label, which may be jumped to
+        self.assertEqual(CodeWriter({'Main': parse_commands('push constant 1\nlabel L')}, None, cache_stack_top=True).translate(), ['// push constant 1', 'D=1', '// label L', '@SP', 'A=M', 'M=D', '@SP', 'M=M+1', '(L_Main)'])
+
+    def test_program(self):
+        vm_codes = {'Sys': sys_vm_code, 'Main': main_vm_code, 'Math': math_vm_code}
+        ram, cycles = run_program(vm_codes, [5000])
+        for options in ({}, {'use_trampolines': True}, {'use_compare_routines': True}, {'inline_budget': 30, 'fold_constants': True, 'peephole_hits': {}}):
+            with self.subTest(options=options):
+                cached_ram, cached_cycles = run_program(vm_codes, [5000], cache_stack_top=True, **options)
+                self.assertEqual(cached_ram, ram)
+                self.assertLess(cached_cycles, run_program(vm_codes, [5000], **options)[1])
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,10 +1,12 @@
 # import xml.etree.ElementTree as etree
 from lxml import etree
 
+from TokenStream import TokenStream
+
 class CompilationEngine:
     """CompilationEngine: Effects the actual compilation output. Gets its input from a JackTokenizer and emits its parsed structure into an output file/stream."""
-    def __init__(self, tokens_with_tokenType, out_xml_file):
-        self.tokens_with_tokenType = tokens_with_tokenType
+    def __init__(self, tokens, out_xml_file):
+        self.token_stream = TokenStream(tokens)
         self.out_xml_file = out_xml_file
 
     def compile(self):
@@ -18,32 +20,23 @@ class CompilationEngine:
         return compiled_etree
 
     def compile_new_token_ensure_token_type(self, correct_token_type, parent):
-        token, token_type = self.compile_new_token(parent)
-        assert token_type == correct_token_type, '{} with token_type {} not expected'.format(token, token_type)
+        token, token_type, line, column = self.compile_new_token(parent)
+        assert token_type == correct_token_type, '{} with token_type {} not expected at line {}, column {}'.format(token, token_type.value, line, column)
 
     def compile_new_token_ensure_token(self, correct_token, parent):
-        token, token_type = self.compile_new_token(parent)
-        assert token == correct_token, '{} with token_type {} not expected'.format(token, token_type)
+        token, token_type, line, column = self.compile_new_token(parent)
+        assert token == correct_token, '{} with token_type {} not expected at line {}, column {}'.format(token, token_type.value, line, column)
 
     def compile_new_token(self, parent):
-        token, token_type = self.next_token_and_type()
-        self.add_sub_element(parent, token_type, token)
-        return token, token_type
+        token_record = self.token_stream.advance()
+        token, token_type, line, column = token_record
+        self.add_sub_element(parent, token_type.value, token)
+        return token_record
 
     def add_sub_element(self, parent, element_tag, element_text):
         new_element = etree.SubElement(parent, element_tag)
         new_element.text = ' ' + element_text + ' '
 
-    def next_token_and_type(self):
-        return self.tokens_with_tokenType.pop(0)
-
-    def show_next_token(self):
-        token, token_type = self.tokens_with_tokenType[0]
-        return token
-
-    def show_next_token_and_type(self):
-        return self.tokens_with_tokenType[0]
-
     def compile_class(self):
         """
         Compiles a complete class.
@@ -61,16 +54,15 @@ class CompilationEngine:
         Compiles a static declaration or a field declaration.
         classVarDec: ('static' | 'field') type varName (',' varName)* ';'
         """
-        token = self.show_next_token()
-        if token in {'static', 'field'}:
+        token = self.token_stream.peek_token()
+        while token in {'static', 'field'}:
             compiled_output_class_var_dec = etree.SubElement(self.compiled_output_root, 'classVarDec')
             # Add static or field
             self.compile_new_token(compiled_output_class_var_dec)
             self.compile_type(compiled_output_class_var_dec)
             self.compile_one_or_more_varName(compiled_output_class_var_dec)
             self.compile_new_token_ensure_token(';', compiled_output_class_var_dec)
-            # Recursive call
-            self.compile_classVarDec()
+            token = self.token_stream.peek_token()
 
     def compile_one_or_more_varName(self, parent):
         self.compile_new_token_ensure_token_type('identifier', parent)
@@ -78,26 +70,25 @@ class CompilationEngine:
 
     def compile_more_varName_if_exist(self, parent):
         """If there is more varName, compiles them"""
-        token = self.show_next_token()
-        if token == ',':	# More VarName need to add
+        token = self.token_stream.peek_token()
+        while token == ',':	# More VarName need to add
             self.compile_new_token(parent)	# Add ','
             self.compile_new_token_ensure_token_type('identifier', parent)
-            # Recursive call
-            self.compile_more_varName_if_exist(parent)
+            token = self.token_stream.peek_token()
 
     def compile_type(self, parent):
         """
         Compiles type for var and add token element to parent.
         type: 'int' | 'char' | 'boolean' | className
         """
-        token, token_type = self.compile_new_token(parent)
+        token, token_type, line, column = self.compile_new_token(parent)
         assert token in {'int', 'char', 'boolean'} or token_type == 'identifier'
 
     def compile_void_or_type(self, parent):
         """
         Compiles type or 'void' for var and add token element to parent.
         """
-        token, token_type = self.compile_new_token(parent)
+        token, token_type, line, column = self.compile_new_token(parent)
         assert token in {'void', 'int', 'char', 'boolean'} or token_type == 'identifier'
 
     def compile_subroutineDec(self):
@@ -105,8 +96,8 @@ class CompilationEngine:
         Compiles a complete method, function, or constructor.
         subroutineDec: ('constructor' | 'function' | 'method') ('void' | type) subroutineName '(' parameterList ')' subroutineBody
         """
-        token = self.show_next_token()
-        if token in {'constructor', 'function', 'method'}:
+        token = self.token_stream.peek_token()
+        while token in {'constructor', 'function', 'method'}:
             compiled_output_subroutineDec = etree.SubElement(self.compiled_output_root, 'subroutineDec')
             # Add token in {'constructor', 'function', 'method'} to compiled_output_subroutineDec
             self.compile_new_token(compiled_output_subroutineDec)
@@ -119,15 +110,14 @@ class CompilationEngine:
             self.compile_new_token_ensure_token(')', compiled_output_subroutineDec)
             # subroutineBody
             self.compile_subroutineBody(compiled_output_subroutineDec)
-            # Recursive call
-            self.compile_subroutineDec()
+            token = self.token_stream.peek_token()
 
     def compile_parameterList(self, parent):
         """
         ((type varName) (',' type varName)*)?
         """
         compiled_output_parameterList = etree.SubElement(parent, 'parameterList')
-        token, token_type = self.show_next_token_and_type()
+        token, token_type, line, column = self.token_stream.peek()
         if token == ')':	# No parameter need to add
             compiled_output_parameterList.text = '\n\t'	# change the print format of empty element compiled_output_parameterList
         else:	# There is at least one parameter needs to be added
@@ -151,31 +141,29 @@ class CompilationEngine:
         self.compile_new_token_ensure_token('}', compiled_output_subroutineBody)
 
     def compile_more_parameter(self, parent):
-        token = self.show_next_token()
-        if token == ',':	# More parameter need to add
+        token = self.token_stream.peek_token()
+        while token == ',':	# More parameter need to add
             self.compile_new_token(parent)	# Add ','
             self.compile_type(parent)
             self.compile_new_token_ensure_token_type('identifier', parent)
-            # Recursive call
-            self.compile_more_parameter(parent)
+            token = self.token_stream.peek_token()
 
     def compile_varDec(self, parent):
         """varDec: 'var' type varName (',' varName)* ';'"""
-        token = self.show_next_token()
-        if token == 'var':
+        token = self.token_stream.peek_token()
+        while token == 'var':
             compiled_output_varDec = etree.SubElement(parent, 'varDec')
             self.compile_new_token(compiled_output_varDec)	# Add 'var'
             self.compile_type(compiled_output_varDec)
             self.compile_new_token_ensure_token_type('identifier', compiled_output_varDec)
             self.compile_more_varName_if_exist(compiled_output_varDec)
             self.compile_new_token_ensure_token(';', compiled_output_varDec)
-            # Recursive call
-            self.compile_varDec(parent)
+            token = self.token_stream.peek_token()
 
     def compile_statements(self, parent):
         """statement: letStatement | ifStatement | whileStatement | doStatement | returnStatement"""
-        token = self.show_next_token()
-        if token in {'let', 'if', 'while', 'do', 'return'}:
+        token = self.token_stream.peek_token()
+        while token in {'let', 'if', 'while', 'do', 'return'}:
             if token == 'let':
                 self.compile_statement_let(parent)
             elif token == 'if':
@@ -186,8 +174,7 @@ class CompilationEngine:
                 self.compile_statement_do(parent)
             else:	# return
                 self.compile_statement_return(parent)
-            # Recursive call
-            self.compile_statements(parent)
+            token = self.token_stream.peek_token()
 
     def compile_statement_let(self, parent):
         """
@@ -197,7 +184,7 @@ class CompilationEngine:
         self.compile_new_token_ensure_token('let', compiled_output_statement)
         # varName
         self.compile_new_token_ensure_token_type('identifier', compiled_output_statement)
-        token = self.show_next_token()
+        token = self.token_stream.peek_token()
         if token == '[':
             self.compile_new_token(compiled_output_statement)	# Add '['
             self.compile_expression(compiled_output_statement)
@@ -219,7 +206,7 @@ class CompilationEngine:
         compiled_output_statements_if = etree.SubElement(compiled_output_statement, 'statements')
         self.compile_statements(compiled_output_statements_if)
         self.compile_new_token_ensure_token('}', compiled_output_statement)
-        next_token = self.show_next_token()
+        next_token = self.token_stream.peek_token()
         if next_token == 'else':
             self.compile_new_token_ensure_token('else', compiled_output_statement)
             self.compile_new_token_ensure_token('{', compiled_output_statement)
@@ -256,7 +243,7 @@ class CompilationEngine:
         subroutineCall: subroutineName '(' expressionList ')' | (className | varName) '.' subroutineName '(' expressionList ')'
         """
         self.compile_new_token_ensure_token_type('identifier', parent)	# subroutineName or className or varName
-        next_token = self.show_next_token()
+        next_token = self.token_stream.peek_token()
         if next_token == '.':
             self.compile_new_token_ensure_token('.', parent)
             self.compile_new_token_ensure_token_type('identifier', parent)	# subroutineName
@@ -271,7 +258,7 @@ class CompilationEngine:
         """
         compiled_output_statement= etree.SubElement(parent, 'returnStatement')
         self.compile_new_token_ensure_token('return', compiled_output_statement)
-        next_token = self.show_next_token()
+        next_token = self.token_stream.peek_token()
         if next_token != ';':	# has expression
             self.compile_expression(compiled_output_statement)
         self.compile_new_token_ensure_token(';', compiled_output_statement)
@@ -289,15 +276,15 @@ class CompilationEngine:
         term: integerConstant | stringConstant | keywordConstant | varName | varName '[' expression ']' | subroutineCall | '(' expression ')' | unaryOp term
         """
         compiled_output_term = etree.SubElement(parent, 'term')
-        next_token, token_type = self.show_next_token_and_type()
+        next_token, token_type, line, column = self.token_stream.peek()
         if token_type == 'integerConstant' or next_token in {'true', 'false', 'null', 'this'}:	# integerConstant or keywordConstant
             self.compile_new_token(compiled_output_term)
         elif token_type == 'stringConstant':
-            token, token_type = self.next_token_and_type()
+            token, token_type, line, column = self.token_stream.advance()
             # remove dowble quote symbol in token
-            self.add_sub_element(compiled_output_term, token_type, token[1:-1])
+            self.add_sub_element(compiled_output_term, token_type.value, token[1:-1])
         elif token_type == 'identifier':
-            next_token, token_type = self.tokens_with_tokenType[1]
+            next_token = self.token_stream.lookahead(1)[0]
             if next_token == '[':
                 self.compile_new_token_ensure_token_type('identifier', compiled_output_term)
                 self.compile_new_token_ensure_token('[', compiled_output_term)
@@ -321,19 +308,18 @@ class CompilationEngine:
         """
         op: '+' | '-' | '*' | '/' | '&' | '|' | '<' | '>' | '='
         """
-        next_token = self.show_next_token()
-        if next_token in {'+', '-', '*', '/', '&', '|', '<', '>', '='}:	# in op
+        next_token = self.token_stream.peek_token()
+        while next_token in {'+', '-', '*', '/', '&', '|', '<', '>', '='}:	# in op
             self.compile_new_token(parent)	# add op
             self.compile_term(parent)
-            # Recursive call
-            self.compile_zero_or_more_op_and_term(parent)
+            next_token = self.token_stream.peek_token()
 
     def compile_expressionList(self, parent):
         """
         expressionList: (expression (',' expression)* )?
         """
         compiled_output_expressionList = etree.SubElement(parent, 'expressionList')
-        next_token = self.show_next_token()
+        next_token = self.token_stream.peek_token()
         if next_token == ')':
             # No expression
             compiled_output_expressionList.text = '\n\t'
@@ -342,12 +328,11 @@ class CompilationEngine:
             self.compile_comma_and_expression(compiled_output_expressionList)
 
     def compile_comma_and_expression(self, parent):
-        next_token = self.show_next_token()
-        if next_token == ',':
+        next_token = self.token_stream.peek_token()
+        while next_token == ',':
             self.compile_new_token_ensure_token(',', parent)
             self.compile_expression(parent)
-            # Recursive call
-            self.compile_comma_and_expression(parent)
+            next_token = self.token_stream.peek_token()
 
     def write_output(self, compiled_etree):
         with open(self.out_xml_file, 'w', encoding='utf_8') as outf:
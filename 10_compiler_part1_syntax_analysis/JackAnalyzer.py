@@ -11,9 +11,9 @@ def compile_jack(jackfile):
     out_token_xml_file = jackfile.parent / (jackfile.stem + 'T.xml')
     # Tokenize
     jack_tokenizer = JackTokenizer(jackfile, out_token_xml_file)
-    tokens_with_tokenType = jack_tokenizer.tokenize()
+    tokens = jack_tokenizer.tokenize()
     # Compile
-    jack_compilation_engine = CompilationEngine(tokens_with_tokenType, out_xml_file)
+    jack_compilation_engine = CompilationEngine(tokens, out_xml_file)
     jack_compilation_engine.compile()
 
 def main():
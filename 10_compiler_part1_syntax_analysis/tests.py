@@ -1,9 +1,12 @@
 #!/usr/bin/python3
 
 import unittest
+import tempfile
 from pathlib import Path
 import subprocess as sp
 
+from JackTokenizer import JackTokenizer
+
 class JackAnalyzer(unittest.TestCase):
 
     def setUp(self):
@@ -49,5 +52,19 @@ class JackAnalyzer(unittest.TestCase):
         path_input = self.cwd / 'test/Square'
         self.run_test(path_input)
 
+class Tokenizer(unittest.TestCase):
+
+    def tokenize_source(self, source):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jackfile = Path(tmp_dir) / 'Main.jack'
+            jackfile.write_text(source)
+            return [token[0] for token in JackTokenizer(jackfile, jackfile.parent / 'MainT.xml').tokenize()]
+
+    def test_long_tail_of_white_space_and_comments(self):
+        # The white space and comments at the end of the file are matched once, without backtracking, which used to take seconds for 20 trailing spaces
+        for tail in (' ' * 10000, '\t \n' * 5000, '// comment\n' * 5000, '/* comment */ \n' * 5000, ' // a b c'):
+            with self.subTest(tail=tail[:20]):
+                self.assertEqual(self.tokenize_source('class Main {}' + tail), ['class', 'Main', '{', '}'])
+
 if __name__ == '__main__':
     unittest.main()
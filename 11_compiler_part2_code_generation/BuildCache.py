@@ -0,0 +1,46 @@
+import hashlib
+import json
+
+def hash_file(file_path):
+    """Returns the sha1 hex digest of the content of file_path"""
+    return hashlib.sha1(file_path.read_bytes()).hexdigest()
+
+class BuildCache:
+    """
+    BuildCache: Remembers, for every class compiled in a directory, the hash of its source together with the version of the compiler and the hash of the .vm file it produced, so that unchanged classes need not be compiled again. The ProgramIndex entries of each class are kept as well, so that the calls of the classes compiled can be checked against the classes which are not, and the other way around.
+    The entries are kept in a json file in the directory: {jack file name: [build key, vm file hash, ProgramIndex entries of the class]}
+    """
+    cache_file_name = '.jackcache'
+
+    def __init__(self, directory, compiler_version):
+        self.cache_file = directory / self.cache_file_name
+        self.compiler_version = compiler_version
+        try:
+            with open(self.cache_file, 'r', encoding='utf_8') as inf:
+                self.entries = json.load(inf)
+        except (OSError, ValueError):	# No cache yet, or a broken one which is simply rebuilt
+            self.entries = {}
+
+    def build_key(self, jackfile):
+        """Returns the key identifying the compilation of jackfile: the hash of its source and of the compiler version"""
+        key = hashlib.sha1(self.compiler_version.encode('utf_8'))
+        key.update(jackfile.read_bytes())
+        return key.hexdigest()
+
+    def is_up_to_date(self, jackfile, build_key):
+        """Is the .vm file of jackfile the output of the compilation identified by build_key, and left untouched since?"""
+        entry = self.entries.get(jackfile.name)
+        vm_file = jackfile.with_suffix('.vm')
+        return entry is not None and len(entry) == 3 and entry[0] == build_key and vm_file.exists() and hash_file(vm_file) == entry[1]
+
+    def update(self, jackfile, build_key, class_entries):
+        """Record that jackfile has just been compiled by the compilation identified by build_key, into a class whose ProgramIndex entries are class_entries"""
+        self.entries[jackfile.name] = [build_key, hash_file(jackfile.with_suffix('.vm')), class_entries]
+
+    def get_class_entries(self, jackfile):
+        """Returns the ProgramIndex entries of the class of jackfile, as recorded by update"""
+        return self.entries[jackfile.name][2]
+
+    def save(self):
+        with open(self.cache_file, 'w', encoding='utf_8') as outf:
+            json.dump(self.entries, outf, indent=1, sort_keys=True)
@@ -1,79 +1,70 @@
-# import xml.etree.ElementTree as etree
-from lxml import etree
-
+from JackAST import ClassNode, DoStatement, IfStatement, LetStatement, ReturnStatement, SubroutineNode, WhileStatement
 from SymbolTable import SymbolTable
-from VMWriter import VMWriter
+from TokenStream import TokenStream
 
 class CompilationEngine:
-    """CompilationEngine: Effects the actual compilation output. Gets its input from a JackTokenizer and emits its parsed structure into an output file/stream."""
-    def __init__(self, tokens_with_tokenType, out_vm_file):
-        self.tokens_with_tokenType = tokens_with_tokenType
+    """CompilationEngine: Parses a class. Gets its input from a JackTokenizer and returns its parsed structure as an abstract syntax tree (see JackAST), from which the VMCodeGenerator emits the VM code. The subroutines are parsed one at a time, as they are read from the ClassNode, so that only the tree of the subroutine being compiled is held in memory."""
+    def __init__(self, tokens, jackfile, build_parse_tree=False, program_index=None):
+        self.token_stream = TokenStream(tokens)
+        self.jackfile = jackfile
+        self.build_parse_tree = build_parse_tree
+        if build_parse_tree:
+            # lxml is only needed for debugging, the VM code is emitted without building the parse tree
+            from lxml import etree
+            self.etree = etree
         self.symbol_table = SymbolTable()
-        self.vm_writer = VMWriter(out_vm_file)
-        self.class_name = out_vm_file.stem
-        self.construct_op_dict()
-        self.construct_segment_dict()
-        self.while_label_index = 0
-        self.if_else_label_index = 0
-
-    def construct_op_dict(self):
-        self.op_dict = {
-                '+': 'add',
-                '-': 'sub',
-                '&': 'and',
-                '|': 'or',
-                '<': 'lt',
-                '>': 'gt',
-                '=': 'eq',
-                }
-
-    def construct_segment_dict(self):
-        """Translate the kind of variable to related memory segment name"""
-        self.segment_dict = {
-                'STATIC': 'static',
-                'FIELD': 'this',
-                'ARG': 'argument',
-                'VAR': 'local',
-                }
+        self.program_index = program_index	# The ProgramIndex the class is declared to, if any
+        self.class_name = jackfile.stem
+        self.class_vars = []	# [(name, type, kind)] of the class
+        self.subroutine_vars = []	# [(name, type, kind)] of the subroutine being parsed
 
     def compile(self):
-        compiled_etree = self.compile_tokens()
-        # Uncomment following line if you want to see the output of compiled element tree
-        # print(etree.tounicode(compiled_etree, pretty_print=True))
-        self.vm_writer.close()
+        """Returns the ClassNode of the class, whose subroutines are parsed as they are read, unless the parse tree is built: the whole class is then parsed first, to write the parse tree"""
+        compiled_etree, class_node = self.compile_tokens()
+        if self.build_parse_tree:
+            class_node.subroutines = list(class_node.subroutines)
+            self.write_parse_tree(compiled_etree)
+        return class_node
 
     def compile_tokens(self):
-        self.compiled_output_root = etree.Element('class')
-        self.compile_class()
-        compiled_etree = etree.ElementTree(self.compiled_output_root)
-        return compiled_etree
+        self.compiled_output_root = self.etree.Element('class') if self.build_parse_tree else None
+        class_node = self.compile_class()
+        if self.build_parse_tree:
+            return self.etree.ElementTree(self.compiled_output_root), class_node
+        return None, class_node
+
+    def write_parse_tree(self, compiled_etree):
+        """Write the parse tree to an xml file beside the jack file, for debugging"""
+        with open(self.jackfile.with_suffix('.xml'), 'w', encoding='utf_8') as outf:
+            outf.write(self.etree.tounicode(compiled_etree, pretty_print=True))
 
     def compile_new_token_ensure_token_type(self, correct_token_type, parent):
-        token, token_type = self.compile_new_token(parent)
-        assert token_type == correct_token_type, '{} with token_type {} not expected'.format(token, token_type)
+        token, token_type, line, column = self.compile_new_token(parent)
+        assert token_type == correct_token_type, '{} with token_type {} not expected at line {}, column {}'.format(token, token_type.value, line, column)
 
     def compile_new_token_ensure_token(self, correct_token, parent):
-        token, token_type = self.compile_new_token(parent)
-        assert token == correct_token, '{} with token_type {} not expected'.format(token, token_type)
+        token, token_type, line, column = self.compile_new_token(parent)
+        assert token == correct_token, '{} with token_type {} not expected at line {}, column {}'.format(token, token_type.value, line, column)
 
     def compile_new_token(self, parent):
-        token, token_type = self.next_token_and_type()
-        self.add_sub_element(parent, token_type, token)
-        return token, token_type
+        token_record = self.token_stream.advance()
+        token, token_type, line, column = token_record
+        self.add_sub_element(parent, token_type.value, token)
+        return token_record
+
+    def add_element(self, parent, element_tag, element_text=None):
+        """Add a new element to parent in the parse tree and return it. When the parse tree is not built, parent is None and so is the returned element."""
+        if not self.build_parse_tree:
+            return None
+        new_element = self.etree.SubElement(parent, element_tag)
+        if element_text is not None:
+            new_element.text = element_text
+        return new_element
 
     def add_sub_element(self, parent, element_tag, element_text):
-        new_element = etree.SubElement(parent, element_tag)
-        new_element.text = ' ' + element_text + ' '
-
-    def next_token_and_type(self):
-        return self.tokens_with_tokenType.pop(0)
-
-    def show_next_token(self):
-        token, token_type = self.tokens_with_tokenType[0]
-        return token
-
-    def show_next_token_and_type(self):
-        return self.tokens_with_tokenType[0]
+        if self.build_parse_tree:
+            new_element = self.etree.SubElement(parent, element_tag)
+            new_element.text = ' ' + element_text + ' '
 
     def compile_class(self):
         """
@@ -82,27 +73,27 @@ class CompilationEngine:
         """
         self.compile_new_token_ensure_token('class', self.compiled_output_root)
         self.compile_new_token_ensure_token_type('identifier', self.compiled_output_root)
+        if self.program_index is not None:
+            self.program_index.add_class(self.class_name)
         self.compile_new_token_ensure_token('{', self.compiled_output_root)
         self.compile_classVarDec()
-        self.compile_subroutineDec()
-        self.compile_new_token_ensure_token('}', self.compiled_output_root)
+        return ClassNode(self.class_name, self.class_vars, self.compile_subroutineDec())
 
     def compile_classVarDec(self):
         """
         Compiles a static declaration or a field declaration.
         classVarDec: ('static' | 'field') type varName (',' varName)* ';'
         """
-        token = self.show_next_token()
-        if token in {'static', 'field'}:
-            compiled_output_class_var_dec = etree.SubElement(self.compiled_output_root, 'classVarDec')
+        token = self.token_stream.peek_token()
+        while token in {'static', 'field'}:
+            compiled_output_class_var_dec = self.add_element(self.compiled_output_root, 'classVarDec')
             symbol_kind = token.upper()
             # Add static or field
             self.compile_new_token(compiled_output_class_var_dec)
             symbol_type = self.compile_type(compiled_output_class_var_dec)
             self.compile_one_or_more_varName(compiled_output_class_var_dec, symbol_type, symbol_kind)
             self.compile_new_token_ensure_token(';', compiled_output_class_var_dec)
-            # Recursive call
-            self.compile_classVarDec()
+            token = self.token_stream.peek_token()
 
     def compile_one_or_more_varName(self, parent, symbol_type, symbol_kind):
         self.add_new_symbol(symbol_type, symbol_kind)
@@ -111,25 +102,30 @@ class CompilationEngine:
 
     def add_new_symbol(self, symbol_type, symbol_kind):
         """Next token is symbol_name, add this symbol_name and its symbol_type and symbol_kind to self.symbol_table"""
-        symbol_name = self.show_next_token()
+        symbol_name = self.token_stream.peek_token()
         self.symbol_table.define(symbol_name, symbol_type, symbol_kind)
+        if symbol_kind in SymbolTable.class_kinds:
+            self.class_vars.append((symbol_name, symbol_type, symbol_kind))
+        else:
+            self.subroutine_vars.append((symbol_name, symbol_type, symbol_kind))
+        if self.program_index is not None and symbol_kind in SymbolTable.class_kinds:
+            self.program_index.add_variable(self.class_name, symbol_name, symbol_type, symbol_kind)
 
     def compile_more_varName_if_exist(self, parent, symbol_type, symbol_kind):
         """If there is more varName, compiles them"""
-        token = self.show_next_token()
-        if token == ',':	# More VarName need to add
+        token = self.token_stream.peek_token()
+        while token == ',':	# More VarName need to add
             self.compile_new_token(parent)	# Add ','
             self.add_new_symbol(symbol_type, symbol_kind)
             self.compile_new_token_ensure_token_type('identifier', parent)
-            # Recursive call
-            self.compile_more_varName_if_exist(parent, symbol_type, symbol_kind)
+            token = self.token_stream.peek_token()
 
     def compile_type(self, parent):
         """
         Compiles type for var and add token element to parent.
         type: 'int' | 'char' | 'boolean' | className
         """
-        token, token_type = self.compile_new_token(parent)
+        token, token_type, line, column = self.compile_new_token(parent)
         assert token in {'int', 'char', 'boolean'} or token_type == 'identifier'
         return token
 
@@ -137,47 +133,58 @@ class CompilationEngine:
         """
         Compiles type or 'void' for var and add token element to parent.
         """
-        token, token_type = self.compile_new_token(parent)
+        token, token_type, line, column = self.compile_new_token(parent)
         assert token in {'void', 'int', 'char', 'boolean'} or token_type == 'identifier'
+        return token
 
     def compile_subroutineDec(self):
         """
         Compiles a complete method, function, or constructor.
         subroutineDec: ('constructor' | 'function' | 'method') ('void' | type) subroutineName '(' parameterList ')' subroutineBody
+        Yields the SubroutineNode of each subroutine, parsed when the one before has been read, then checks the '}' closing the class
         """
-        token = self.show_next_token()
-        if token in {'constructor', 'function', 'method'}:
+        token = self.token_stream.peek_token()
+        while token in {'constructor', 'function', 'method'}:
             self.symbol_table.start_subroutine()	# Reset the subroutine's symbol table
+            self.subroutine_vars = []
             function_kind = token
-            compiled_output_subroutineDec = etree.SubElement(self.compiled_output_root, 'subroutineDec')
+            compiled_output_subroutineDec = self.add_element(self.compiled_output_root, 'subroutineDec')
             # Add token in {'constructor', 'function', 'method'} to compiled_output_subroutineDec
             self.compile_new_token(compiled_output_subroutineDec)
-            self.compile_void_or_type(compiled_output_subroutineDec)
+            return_type = self.compile_void_or_type(compiled_output_subroutineDec)
             # subroutineName
-            function_name = self.class_name + '.' + self.show_next_token()
+            subroutine_name = self.token_stream.peek_token()
             self.compile_new_token_ensure_token_type('identifier', compiled_output_subroutineDec)
             self.compile_new_token_ensure_token('(', compiled_output_subroutineDec)
             # parameterList
             if function_kind == 'method':
-                # this is a dummy symbol added to the symbol_table's ARG, for the side effect that method's number of arguments will add 1. A method with k arguments operates on k+1 arguments actually, and the first argument (argument number 0) always refers to the this object
+                # this is a dummy symbol added to the symbol_table's ARG, for the side effect that method's number of arguments will add 1. A method with k arguments operates on k+1 arguments actually, and the first argument (argument number 0) always refers to the this object. The VMCodeGenerator adds it too, it is not one of the parameters of the SubroutineNode.
                 self.symbol_table.define('this', 'int', 'ARG')
             self.compile_parameterList(compiled_output_subroutineDec)
             self.compile_new_token_ensure_token(')', compiled_output_subroutineDec)
+            if self.program_index is not None:
+                parameter_types = [symbol.symbol_type for symbol in self.symbol_table.symbol_table_subroutine.values()]
+                if function_kind == 'method':
+                    parameter_types = parameter_types[1:]	# Without the dummy symbol this
+                self.program_index.add_subroutine(self.class_name, subroutine_name, function_kind, return_type, parameter_types)
             # subroutineBody
-            self.compile_subroutineBody(compiled_output_subroutineDec, function_name, function_kind)
+            statements = self.compile_subroutineBody(compiled_output_subroutineDec)
+            parameters = [(symbol_name, symbol_type) for symbol_name, symbol_type, symbol_kind in self.subroutine_vars if symbol_kind == 'ARG']
+            local_vars = [(symbol_name, symbol_type) for symbol_name, symbol_type, symbol_kind in self.subroutine_vars if symbol_kind == 'VAR']
+            yield SubroutineNode(function_kind, return_type, subroutine_name, parameters, local_vars, statements)
 
-            # Recursive call
-            self.compile_subroutineDec()
+            token = self.token_stream.peek_token()
+        self.compile_new_token_ensure_token('}', self.compiled_output_root)
 
     def compile_parameterList(self, parent):
         """
         ((type varName) (',' type varName)*)?
         """
-        compiled_output_parameterList = etree.SubElement(parent, 'parameterList')
-        token, token_type = self.show_next_token_and_type()
+        token, token_type, line, column = self.token_stream.peek()
         if token == ')':	# No parameter need to add
-            compiled_output_parameterList.text = '\n\t'	# change the print format of empty element compiled_output_parameterList
+            compiled_output_parameterList = self.add_element(parent, 'parameterList', '\n\t')	# change the print format of empty element compiled_output_parameterList
         else:	# There is at least one parameter needs to be added
+            compiled_output_parameterList = self.add_element(parent, 'parameterList')
             # type
             assert token in {'int', 'char', 'boolean'} or token_type == 'identifier'
             symbol_kind = 'ARG'
@@ -189,45 +196,34 @@ class CompilationEngine:
             # more paremeters
             self.compile_more_parameter(compiled_output_parameterList)
 
-    def compile_subroutineBody(self, parent, function_name, function_kind):
+    def compile_subroutineBody(self, parent):
         """
         subroutineBody: '{' varDec* statements '}'
+        Returns the list of the statement nodes of the body
         """
-        compiled_output_subroutineBody = etree.SubElement(parent, 'subroutineBody')
+        compiled_output_subroutineBody = self.add_element(parent, 'subroutineBody')
         self.compile_new_token_ensure_token('{', compiled_output_subroutineBody)
         self.compile_varDec(compiled_output_subroutineBody)
-        local_vars_num = self.symbol_table.count_symbol_by_kind('VAR')
-        self.vm_writer.write_function(function_name, local_vars_num)
-        if function_kind == 'constructor':
-            # translate this=Memory.alloc(fields_num)
-            fields_num = self.symbol_table.count_symbol_by_kind('FIELD')
-            self.vm_writer.write_push('constant', fields_num)
-            self.vm_writer.write_call('Memory.alloc', 1)
-            self.vm_writer.write_pop('pointer', 0)
-        elif function_kind == 'method':
-            # Point the virtual this segment to the current object (using pointer 0)
-            self.vm_writer.write_push('argument', 0)	# In method, this object address will always be stored in the first argument
-            self.vm_writer.write_pop('pointer', 0)
-        compiled_output_statements = etree.SubElement(compiled_output_subroutineBody, 'statements')
-        self.compile_statements(compiled_output_statements)
+        compiled_output_statements = self.add_element(compiled_output_subroutineBody, 'statements')
+        statements = self.compile_statements(compiled_output_statements)
         self.compile_new_token_ensure_token('}', compiled_output_subroutineBody)
+        return statements
 
     def compile_more_parameter(self, parent):
-        token = self.show_next_token()
-        if token == ',':	# More parameter need to add
+        token = self.token_stream.peek_token()
+        while token == ',':	# More parameter need to add
             self.compile_new_token(parent)	# Add ','
             symbol_kind = 'ARG'
             symbol_type = self.compile_type(parent)
             self.add_new_symbol(symbol_type, symbol_kind)
             self.compile_new_token_ensure_token_type('identifier', parent)
-            # Recursive call
-            self.compile_more_parameter(parent)
+            token = self.token_stream.peek_token()
 
     def compile_varDec(self, parent):
         """varDec: 'var' type varName (',' varName)* ';'"""
-        token = self.show_next_token()
-        if token == 'var':
-            compiled_output_varDec = etree.SubElement(parent, 'varDec')
+        token = self.token_stream.peek_token()
+        while token == 'var':
+            compiled_output_varDec = self.add_element(parent, 'varDec')
             symbol_kind = token.upper()
             self.compile_new_token(compiled_output_varDec)	# Add 'var'
             symbol_type = self.compile_type(compiled_output_varDec)
@@ -235,339 +231,221 @@ class CompilationEngine:
             self.compile_new_token_ensure_token_type('identifier', compiled_output_varDec)
             self.compile_more_varName_if_exist(compiled_output_varDec, symbol_type, symbol_kind)
             self.compile_new_token_ensure_token(';', compiled_output_varDec)
-            # Recursive call
-            self.compile_varDec(parent)
+            token = self.token_stream.peek_token()
 
     def compile_statements(self, parent):
-        """statement: letStatement | ifStatement | whileStatement | doStatement | returnStatement"""
-        token = self.show_next_token()
-        if token in {'let', 'if', 'while', 'do', 'return'}:
+        """
+        statement: letStatement | ifStatement | whileStatement | doStatement | returnStatement
+        Returns the list of the statement nodes
+        """
+        statements = []
+        token = self.token_stream.peek_token()
+        while token in {'let', 'if', 'while', 'do', 'return'}:
             if token == 'let':
-                self.compile_statement_let(parent)
+                statements.append(self.compile_statement_let(parent))
             elif token == 'if':
-                self.compile_statement_if(parent)
+                statements.append(self.compile_statement_if(parent))
             elif token == 'while':
-                self.compile_statement_while(parent)
+                statements.append(self.compile_statement_while(parent))
             elif token == 'do':
-                self.compile_statement_do(parent)
+                statements.append(self.compile_statement_do(parent))
             else:	# return
-                self.compile_statement_return(parent)
-            # Recursive call
-            self.compile_statements(parent)
+                statements.append(self.compile_statement_return(parent))
+            token = self.token_stream.peek_token()
+        return statements
 
     def compile_statement_let(self, parent):
         """
         letStatement: 'let' varName ('[' expression ']')? '=' expression ';'
-        vm: pop the value of expression to varName
         """
-        compiled_output_statement = etree.SubElement(parent, 'letStatement')
+        compiled_output_statement = self.add_element(parent, 'letStatement')
         self.compile_new_token_ensure_token('let', compiled_output_statement)
         # varName
-        symbol_name = self.show_next_token()
+        symbol_name = self.token_stream.peek_token()
         self.compile_new_token_ensure_token_type('identifier', compiled_output_statement)
-        token = self.show_next_token()
+        token = self.token_stream.peek_token()
+        index = None
         if token == '[':	# Array
-            """
-            code:
-                arr[expression1] = expression2
-            vm:
-            	push arr
-                push expression1
-                add
-                push expression2
-                pop temp 0
-                pop pointer 1
-                push temp 0
-                pop that 0
-            The reason to use temp 0 and delayed pop pointer 1 after push expression2 is that expression2 may also contain arrays, for example: a[i]=b[j], then the value in pointer 1 will mess up. So we must pop the returned value by expression2 to temp 0 for the rescue.
-            """
-            self.write_push_variable(symbol_name)
             self.compile_new_token(compiled_output_statement)	# Add '['
-            self.compile_expression(compiled_output_statement)
-            self.vm_writer.write_arithmetic('add')
+            index = self.compile_expression(compiled_output_statement)
             self.compile_new_token_ensure_token(']', compiled_output_statement)
         self.compile_new_token_ensure_token('=', compiled_output_statement)	# Add '='
-        self.compile_expression(compiled_output_statement)
-        if token == '[':	# Array
-            # Array assignment always first align that to the address to be modified, then "pop that 0"
-            self.vm_writer.write_pop('temp', 0)
-            self.vm_writer.write_pop('pointer', 1)
-            self.vm_writer.write_push('temp', 0)
-            self.vm_writer.write_pop('that', 0)
-        else:	# a varName
-            self.write_pop_variable(symbol_name)
+        value = self.compile_expression(compiled_output_statement)
         self.compile_new_token_ensure_token(';', compiled_output_statement)
+        return LetStatement(symbol_name, index, value)
 
     def compile_statement_if(self, parent):
         """
         ifStatement: 'if' '(' expression ')' '{' statements '}' ('else' '{' statements '}')?
-        code:
-        	if (cond)
-                    s1
-                else
-                    s2
-        vm:
-        	VM code for computing ~(cond)
-                if-goto L1
-                VM code for executing s1
-                goto L2
-                label L1
-                VM code for executing s2
-                label L2
-        """
-        compiled_output_statement= etree.SubElement(parent, 'ifStatement')
+        """
+        compiled_output_statement= self.add_element(parent, 'ifStatement')
         self.compile_new_token_ensure_token('if', compiled_output_statement)
-        self.if_else_label_index += 1
-        else_start_label_name = 'ELSE_START_{}_{}'.format(self.class_name.upper(), self.if_else_label_index) 
-        if_else_end_label_name = 'IF_ELSE_END_{}_{}'.format(self.class_name.upper(), self.if_else_label_index) 
         self.compile_new_token_ensure_token('(', compiled_output_statement)
-        self.compile_expression(compiled_output_statement)
-        self.vm_writer.write_arithmetic('not')
-        self.vm_writer.write_if_goto(else_start_label_name)
+        condition = self.compile_expression(compiled_output_statement)
         self.compile_new_token_ensure_token(')', compiled_output_statement)
         self.compile_new_token_ensure_token('{', compiled_output_statement)
-        compiled_output_statements_if = etree.SubElement(compiled_output_statement, 'statements')
-        self.compile_statements(compiled_output_statements_if)
-        self.vm_writer.write_goto(if_else_end_label_name)
+        compiled_output_statements_if = self.add_element(compiled_output_statement, 'statements')
+        statements = self.compile_statements(compiled_output_statements_if)
         self.compile_new_token_ensure_token('}', compiled_output_statement)
-        self.vm_writer.write_label(else_start_label_name)
-        next_token = self.show_next_token()
+        else_statements = []
+        next_token = self.token_stream.peek_token()
         if next_token == 'else':
             self.compile_new_token_ensure_token('else', compiled_output_statement)
             self.compile_new_token_ensure_token('{', compiled_output_statement)
-            compiled_output_statements_else = etree.SubElement(compiled_output_statement, 'statements')
-            self.compile_statements(compiled_output_statements_else)
+            compiled_output_statements_else = self.add_element(compiled_output_statement, 'statements')
+            else_statements = self.compile_statements(compiled_output_statements_else)
             self.compile_new_token_ensure_token('}', compiled_output_statement)
-        self.vm_writer.write_label(if_else_end_label_name)
+        return IfStatement(condition, statements, else_statements)
 
     def compile_statement_while(self, parent):
         """
         whileStatement: 'while' '(' expression ')' '{' statements '}'
-        code: 
-            while (cond) 
-                s1
-        vm:
-            label L1
-            VM code for computing ~(cond)
-            if-goto L2
-            VM code for executing s1
-            goto L1
-            label L2
-        """
-        compiled_output_statement= etree.SubElement(parent, 'whileStatement')
+        """
+        compiled_output_statement= self.add_element(parent, 'whileStatement')
         self.compile_new_token_ensure_token('while', compiled_output_statement)
-        self.while_label_index += 1
-        while_start_label_name = 'WHILE_START_{}_{}'.format(self.class_name.upper(), self.while_label_index) 
-        while_end_label_name = 'WHILE_END_{}_{}'.format(self.class_name.upper(), self.while_label_index) 
-        self.vm_writer.write_label(while_start_label_name)
         self.compile_new_token_ensure_token('(', compiled_output_statement)
-        self.compile_expression(compiled_output_statement)
-        self.vm_writer.write_arithmetic('not')
-        self.vm_writer.write_if_goto(while_end_label_name)
+        condition = self.compile_expression(compiled_output_statement)
         self.compile_new_token_ensure_token(')', compiled_output_statement)
         self.compile_new_token_ensure_token('{', compiled_output_statement)
-        compiled_output_statements_while = etree.SubElement(compiled_output_statement, 'statements')
-        self.compile_statements(compiled_output_statements_while)
-        self.vm_writer.write_goto(while_start_label_name)
-        self.vm_writer.write_label(while_end_label_name)
+        compiled_output_statements_while = self.add_element(compiled_output_statement, 'statements')
+        statements = self.compile_statements(compiled_output_statements_while)
         self.compile_new_token_ensure_token('}', compiled_output_statement)
+        return WhileStatement(condition, statements)
 
     def compile_statement_do(self, parent):
         """
         doStatement: 'do' subroutineCall ';'
         """
-        compiled_output_statement= etree.SubElement(parent, 'doStatement')
+        compiled_output_statement= self.add_element(parent, 'doStatement')
         self.compile_new_token_ensure_token('do', compiled_output_statement)
         # subroutineCall
-        self.compile_subroutineCall(compiled_output_statement)
-        # When translating a do sub statement where sub is a void method or function, the caller of the corresponding VM function must pop (and ignore) the returned value (which is always the constant 0).
-        self.vm_writer.write_pop('temp', 0)
+        call = self.compile_subroutineCall(compiled_output_statement)
         self.compile_new_token_ensure_token(';', compiled_output_statement)
+        return DoStatement(call)
 
     def compile_subroutineCall(self, parent):
         """
         subroutineCall: subroutineName '(' expressionList ')' | (className | varName) '.' subroutineName '(' expressionList ')'
+        Returns the tree of the call: ('call', function_name, receiver, arguments), receiver is the tree of the object the method is called on, or None for a function
         """
-        name = self.show_next_token()
+        name = self.token_stream.peek_token()
         self.compile_new_token_ensure_token_type('identifier', parent)	# subroutineName or className or varName
-        next_token = self.show_next_token()
+        next_token = self.token_stream.peek_token()
         if next_token == '.':
             self.compile_new_token_ensure_token('.', parent)
             symbol_type = self.symbol_table.get_symbol_type(name)
             if not symbol_type:
                 # Not defined in symbol_table, so name must be className, and function name is simply className.subroutineName, needs not to be changed
-                function_name = name + '.' + self.show_next_token()
-                args_num_should_add_1 = False
+                function_name = name + '.' + self.token_stream.peek_token()
+                receiver = None
             else:
                 # name is varName, so it is an instance of a className, className is symbol_type, so we push the value of the varName first, which is the base address of the class instance, then set the function name to  className.subroutineName
-                args_num_should_add_1 = True
-                self.write_push_variable(name)
-                function_name = symbol_type + '.' + self.show_next_token()
+                receiver = ('variable', name)
+                function_name = symbol_type + '.' + self.token_stream.peek_token()
             self.compile_new_token_ensure_token_type('identifier', parent)	# subroutineName
         else:
             # no '.' found, so name is subroutineName, function name should be self.class_name.subroutineName, and we need push this (pointer 0) first
-            self.vm_writer.write_push('pointer', 0)
+            receiver = ('this',)
             function_name = self.class_name + '.' + name
-            args_num_should_add_1 = True
 
         self.compile_new_token_ensure_token('(', parent)
-        self.compile_expressionList(parent, function_name, args_num_should_add_1)
+        arguments = self.compile_expressionList(parent)
         self.compile_new_token_ensure_token(')', parent)
+        return ('call', function_name, receiver, arguments)
 
     def compile_statement_return(self, parent):
         """
         ReturnStatement 'return' expression? ';'
         """
-        compiled_output_statement= etree.SubElement(parent, 'returnStatement')
+        compiled_output_statement= self.add_element(parent, 'returnStatement')
         self.compile_new_token_ensure_token('return', compiled_output_statement)
-        next_token = self.show_next_token()
+        value = None
+        next_token = self.token_stream.peek_token()
         if next_token != ';':	# has expression
-            self.compile_expression(compiled_output_statement)
-        else:
-            # void functions return the constant 0
-            self.vm_writer.write_push('constant', 0)
-        self.vm_writer.write_return()
+            value = self.compile_expression(compiled_output_statement)
         self.compile_new_token_ensure_token(';', compiled_output_statement)
+        return ReturnStatement(value)
 
     def compile_expression(self, parent):
         """
         expression: term (op term)*
-        """
-        compiled_output_expression = etree.SubElement(parent, 'expression')
-        self.compile_term(compiled_output_expression)
-        self.compile_zero_or_more_op_and_term(compiled_output_expression)
+        op: '+' | '-' | '*' | '/' | '&' | '|' | '<' | '>' | '='
+        Returns the tree of the expression. Jack has no operator priority, so the tree of term1 op term2 op term3 is ((term1 op term2) op term3).
+        """
+        compiled_output_expression = self.add_element(parent, 'expression')
+        expression = self.compile_term(compiled_output_expression)
+        next_token = self.token_stream.peek_token()
+        while next_token in {'+', '-', '*', '/', '&', '|', '<', '>', '='}:	# in op
+            self.compile_new_token(compiled_output_expression)	# add op
+            term = self.compile_term(compiled_output_expression)
+            expression = ('binary', next_token, expression, term)
+            next_token = self.token_stream.peek_token()
+        return expression
 
     def compile_term(self, parent):
         """
         term: integerConstant | stringConstant | keywordConstant | varName | varName '[' expression ']' | subroutineCall | '(' expression ')' | unaryOp term
+        Returns the tree of the term
         """
-        compiled_output_term = etree.SubElement(parent, 'term')
-        next_token, token_type = self.show_next_token_and_type()
+        compiled_output_term = self.add_element(parent, 'term')
+        next_token, token_type, line, column = self.token_stream.peek()
         if token_type == 'integerConstant' or next_token in {'true', 'false', 'null', 'this'}:	# integerConstant or keywordConstant
             if token_type == 'integerConstant':
-                self.vm_writer.write_push('constant', next_token)
+                term = ('constant', int(next_token))
             elif next_token == 'true':
                 # true = -1, which is 16 bit each bit is 1
-                self.vm_writer.write_push('constant', 1)
-                self.vm_writer.write_arithmetic('neg')
+                term = ('constant', -1)
             elif next_token == 'false' or next_token == 'null':
-                self.vm_writer.write_push('constant', 0)
+                term = ('constant', 0)
             else:	# next_token == 'this'
                 # this will always be the content of pointer 0
-                self.vm_writer.write_push('pointer', 0)
+                term = ('this',)
             self.compile_new_token(compiled_output_term)
         elif token_type == 'stringConstant':
-            token, token_type = self.next_token_and_type()
+            token, token_type, line, column = self.token_stream.advance()
             # remove double quote symbol in token
             string = token[1:-1]
-            # Push string using OS String: String.new(length), String.appendChar(nextChar)
-            self.vm_writer.write_push('constant', len(string))
-            self.vm_writer.write_call('String.new', 1)
-            for char in string:
-                self.vm_writer.write_push('constant', ord(char))
-                self.vm_writer.write_call('String.appendChar', 2)
-            self.add_sub_element(compiled_output_term, token_type, string)
+            term = ('string', string)
+            self.add_sub_element(compiled_output_term, token_type.value, string)
         elif token_type == 'identifier':
-            next_next_token, token_type = self.tokens_with_tokenType[1]
+            next_next_token = self.token_stream.lookahead(1)[0]
             if next_next_token == '[':	# Array
-                """
-                code: 
-                    a[i]
-                vm:
-                    push a
-                    push i
-                    add
-                    pop pointer 1
-                    push that 0
-                """
                 symbol_name = next_token
-                self.write_push_variable(symbol_name)
                 self.compile_new_token_ensure_token_type('identifier', compiled_output_term)
                 self.compile_new_token_ensure_token('[', compiled_output_term)
-                self.compile_expression(compiled_output_term)
-                self.vm_writer.write_arithmetic('add')
-                self.vm_writer.write_pop('pointer', 1)
-                # Push the value of the array item to stack using segment that
-                self.vm_writer.write_push('that', 0)
+                term = ('array', symbol_name, self.compile_expression(compiled_output_term))
                 self.compile_new_token_ensure_token(']', compiled_output_term)
             elif next_next_token == '(' or next_next_token == '.':
-                self.compile_subroutineCall(compiled_output_term)
+                term = self.compile_subroutineCall(compiled_output_term)
             else:	# A single varName
-                symbol_name = next_token
-                self.write_push_variable(symbol_name)
+                term = ('variable', next_token)
                 self.compile_new_token_ensure_token_type('identifier', compiled_output_term)
         elif next_token == '(':
             self.compile_new_token(compiled_output_term)
-            self.compile_expression(compiled_output_term)
+            term = self.compile_expression(compiled_output_term)
             self.compile_new_token_ensure_token(')', compiled_output_term)
         elif next_token in {'-', '~'}:	# unaryOp
             self.compile_new_token(compiled_output_term)
-            self.compile_term(compiled_output_term)
-            if next_token == '-':
-                self.vm_writer.write_arithmetic('neg')
-            else:
-                self.vm_writer.write_arithmetic('not')
+            term = ('unary', next_token, self.compile_term(compiled_output_term))
         else:
-            raise 'Not a valid expression'
+            raise SyntaxError('Not a valid expression: {} at line {}, column {}'.format(next_token, line, column))
+        return term
 
-    def compile_zero_or_more_op_and_term(self, parent):
-        """
-        op: '+' | '-' | '*' | '/' | '&' | '|' | '<' | '>' | '='
-        """
-        next_token = self.show_next_token()
-        if next_token in {'+', '-', '*', '/', '&', '|', '<', '>', '='}:	# in op
-            self.compile_new_token(parent)	# add op
-            self.compile_term(parent)
-            # Write vm code for operator
-            if next_token == '*':
-                self.vm_writer.write_call('Math.multiply', 2)
-            elif next_token == '/':
-                self.vm_writer.write_call('Math.divide', 2)
-            else:
-                operator = self.op_dict[next_token]
-                self.vm_writer.write_arithmetic(operator)
-            # Recursive call
-            self.compile_zero_or_more_op_and_term(parent)
-
-    def compile_expressionList(self, parent, function_name, args_num_should_add_1):
+    def compile_expressionList(self, parent):
         """
         expressionList: (expression (',' expression)* )?
+        Returns the list of the trees of the expressions
         """
-        compiled_output_expressionList = etree.SubElement(parent, 'expressionList')
-        self.args_num = 0
-        if args_num_should_add_1:
-            # if function_name is varName.subroutineName or self.class_name.subroutineName, the number of arguments should add 1 because we first push the base address of the operated object
-            self.args_num += 1
-        next_token = self.show_next_token()
+        next_token = self.token_stream.peek_token()
         if next_token == ')':
             # No expression
-            compiled_output_expressionList.text = '\n\t'
-            self.vm_writer.write_call(function_name, self.args_num)
-        else:
-            self.compile_expression(compiled_output_expressionList)
-            self.args_num += 1
-            self.compile_comma_and_expression(compiled_output_expressionList)
-            self.vm_writer.write_call(function_name, self.args_num)
-
-    def compile_comma_and_expression(self, parent):
-        next_token = self.show_next_token()
-        if next_token == ',':
-            self.compile_new_token_ensure_token(',', parent)
-            self.args_num += 1
-            self.compile_expression(parent)
-            # Recursive call
-            self.compile_comma_and_expression(parent)
-
-    def write_push_variable(self, symbol_name):
-        """Push the value of variable to working stack"""
-        index = self.symbol_table.get_symbol_index(symbol_name)
-        symbol_kind = self.symbol_table.get_symbol_kind(symbol_name)
-        segment = self.segment_dict[symbol_kind]
-        self.vm_writer.write_push(segment, index)
-
-    def write_pop_variable(self, symbol_name):
-        """Pop the top value of the working stack to variable"""
-        index = self.symbol_table.get_symbol_index(symbol_name)
-        symbol_kind = self.symbol_table.get_symbol_kind(symbol_name)
-        segment = self.segment_dict[symbol_kind]
-        self.vm_writer.write_pop(segment, index)
+            compiled_output_expressionList = self.add_element(parent, 'expressionList', '\n\t')
+            return []
+        compiled_output_expressionList = self.add_element(parent, 'expressionList')
+        expressions = [self.compile_expression(compiled_output_expressionList)]
+        next_token = self.token_stream.peek_token()
+        while next_token == ',':
+            self.compile_new_token_ensure_token(',', compiled_output_expressionList)
+            expressions.append(self.compile_expression(compiled_output_expressionList))
+            next_token = self.token_stream.peek_token()
+        return expressions
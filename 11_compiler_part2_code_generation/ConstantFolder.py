@@ -0,0 +1,147 @@
+from JackAST import transform_subroutine_expressions, transform_expression
+
+def wrap_int16(value):
+    """Returns value wrapped around to a 16-bit two's complement integer, as computed by the Hack CPU"""
+    return (value + 0x8000 & 0xFFFF) - 0x8000
+
+def contains_node_kind(node, node_kind):
+    """Does the expression tree node contain a node of kind node_kind ('call', 'array', ...)?"""
+    nodes = [node]
+    while nodes:	# Walk the tree with an explicit stack, long op chains make it deep
+        node = nodes.pop()
+        if node[0] == node_kind:
+            return True
+        elif node[0] == 'array':
+            nodes.append(node[2])
+        elif node[0] == 'call':
+            nodes.extend(node[3])
+            if node[2] is not None:
+                nodes.append(node[2])
+        elif node[0] == 'unary':
+            nodes.append(node[2])
+        elif node[0] == 'binary':
+            nodes.append(node[2])
+            nodes.append(node[3])
+    return False
+
+def contains_call(node):
+    """Does evaluating the expression node call a subroutine? Such an expression may have side effects, and must be evaluated even if its value is not needed."""
+    return contains_node_kind(node, 'call')
+
+def contains_array_access(node):
+    """Does evaluating the expression node read an array item? Such an expression sets pointer 1, so THAT must not be aligned to another array item while it is evaluated. A call does not count, since THAT is restored when the called subroutine returns."""
+    return contains_node_kind(node, 'array')
+
+def split_array_offset(index):
+    """Returns (base, offset) such that the array index is base + offset, offset being a non-negative constant which the that segment can add for free, base None when the index is that constant"""
+    if index[0] == 'constant' and index[1] >= 0:
+        return None, index[1]
+    if index[0] == 'binary' and index[1] == '+' and index[3][0] == 'constant' and index[3][1] >= 0:
+        return index[2], index[3][1]
+    return index, 0
+
+def non_negative_bits(node):
+    """Returns the mask of the bits which may be set in the value of the expression node when that value is known to be non-negative, or None if it may be negative"""
+    if node[0] == 'constant':
+        return node[1] if node[1] >= 0 else None
+    if node[0] == 'binary' and node[1] in {'&', '|'}:
+        lhs_bits = non_negative_bits(node[2])
+        rhs_bits = non_negative_bits(node[3])
+        if node[1] == '&' and (lhs_bits is not None or rhs_bits is not None):	# Masked by a non-negative value
+            return (0xFFFF if lhs_bits is None else lhs_bits) & (0xFFFF if rhs_bits is None else rhs_bits)
+        if node[1] == '|' and lhs_bits is not None and rhs_bits is not None:
+            return lhs_bits | rhs_bits
+    return None
+
+class ConstantFolder:
+    """
+    ConstantFolder: Simplifies the expression trees built by the CompilationEngine. Constant subexpressions are evaluated at compile time, with the 16-bit wraparound of the Hack CPU, and algebraic identities (x+0, x-0, x*1, x*0, x/1, x&0, x|0, --x, ~~x, ...) are applied.
+    The trees are folded bottom up, so the operands given to fold_unary and fold_binary are already folded.
+    """
+    def __init__(self):
+        self.construct_operation_dict()
+
+    def construct_operation_dict(self):
+        """The functions computing the value of each binary operator on two constants, the value of true is -1 and the value of false is 0"""
+        self.operation_dict = {
+                '+': lambda x, y: x + y,
+                '-': lambda x, y: x - y,
+                '*': lambda x, y: x * y,
+                '/': self.divide,
+                '&': lambda x, y: x & y,
+                '|': lambda x, y: x | y,
+                '<': lambda x, y: -1 if x < y else 0,
+                '>': lambda x, y: -1 if x > y else 0,
+                '=': lambda x, y: -1 if x == y else 0,
+                }
+
+    def fold_subroutine(self, subroutine):
+        """The constant folding pass: fold every expression of the subroutine"""
+        transform_subroutine_expressions(subroutine, self.fold_expression)
+        return subroutine
+
+    def fold_expression(self, expression):
+        """Returns the folded tree of the expression"""
+        return transform_expression(expression, self.fold_node)
+
+    def fold_node(self, node):
+        """Returns the folded node, its operands being folded already"""
+        if node[0] == 'unary':
+            return self.fold_unary(node[1], node[2])
+        if node[0] == 'binary':
+            return self.fold_binary(node[1], node[2], node[3])
+        return node
+
+    def divide(self, x, y):
+        """Integer division rounding toward zero, as Math.divide does"""
+        quotient = abs(x) // abs(y)
+        return quotient if (x < 0) == (y < 0) else -quotient
+
+    def fold_unary(self, op, operand):
+        """Returns the folded tree of the unary operation op ('-' or '~') on operand"""
+        if operand[0] == 'constant':
+            value = -operand[1] if op == '-' else ~operand[1]
+            return ('constant', wrap_int16(value))
+        if operand[0] == 'unary' and operand[1] == op:	# --x and ~~x are x
+            return operand[2]
+        return ('unary', op, operand)
+
+    def fold_binary(self, op, lhs, rhs):
+        """Returns the folded tree of the binary operation lhs op rhs"""
+        lhs_value = lhs[1] if lhs[0] == 'constant' else None
+        rhs_value = rhs[1] if rhs[0] == 'constant' else None
+        if lhs_value is not None and rhs_value is not None:
+            if op == '/' and rhs_value == 0:	# Left to Math.divide to report the error at run time
+                return ('binary', op, lhs, rhs)
+            return ('constant', wrap_int16(self.operation_dict[op](lhs_value, rhs_value)))
+        if rhs_value is not None:
+            if op in {'+', '-'}:
+                offset = rhs_value if op == '+' else -rhs_value
+                if lhs[0] == 'binary' and lhs[1] in {'+', '-'} and lhs[3][0] == 'constant':
+                    # (x + c1) + c2 is x + (c1 + c2), since 16-bit addition wraps around
+                    offset += lhs[3][1] if lhs[1] == '+' else -lhs[3][1]
+                    lhs = lhs[2]
+                return self.add_offset(lhs, wrap_int16(offset))
+            if (op == '|' and rhs_value == 0) or (op in {'*', '/'} and rhs_value == 1) or (op == '&' and rhs_value == -1):
+                return lhs
+            if ((op in {'*', '&'} and rhs_value == 0) or (op == '|' and rhs_value == -1)) and not contains_call(lhs):
+                return rhs
+        if lhs_value is not None:
+            if (op in {'+', '|'} and lhs_value == 0) or (op == '*' and lhs_value == 1) or (op == '&' and lhs_value == -1):
+                return rhs
+            if op == '-' and lhs_value == 0:
+                return self.fold_unary('-', rhs)
+            if ((op in {'*', '&'} and lhs_value == 0) or (op == '|' and lhs_value == -1)) and not contains_call(rhs):
+                return lhs
+            if op == '*':	# c * x is x * c, the constant goes right where the code generator looks for it
+                return ('binary', op, rhs, lhs)
+        return ('binary', op, lhs, rhs)
+
+    def add_offset(self, node, offset):
+        """Returns the tree of node + offset, written with a non-negative constant where possible"""
+        if offset == 0:
+            return node
+        elif offset > 0 or offset == -0x8000:
+            return ('binary', '+', node, ('constant', offset))
+        else:
+            return ('binary', '-', node, ('constant', -offset))
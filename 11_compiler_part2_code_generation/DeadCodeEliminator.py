@@ -0,0 +1,33 @@
+from JackAST import IfStatement, ReturnStatement, WhileStatement
+
+class DeadCodeEliminator:
+    """
+    DeadCodeEliminator: Removes the statements of a subroutine which can never run: the branch of an if statement not taken when its condition is a constant, the body of a while statement whose condition is a constant false, and the statements following a return statement.
+    An if or while statement runs its body when its condition is true (-1): the vm code jumps over the body if ~condition is not 0, so any other constant runs the else branch. The constant conditions are the ones left by the constant folding pass, which runs first.
+    """
+    def eliminate_subroutine(self, subroutine):
+        """The dead code elimination pass: remove the dead statements of the subroutine"""
+        subroutine.statements = self.eliminate_statements(subroutine.statements)
+        return subroutine
+
+    def eliminate_statements(self, statements):
+        """Returns the list of the statements which may run"""
+        live_statements = []
+        for statement in statements:
+            if isinstance(statement, IfStatement):
+                statement.statements = self.eliminate_statements(statement.statements)
+                statement.else_statements = self.eliminate_statements(statement.else_statements)
+                if statement.condition[0] == 'constant':	# Only the branch taken is left, in place of the if statement
+                    live_statements += statement.statements if statement.condition[1] == -1 else statement.else_statements
+                else:
+                    live_statements.append(statement)
+            elif isinstance(statement, WhileStatement):
+                if statement.condition[0] == 'constant' and statement.condition[1] != -1:	# Never runs
+                    continue
+                statement.statements = self.eliminate_statements(statement.statements)
+                live_statements.append(statement)
+            else:
+                live_statements.append(statement)
+            if live_statements and isinstance(live_statements[-1], ReturnStatement):	# The statements after it are unreachable
+                break
+        return live_statements
@@ -0,0 +1,207 @@
+"""
+The abstract syntax tree of a Jack class, produced by the CompilationEngine, rewritten by the passes of a PassManager, and consumed by the VMCodeGenerator.
+Classes, subroutines and statements are nodes with __slots__. Expressions are trees of tuples:
+    ('constant', value), ('string', string), ('variable', name), ('this',), ('array', name, index),
+    ('call', function_name, receiver, arguments), ('unary', op, operand), ('binary', op, lhs, rhs)
+"""
+
+import json
+
+class ClassNode:
+    """ClassNode: A Jack class, its variables [(name, type, kind)] in the order of their declaration, kind being STATIC or FIELD, and its subroutines, a list or an iterator which the CompilationEngine parses them for one at a time"""
+    __slots__ = ('class_name', 'class_vars', 'subroutines')
+    expression_fields = ()
+
+    def __init__(self, class_name, class_vars, subroutines):
+        self.class_name = class_name
+        self.class_vars = class_vars
+        self.subroutines = subroutines
+
+class SubroutineNode:
+    """SubroutineNode: A constructor, function or method, its parameters and local variables [(name, type)] in the order of their declaration, and its statements"""
+    __slots__ = ('subroutine_kind', 'return_type', 'subroutine_name', 'parameters', 'local_vars', 'statements')
+    expression_fields = ()
+
+    def __init__(self, subroutine_kind, return_type, subroutine_name, parameters, local_vars, statements):
+        self.subroutine_kind = subroutine_kind
+        self.return_type = return_type
+        self.subroutine_name = subroutine_name
+        self.parameters = parameters
+        self.local_vars = local_vars
+        self.statements = statements
+
+class LetStatement:
+    """LetStatement: let var_name[index] = value, index is None when var_name is not an array"""
+    __slots__ = ('var_name', 'index', 'value')
+    expression_fields = ('index', 'value')
+
+    def __init__(self, var_name, index, value):
+        self.var_name = var_name
+        self.index = index
+        self.value = value
+
+class IfStatement:
+    """IfStatement: if (condition) {statements} else {else_statements}, else_statements is empty when there is no else"""
+    __slots__ = ('condition', 'statements', 'else_statements')
+    expression_fields = ('condition',)
+
+    def __init__(self, condition, statements, else_statements):
+        self.condition = condition
+        self.statements = statements
+        self.else_statements = else_statements
+
+class WhileStatement:
+    """WhileStatement: while (condition) {statements}"""
+    __slots__ = ('condition', 'statements')
+    expression_fields = ('condition',)
+
+    def __init__(self, condition, statements):
+        self.condition = condition
+        self.statements = statements
+
+class DoStatement:
+    """DoStatement: do call, the value returned by the call is ignored"""
+    __slots__ = ('call',)
+    expression_fields = ('call',)
+
+    def __init__(self, call):
+        self.call = call
+
+class ReturnStatement:
+    """ReturnStatement: return value, value is None in a void subroutine"""
+    __slots__ = ('value',)
+    expression_fields = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+node_classes = {node_class.__name__: node_class for node_class in (ClassNode, SubroutineNode, LetStatement, IfStatement, WhileStatement, DoStatement, ReturnStatement)}
+statements_fields = {'subroutines', 'statements', 'else_statements'}	# The fields holding lists of nodes
+
+def expression_children(expression):
+    """Returns the list of the subexpressions of the expression tree, from left to right"""
+    kind = expression[0]
+    if kind == 'binary':
+        return [expression[2], expression[3]]
+    elif kind == 'unary':
+        return [expression[2]]
+    elif kind == 'array':
+        return [expression[2]]
+    elif kind == 'call':
+        return ([expression[2]] if expression[2] is not None else []) + expression[3]
+    return []
+
+def with_children(expression, children):
+    """Returns the expression tree with its subexpressions replaced by children, given as returned by expression_children"""
+    kind = expression[0]
+    if kind == 'binary':
+        return (kind, expression[1], children[0], children[1])
+    elif kind in {'unary', 'array'}:
+        return (kind, expression[1], children[0])
+    elif kind == 'call':
+        if expression[2] is not None:
+            return (kind, expression[1], children[0], children[1:])
+        return (kind, expression[1], None, children)
+    return expression
+
+def transform_expression(expression, transform):
+    """Returns the expression tree rebuilt bottom up, every node being replaced by transform(node), the subexpressions of node being already transformed. The tree is walked with an explicit stack, long op chains make it deep."""
+    stack = [(expression, False)]
+    results = []
+    while stack:
+        node, children_done = stack.pop()
+        if children_done:
+            children_num = len(expression_children(node))
+            children = results[len(results) - children_num:]
+            del results[len(results) - children_num:]
+            results.append(transform(with_children(node, children)))
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(expression_children(node)))
+    return results[0]
+
+def transform_subroutine_expressions(subroutine, transform):
+    """Replace every expression tree of the statements of subroutine by transform(expression tree)"""
+    statement_lists = [subroutine.statements]
+    while statement_lists:
+        for statement in statement_lists.pop():
+            for field in statement.expression_fields:
+                expression = getattr(statement, field)
+                if expression is not None:
+                    setattr(statement, field, transform(expression))
+            if isinstance(statement, IfStatement):
+                statement_lists += [statement.statements, statement.else_statements]
+            elif isinstance(statement, WhileStatement):
+                statement_lists.append(statement.statements)
+
+def flatten_expression(expression):
+    """Returns the expression tree as a flat list of its nodes in postfix order, each node without its subexpressions, so that it is serialized without nesting"""
+    flat_nodes = []
+    def flatten_node(node):
+        kind = node[0]
+        if kind == 'call':
+            flat_nodes.append([kind, node[1], node[2] is not None, len(node[3])])
+        elif kind in {'binary', 'unary', 'array'}:
+            flat_nodes.append([kind, node[1]])
+        else:
+            flat_nodes.append(list(node))
+        return node
+    transform_expression(expression, flatten_node)
+    return flat_nodes
+
+def unflatten_expression(flat_nodes):
+    """Returns the expression tree of the list returned by flatten_expression"""
+    stack = []
+    for flat_node in flat_nodes:
+        kind = flat_node[0]
+        if kind == 'binary':
+            rhs = stack.pop()
+            stack.append((kind, flat_node[1], stack.pop(), rhs))
+        elif kind in {'unary', 'array'}:
+            stack.append((kind, flat_node[1], stack.pop()))
+        elif kind == 'call':
+            function_name, has_receiver, arguments_num = flat_node[1:]
+            arguments = stack[len(stack) - arguments_num:]
+            del stack[len(stack) - arguments_num:]
+            receiver = stack.pop() if has_receiver else None
+            stack.append((kind, function_name, receiver, arguments))
+        else:
+            stack.append(tuple(flat_node))
+    return stack[0]
+
+def node_to_dict(node):
+    """Returns the node as a dict of json values: {"node": name of its class, field: value}"""
+    node_dict = {'node': type(node).__name__}
+    for field in node.__slots__:
+        value = getattr(node, field)
+        if field in statements_fields:
+            value = [node_to_dict(child) for child in value]
+        elif field in node.expression_fields and value is not None:
+            value = flatten_expression(value)
+        node_dict[field] = value
+    return node_dict
+
+def node_from_dict(node_dict):
+    """Returns the node of the dict returned by node_to_dict"""
+    node_class = node_classes[node_dict['node']]
+    values = []
+    for field in node_class.__slots__:
+        value = node_dict[field]
+        if field in statements_fields:
+            value = [node_from_dict(child) for child in value]
+        elif field in node_class.expression_fields and value is not None:
+            value = unflatten_expression(value)
+        elif field in {'class_vars', 'parameters', 'local_vars'}:
+            value = [tuple(variable) for variable in value]
+        values.append(value)
+    return node_class(*values)
+
+def write_ir(class_node, ir_file):
+    """Write the abstract syntax tree of the class to the json file ir_file, so that later stages can read it instead of parsing the class again"""
+    with open(ir_file, 'w', encoding='utf_8') as outf:
+        json.dump(node_to_dict(class_node), outf, separators=(',', ':'))
+
+def read_ir(ir_file):
+    """Returns the ClassNode written to ir_file by write_ir"""
+    with open(ir_file, 'r', encoding='utf_8') as inf:
+        return node_from_dict(json.load(inf))
@@ -1,36 +1,132 @@
 #!/usr/bin/python3
 
 import argparse
+import hashlib
 from pathlib import Path
 
-from JackTokenizer import JackTokenizer 
+from BuildCache import BuildCache
+from JackAST import read_ir, write_ir
+from JackTokenizer import JackTokenizer
 from CompilationEngine import CompilationEngine
+from ConstantFolder import ConstantFolder
+from DeadCodeEliminator import DeadCodeEliminator
+from PassManager import PassManager
+from ProgramIndex import ProgramIndex
+from VMCodeGenerator import VMCodeGenerator
 
-def compile_jack(jackfile):
-    out_vm_file = jackfile.with_suffix('.vm')
+def create_pass_manager():
+    """The optimization passes run on every subroutine, in order"""
+    pass_manager = PassManager()
+    pass_manager.add_pass('fold-constants', ConstantFolder().fold_subroutine)
+    pass_manager.add_pass('eliminate-dead-code', DeadCodeEliminator().eliminate_subroutine)
+    return pass_manager
+
+def compile_jack(jackfile, build_parse_tree=False, program_index=None, emit_ir=False):
+    """Compile jackfile into a vm file beside it, and declare the class and the calls it makes to program_index if one is given. With emit_ir, the optimized abstract syntax tree of the class is also written to an .ir.json file beside it. Returns the time spent in each optimization pass {pass name: seconds}."""
     # Tokenize
     jack_tokenizer = JackTokenizer(jackfile)
-    tokens_with_tokenType = jack_tokenizer.tokenize()
-    # Compile
-    jack_compilation_engine = CompilationEngine(tokens_with_tokenType, out_vm_file)
-    jack_compilation_engine.compile()
+    tokens = jack_tokenizer.tokenize()
+    # Parse
+    jack_compilation_engine = CompilationEngine(tokens, jackfile, build_parse_tree, program_index)
+    class_node = jack_compilation_engine.compile()
+    # Optimize, the passes running on each subroutine as the VMCodeGenerator reads it
+    pass_manager = create_pass_manager()
+    class_node = pass_manager.run(class_node)
+    if emit_ir:	# The whole class is held in memory to write it
+        class_node.subroutines = list(class_node.subroutines)
+        write_ir(class_node, jackfile.with_suffix('.ir.json'))
+    # Generate
+    VMCodeGenerator(jackfile.with_suffix('.vm'), program_index).generate(class_node)
+    return pass_manager.timings
+
+def compile_jack_indexed(jackfile, build_parse_tree=False, emit_ir=False):
+    """compile_jack in a worker process, returns the time spent in each optimization pass and the ProgramIndex of the class, to be merged into the index of the program"""
+    program_index = ProgramIndex()
+    return compile_jack(jackfile, build_parse_tree, program_index, emit_ir), program_index
+
+def compile_ir(ir_file):
+    """Compile the abstract syntax tree written by compile_jack to ir_file into a vm file beside it, without parsing the class again"""
+    class_node = create_pass_manager().run(read_ir(ir_file))
+    VMCodeGenerator(ir_file.with_name(class_node.class_name + '.vm')).generate(class_node)
+
+def get_compiler_version():
+    """The version of the compiler is the hash of its source files, so that any change to the compiler invalidates the build cache"""
+    version = hashlib.sha1()
+    for source_file in sorted(Path(__file__).resolve().parent.glob('*.py')):
+        version.update(source_file.read_bytes())
+    return version.hexdigest()
+
+def compile_jackfiles(jackfiles, jobs, build_parse_tree, emit_ir=False, pass_timings=None, program_index=None):
+    """Compile jackfiles, in a pool of jobs processes if jobs > 1, then check the calls between them against the ProgramIndex of the classes compiled, added to program_index if given, which holds the classes of the program not compiled again. The time spent in each optimization pass is added to pass_timings if given. Returns the ProgramIndex of the program."""
+    if program_index is None:
+        program_index = ProgramIndex()
+    if jobs > 1 and len(jackfiles) > 1:
+        # Imported here since importing it takes longer than a no-op rebuild
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # list() waits for all the classes to be compiled and raises the first compilation error, if any
+            timings = []
+            for class_timings, class_index in list(executor.map(compile_jack_indexed, jackfiles, [build_parse_tree] * len(jackfiles), [emit_ir] * len(jackfiles))):
+                timings.append(class_timings)
+                program_index.merge(class_index)
+    else:
+        timings = [compile_jack(jackfile, build_parse_tree, program_index, emit_ir) for jackfile in jackfiles]
+    program_index.check_calls()
+    if pass_timings is not None:
+        for class_timings in timings:
+            for pass_name, seconds in class_timings.items():
+                pass_timings[pass_name] = pass_timings.get(pass_name, 0.0) + seconds
+    return program_index
+
+def compile_path(path_input, jobs=1, build_parse_tree=False, force=False, emit_ir=False, pass_timings=None):
+    """Compile the jack file path_input, or all the jack files in the directory path_input, skipping the classes the build cache knows are up to date. Returns the list of the jack files compiled."""
+    if path_input.is_dir():	# Compile all jack files in directory
+        jackfiles = [f for f in path_input.glob('*.jack')]
+        assert jackfiles, "No jack file in this directory."
+        directory = path_input
+    else:	# Compile one jack file
+        jackfiles = [path_input]
+        directory = path_input.parent
+
+    if build_parse_tree or emit_ir:
+        # The parse trees and abstract syntax trees are not cached, so every class must be compiled again
+        compile_jackfiles(jackfiles, jobs, build_parse_tree, emit_ir, pass_timings)
+        return jackfiles
+
+    build_cache = BuildCache(directory, get_compiler_version())
+    build_keys = {jackfile: build_cache.build_key(jackfile) for jackfile in jackfiles}
+    outdated_jackfiles = [jackfile for jackfile in jackfiles if force or not build_cache.is_up_to_date(jackfile, build_keys[jackfile])]
+    # The calls of the classes compiled and of the ones up to date are checked together, as in a full build
+    program_index = ProgramIndex()
+    for jackfile in set(jackfiles).difference(outdated_jackfiles):
+        program_index.import_class(jackfile.stem, build_cache.get_class_entries(jackfile))
+    program_index = compile_jackfiles(outdated_jackfiles, jobs, build_parse_tree, pass_timings=pass_timings, program_index=program_index)
+    for jackfile in outdated_jackfiles:
+        build_cache.update(jackfile, build_keys[jackfile], program_index.export_class(jackfile.stem))
+    build_cache.save()
+    return outdated_jackfiles
 
 def main():
     arg_parser = argparse.ArgumentParser(description='Compile the input Jack program into syntax analyzed output')
-    arg_parser.add_argument('path_input', help='The path for Jack program file *.jack or the directory path which contains *.jack files')
+    arg_parser.add_argument('path_input', help='The path for Jack program file *.jack or the directory path which contains *.jack files, or a *.ir.json file written with --emit-ir')
+    arg_parser.add_argument('--parse-tree', action='store_true', help='Also build the parse tree of each class and write it to an xml file beside the vm file, for debugging (needs lxml)')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of classes compiled in parallel')
+    arg_parser.add_argument('--force', action='store_true', help='Compile every class, even the ones the build cache knows are up to date')
+    arg_parser.add_argument('--emit-ir', action='store_true', help='Also write the optimized abstract syntax tree of each class to an .ir.json file beside the vm file, which can be compiled again without parsing')
+    arg_parser.add_argument('--time-passes', action='store_true', help='Print the time spent in each optimization pass')
     args = arg_parser.parse_args()
 
     path_input = Path(args.path_input)
     assert path_input.exists(), "Path does not exist."
 
-    if path_input.is_dir():	# Compile all jack files in directory
-        jackfiles = [f for f in path_input.glob('*.jack')]
-        assert jackfiles, "No jack file in this directory."
-        for jackfile in jackfiles:
-            compile_jack(jackfile)
-    else:	# Compile one jack file
-        jackfile = path_input
-        compile_jack(jackfile)
+    if path_input.name.endswith('.ir.json'):	# Compile the abstract syntax tree of a class
+        compile_ir(path_input)
+    else:
+        pass_timings = {}
+        compile_path(path_input, args.jobs, args.parse_tree, args.force, args.emit_ir, pass_timings)
+        if args.time_passes:
+            for pass_name, seconds in pass_timings.items():
+                print('{:<24} {:10.3f} ms'.format(pass_name, seconds * 1e3))
 
     print('Done')
 
@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+
+import argparse
+import importlib.util
+import json
+import socket
+import socketserver
+import sys
+import time
+from pathlib import Path
+
+from JackCompiler import compile_path
+
+projects_dir = Path(__file__).resolve().parent.parent
+
+def load_module(module_name, module_file):
+    """Import the script module_file of another project as module_name. The directory of module_file comes first on sys.path while the script imports its own modules, which are then dropped from sys.modules since the projects have modules of the same name (e.g. parser.py)"""
+    project_dir = module_file.parent
+    sys.path.insert(0, str(project_dir))
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, module_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(project_dir))
+        for name, imported_module in list(sys.modules.items()):
+            imported_file = getattr(imported_module, '__file__', None)
+            if imported_file and Path(imported_file).parent == project_dir:
+                del sys.modules[name]
+    return module
+
+class JackToolchain:
+    """JackToolchain: Keeps the Jack compiler, the VM translator and the assembler loaded in one process, so that a program is rebuilt without starting an interpreter per tool, and the caches of the tools stay warm from one build to the next"""
+    def __init__(self):
+        self.vm_translator = load_module('VMtranslator', projects_dir / '08_virtual_machine_part2_program_control' / 'VMtranslator.py')
+        self.hack_assembler = load_module('hack_assembler', projects_dir / '06_assembler' / 'hack_assembler.py')
+        self.commands = {'compile': self.compile, 'translate': self.translate, 'assemble': self.assemble, 'build': self.build}
+
+    def compile(self, path_input):
+        """Compile the classes of path_input which changed since their last compilation"""
+        compiled_jackfiles = compile_path(path_input)
+        return {'compiled': [jackfile.name for jackfile in compiled_jackfiles]}
+
+    def translate(self, path_input):
+        out_asm_file = self.vm_translator.translate_vm(path_input)
+        return {'asm': str(out_asm_file)}
+
+    def assemble(self, path_input):
+        self.hack_assembler.assemble(str(path_input))
+        return {'hack': str(path_input.with_suffix('.hack'))}
+
+    def build(self, path_input):
+        """Compile the changed classes of the program in the directory path_input, then translate and assemble the whole program again into a hack file"""
+        result = self.compile(path_input)
+        result.update(self.translate(path_input))
+        result.update(self.assemble(Path(result['asm'])))
+        return result
+
+    def run_request(self, request):
+        """Run the request {"command": one of self.commands, "path": absolute path of its input}, returns the response {"ok": ..., "elapsed": seconds, ...} with either the result of the command or its error. Any error of a tool is answered, e.g. a RecursionError on deeply nested code, so that it never ends the connection or the watch loop."""
+        start = time.perf_counter()
+        try:
+            assert request.get('command') in self.commands, "Unknown command {!r}.".format(request.get('command'))
+            path_input = Path(request.get('path', ''))
+            assert path_input.exists(), "Path {} does not exist.".format(path_input)
+            response = {'ok': True, **self.commands[request['command']](path_input)}
+        except Exception as error:
+            response = {'ok': False, 'error': '{}: {}'.format(type(error).__name__, error)}
+        response['elapsed'] = round(time.perf_counter() - start, 4)
+        return response
+
+    def scan_mtimes(self, directory):
+        """Returns the modification times of the jack files in directory {file name: mtime}, a file deleted while it is scanned is left out"""
+        mtimes = {}
+        for jackfile in directory.glob('*.jack'):
+            try:
+                mtimes[jackfile.name] = jackfile.stat().st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return mtimes
+
+    def watch(self, directory, interval):
+        """Rebuild the program in directory whenever one of its jack files is written, added or deleted, until interrupted"""
+        mtimes = None
+        while True:
+            current_mtimes = self.scan_mtimes(directory)
+            if current_mtimes != mtimes:
+                mtimes = current_mtimes
+                print(json.dumps(self.run_request({'command': 'build', 'path': str(directory)})), flush=True)
+            time.sleep(interval)
+
+class JackRequestHandler(socketserver.StreamRequestHandler):
+    """Serves the requests of one connection, every request is one line of json answered by one line of json"""
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                response = {'ok': False, 'error': 'Bad request: {}'.format(error)}
+            else:
+                response = self.server.toolchain.run_request(request)
+            self.wfile.write(json.dumps(response).encode('utf_8') + b'\n')
+
+class JackServer(socketserver.UnixStreamServer):
+    """JackServer: Serves the requests of the clients connected to a unix socket, one at a time, with one warm JackToolchain"""
+    def __init__(self, socket_path):
+        self.toolchain = JackToolchain()
+        socket_path.unlink(missing_ok=True)	# Left behind by a server which did not shut down cleanly
+        super().__init__(str(socket_path), JackRequestHandler)
+
+def send_request(socket_path, command, path_input):
+    """Send one request to the server listening on socket_path and returns its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        request = {'command': command, 'path': str(path_input.resolve())}
+        client.sendall(json.dumps(request).encode('utf_8') + b'\n')
+        with client.makefile('rb') as response_file:
+            response_line = response_file.readline()
+    if not response_line:
+        raise ConnectionError('The server closed the connection without a response.')
+    return json.loads(response_line)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Keep the Jack toolchain (compiler, VM translator and assembler) running, to rebuild programs with low latency')
+    subparsers = arg_parser.add_subparsers(dest='mode', required=True)
+    serve_parser = subparsers.add_parser('serve', help='Serve compile, translate, assemble and build requests on a unix socket')
+    serve_parser.add_argument('socket_path', help='The path of the unix socket')
+    watch_parser = subparsers.add_parser('watch', help='Rebuild the program in a directory into a hack file whenever one of its jack files changes')
+    watch_parser.add_argument('path_input', help='The directory path which contains the *.jack files of the program')
+    watch_parser.add_argument('--interval', type=float, default=0.05, help='Seconds between two scans of the directory')
+    request_parser = subparsers.add_parser('request', help='Send one request to a running server and print its response')
+    request_parser.add_argument('socket_path', help='The path of the unix socket of the server')
+    request_parser.add_argument('command', choices=['compile', 'translate', 'assemble', 'build'])
+    request_parser.add_argument('path_input', help='The input of the command: a jack file or directory for compile, a vm file or directory for translate, an asm file for assemble, a directory for build')
+    args = arg_parser.parse_args()
+
+    if args.mode == 'serve':
+        with JackServer(Path(args.socket_path)) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                Path(args.socket_path).unlink(missing_ok=True)
+    elif args.mode == 'watch':
+        path_input = Path(args.path_input)
+        assert path_input.is_dir(), "Path is not a directory."
+        try:
+            JackToolchain().watch(path_input, args.interval)
+        except KeyboardInterrupt:
+            pass
+    else:
+        response = send_request(Path(args.socket_path), args.command, Path(args.path_input))
+        print(json.dumps(response))
+        sys.exit(0 if response['ok'] else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+import time
+
+from JackAST import ClassNode
+
+class PassManager:
+    """PassManager: Runs a pipeline of named passes over the abstract syntax tree of each subroutine before its VM code is generated. A pass is a function taking a SubroutineNode and returning the SubroutineNode rewritten, and the time spent in each pass is accumulated over all the subroutines it ran on. The subroutines are rewritten one at a time, as they are read from the ClassNode returned by run, so that the tree of a subroutine can be freed once its VM code is generated."""
+    def __init__(self):
+        self.passes = []	# [(pass name, pass function)] in the order they run
+        self.timings = {}	# {pass name: seconds}
+
+    def add_pass(self, pass_name, pass_function):
+        """Append the pass to the pipeline, its name must be unique"""
+        assert pass_name not in self.timings, "Pass {} added twice.".format(pass_name)
+        self.passes.append((pass_name, pass_function))
+        self.timings[pass_name] = 0.0
+
+    def run_subroutine(self, subroutine):
+        """Run all the passes, in order, on subroutine and returns the subroutine rewritten by the last one"""
+        for pass_name, pass_function in self.passes:
+            start = time.perf_counter()
+            subroutine = pass_function(subroutine)
+            self.timings[pass_name] += time.perf_counter() - start
+        return subroutine
+
+    def run(self, class_node):
+        """Returns class_node, its subroutines being rewritten by all the passes as they are read"""
+        return ClassNode(class_node.class_name, class_node.class_vars, map(self.run_subroutine, class_node.subroutines))
@@ -0,0 +1,106 @@
+class SubroutineSignature:
+    """SubroutineSignature: The declaration of a subroutine: its kind (constructor, function, or method), return type, and the types of its parameters"""
+    __slots__ = ('subroutine_kind', 'return_type', 'parameter_types')
+
+    def __init__(self, subroutine_kind, return_type, parameter_types):
+        self.subroutine_kind = subroutine_kind
+        self.return_type = return_type
+        self.parameter_types = parameter_types
+
+class SubroutineCall:
+    """SubroutineCall: A call written in a subroutine: the name of the calling subroutine, the name className.subroutineName of the subroutine called, is it called on an object (as a method), and the number of arguments given, the object not counted"""
+    __slots__ = ('caller_name', 'function_name', 'is_method_call', 'arguments_num')
+
+    def __init__(self, caller_name, function_name, is_method_call, arguments_num):
+        self.caller_name = caller_name
+        self.function_name = function_name
+        self.is_method_call = is_method_call
+        self.arguments_num = arguments_num
+
+class ClassInfo:
+    """ClassInfo: What other classes can know about a class: its fields and statics {name: type}, in the order of their running index, and its subroutines {name: SubroutineSignature}"""
+    __slots__ = ('fields', 'statics', 'subroutines')
+
+    def __init__(self):
+        self.fields = {}
+        self.statics = {}
+        self.subroutines = {}
+
+class ProgramIndex:
+    """ProgramIndex: Whole-program index of the classes declared in a program, filled by the CompilationEngine of each class so that later compiler passes can query any class of the program without parsing it again. The VMCodeGenerator adds the calls it writes, which are checked against the declarations once the whole program is indexed."""
+    def __init__(self):
+        self.classes = {}
+        self.calls = []	# [SubroutineCall]
+
+    def add_class(self, class_name):
+        """Adds a new class to the index, replacing the class of the same name if it was indexed already"""
+        self.classes[class_name] = ClassInfo()
+
+    def add_variable(self, class_name, var_name, var_type, var_kind):
+        """kind (STATIC or FIELD)"""
+        class_info = self.classes[class_name]
+        if var_kind == 'FIELD':
+            class_info.fields[var_name] = var_type
+        else:
+            class_info.statics[var_name] = var_type
+
+    def add_subroutine(self, class_name, subroutine_name, subroutine_kind, return_type, parameter_types):
+        self.classes[class_name].subroutines[subroutine_name] = SubroutineSignature(subroutine_kind, return_type, parameter_types)
+
+    def add_call(self, caller_name, function_name, is_method_call, arguments_num):
+        self.calls.append(SubroutineCall(caller_name, function_name, is_method_call, arguments_num))
+
+    def merge(self, program_index):
+        """Adds the classes and calls of program_index, the index of the classes compiled by another process"""
+        self.classes.update(program_index.classes)
+        self.calls += program_index.calls
+
+    def export_class(self, class_name):
+        """Returns the entries of the class and of the calls its subroutines make, as json values to be kept in the build cache: {'fields': {name: type}, 'statics': {name: type}, 'subroutines': {name: [kind, return type, [parameter types]]}, 'calls': [[caller name, function name, is method call, arguments num]]}"""
+        class_info = self.classes[class_name]
+        return {
+                'fields': class_info.fields,
+                'statics': class_info.statics,
+                'subroutines': {name: [signature.subroutine_kind, signature.return_type, signature.parameter_types] for name, signature in class_info.subroutines.items()},
+                'calls': [[call.caller_name, call.function_name, call.is_method_call, call.arguments_num] for call in self.calls if call.caller_name.split('.')[0] == class_name],
+                }
+
+    def import_class(self, class_name, class_entries):
+        """Adds the class and the calls of class_entries, returned by export_class for a class which is not compiled again"""
+        self.add_class(class_name)
+        class_info = self.classes[class_name]
+        class_info.fields.update(class_entries['fields'])
+        class_info.statics.update(class_entries['statics'])
+        for subroutine_name, (subroutine_kind, return_type, parameter_types) in class_entries['subroutines'].items():
+            self.add_subroutine(class_name, subroutine_name, subroutine_kind, return_type, parameter_types)
+        for caller_name, function_name, is_method_call, arguments_num in class_entries['calls']:
+            self.add_call(caller_name, function_name, is_method_call, arguments_num)
+
+    def check_calls(self):
+        """Raise a SyntaxError for the first call to a subroutine of a class of the program which is not declared, or is not a method but called on an object or the other way around, or takes another number of arguments. The calls to the classes not in the index, such as the OS, are not checked."""
+        for call in self.calls:
+            class_name, subroutine_name = call.function_name.split('.')
+            if class_name not in self.classes:
+                continue
+            signature = self.get_subroutine(class_name, subroutine_name)
+            if signature is None:
+                raise SyntaxError('{}: calls {}, which is not declared'.format(call.caller_name, call.function_name))
+            if call.is_method_call != (signature.subroutine_kind == 'method'):
+                raise SyntaxError('{}: calls the {} {} {}'.format(call.caller_name, signature.subroutine_kind, call.function_name, 'on an object' if call.is_method_call else 'without an object'))
+            if call.arguments_num != len(signature.parameter_types):
+                raise SyntaxError('{}: calls {} with {} arguments, it takes {}'.format(call.caller_name, call.function_name, call.arguments_num, len(signature.parameter_types)))
+
+    def get_class(self, class_name):
+        """Returns the ClassInfo of the class, or None if the class is not in the program"""
+        return self.classes.get(class_name)
+
+    def get_subroutine(self, class_name, subroutine_name):
+        """Returns the SubroutineSignature of className.subroutineName, or None if it is not in the program"""
+        class_info = self.classes.get(class_name)
+        if class_info is None:
+            return None
+        return class_info.subroutines.get(subroutine_name)
+
+    def count_fields(self, class_name):
+        """Returns the number of fields of an object of the class, which is the size of the memory block allocated by its constructors"""
+        return len(self.classes[class_name].fields)
@@ -1,51 +1,66 @@
+class Symbol:
+    """Symbol: The properties of an identifier needed for compilation: type, kind (STATIC, FIELD, ARG, or VAR), and running index within its kind"""
+    __slots__ = ('symbol_type', 'symbol_kind', 'index')
+
+    def __init__(self, symbol_type, symbol_kind, index):
+        self.symbol_type = symbol_type
+        self.symbol_kind = symbol_kind
+        self.index = index
+
 class SymbolTable:
     """
     SymbolTable: Provides a symbol table abstraction. The symbol table associates the identifier names found in the program with identifier properties needed for compilation: type, kind, and running index. The symbol table for Jack programs has two nested scopes (class/subroutine).
+    The number of identifiers of each kind is kept in a counter, so defining an identifier and counting the identifiers of a kind are O(1).
     """
+    class_kinds = {'STATIC', 'FIELD'}
+
     def __init__(self):
         """Creates a new empty symbol table."""
         self.symbol_table_class = {}
         self.symbol_table_subroutine = {}
+        self.kind_counts = {'STATIC': 0, 'FIELD': 0, 'ARG': 0, 'VAR': 0}
 
     def start_subroutine(self):
         """Starts a new subroutine scope (i.e., resets the subroutine's symbol table)."""
         self.symbol_table_subroutine = {}
+        self.kind_counts['ARG'] = 0
+        self.kind_counts['VAR'] = 0
 
     def define(self, symbol_name, symbol_type, symbol_kind):
         """
         arguments: name (String) type (String) kind (STATIC, FIELD, ARG, or VAR)
         Defines a new identifier of a given name, type, and kind and assigns it a running index. STATIC and FIELD identifiers have a class scope, while ARG and VAR identifiers have a subroutine scope.
         """
-        index = self.count_symbol_by_kind(symbol_kind)
-        if symbol_kind in {'STATIC', 'FIELD'}:
-            self.symbol_table_class[symbol_name] = [symbol_type, symbol_kind, index]
-        else:
-            self.symbol_table_subroutine[symbol_name] = [symbol_type, symbol_kind, index]
+        scope = self.symbol_table_class if symbol_kind in self.class_kinds else self.symbol_table_subroutine
+        index = self.kind_counts[symbol_kind]
+        redefined_symbol = scope.get(symbol_name)
+        if redefined_symbol is not None:	# The identifier defined again in the same scope replaces the previous one, which is not counted anymore
+            self.kind_counts[redefined_symbol.symbol_kind] -= 1
+        scope[symbol_name] = Symbol(symbol_type, symbol_kind, index)
+        self.kind_counts[symbol_kind] += 1
 
     def count_symbol_by_kind(self, symbol_kind):
         """
         kind (STATIC, FIELD, ARG, or VAR)
         Returns the number of variables of the given kind already defined in the current scope.
         """
-        if symbol_kind in {'STATIC', 'FIELD'}:
-            return sum(value[1]==symbol_kind for value in self.symbol_table_class.values())
-        else:
-            return sum(value[1]==symbol_kind for value in self.symbol_table_subroutine.values())
-
-    def get_symbol_attr(self, symbol_name, attr_num):
-        """Returns the attribute of the named identifier in the current scope. The attribute is specified by the integer attr_num. If the identifier is unknown in the current scope, returns NONE."""
-        if symbol_name in self.symbol_table_subroutine:
-            return self.symbol_table_subroutine[symbol_name][attr_num]
-        elif symbol_name in self.symbol_table_class:
-            return self.symbol_table_class[symbol_name][attr_num]
-        else:
-            return None
+        return self.kind_counts[symbol_kind]
+
+    def get_symbol(self, symbol_name):
+        """Returns the Symbol of the named identifier in the current scope. If the identifier is unknown in the current scope, returns NONE."""
+        symbol = self.symbol_table_subroutine.get(symbol_name)
+        if symbol is None:
+            symbol = self.symbol_table_class.get(symbol_name)
+        return symbol
 
     def get_symbol_type(self, symbol_name):
-        return self.get_symbol_attr(symbol_name, 0)
+        symbol = self.get_symbol(symbol_name)
+        return symbol.symbol_type if symbol is not None else None
 
     def get_symbol_kind(self, symbol_name):
-        return self.get_symbol_attr(symbol_name, 1)
+        symbol = self.get_symbol(symbol_name)
+        return symbol.symbol_kind if symbol is not None else None
 
     def get_symbol_index(self, symbol_name):
-        return self.get_symbol_attr(symbol_name, 2)
+        symbol = self.get_symbol(symbol_name)
+        return symbol.index if symbol is not None else None
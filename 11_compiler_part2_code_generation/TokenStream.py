@@ -0,0 +1,44 @@
+from collections import deque
+
+class TokenStream:
+    """
+    TokenStream: Cursor over the token records (token, token_type, line, column) produced by JackTokenizer. Advancing, peeking and looking ahead are all O(1), so consuming a class is linear in its number of tokens.
+    The tokens can be given as a list or any other iterable (e.g. the JackTokenizer.tokenize generator), only the tokens being looked ahead at are buffered.
+    """
+    end_of_stream = (None, None, None, None)
+
+    def __init__(self, tokens):
+        self.tokens_iter = iter(tokens)
+        self.buffer = deque()
+
+    def fill_buffer(self, size):
+        """Read tokens from the underlying iterable until size tokens are buffered, or no token is left"""
+        while len(self.buffer) < size:
+            try:
+                self.buffer.append(next(self.tokens_iter))
+            except StopIteration:
+                return False
+        return True
+
+    def has_more_tokens(self):
+        return self.fill_buffer(1)
+
+    def advance(self):
+        """Consumes the next token and returns its token record"""
+        if self.buffer or self.fill_buffer(1):
+            return self.buffer.popleft()
+        raise SyntaxError('Unexpected end of file')
+
+    def lookahead(self, k):
+        """Returns the token record of the k-th token (0 is the next token) without consuming it. Returns end_of_stream if there is no such token."""
+        if self.fill_buffer(k + 1):
+            return self.buffer[k]
+        return self.end_of_stream
+
+    def peek(self):
+        """Returns the token record of the next token without consuming it"""
+        return self.lookahead(0)
+
+    def peek_token(self):
+        """Returns the next token without consuming it"""
+        return self.lookahead(0)[0]
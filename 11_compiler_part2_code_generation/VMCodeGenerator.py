@@ -0,0 +1,418 @@
+from ConstantFolder import ConstantFolder, contains_array_access, non_negative_bits, split_array_offset
+from JackAST import DoStatement, IfStatement, LetStatement, ReturnStatement, WhileStatement
+from SymbolTable import SymbolTable
+from VMWriter import VMWriter
+
+class VMCodeGenerator:
+    """VMCodeGenerator: Emits the VM code of the abstract syntax tree of a class (a ClassNode) into a vm file, through a VMWriter."""
+    max_multiply_steps = 8	# A multiplication by a constant needing more doublings and additions than this calls Math.multiply, to keep the code small
+    def __init__(self, out_vm_file, program_index=None):
+        self.out_vm_file = out_vm_file
+        self.program_index = program_index	# The ProgramIndex the calls are added to, if any
+        self.symbol_table = SymbolTable()
+        self.constant_folder = ConstantFolder()
+        self.vm_writer = VMWriter(out_vm_file)
+        self.construct_op_dict()
+        self.construct_segment_dict()
+        self.construct_statement_dict()
+        self.while_label_index = 0
+        self.if_else_label_index = 0
+        self.string_label_index = 0
+        self.string_pool = {}	# {string constant: index of the static variable keeping it}
+
+    def construct_op_dict(self):
+        self.op_dict = {
+                '+': 'add',
+                '-': 'sub',
+                '&': 'and',
+                '|': 'or',
+                '<': 'lt',
+                '>': 'gt',
+                '=': 'eq',
+                }
+
+    def construct_segment_dict(self):
+        """Translate the kind of variable to related memory segment name"""
+        self.segment_dict = {
+                'STATIC': 'static',
+                'FIELD': 'this',
+                'ARG': 'argument',
+                'VAR': 'local',
+                }
+
+    def construct_statement_dict(self):
+        """The method writing each kind of statement node"""
+        self.statement_dict = {
+                LetStatement: self.write_statement_let,
+                IfStatement: self.write_statement_if,
+                WhileStatement: self.write_statement_while,
+                DoStatement: self.write_statement_do,
+                ReturnStatement: self.write_statement_return,
+                }
+
+    def generate(self, class_node):
+        """Write the vm code of the class and close the vm file"""
+        self.class_name = class_node.class_name
+        for var_name, var_type, var_kind in class_node.class_vars:
+            self.symbol_table.define(var_name, var_type, var_kind)
+        for subroutine in class_node.subroutines:
+            self.write_subroutine(subroutine)
+        self.vm_writer.close()
+
+    def write_subroutine(self, subroutine):
+        self.symbol_table.start_subroutine()	# Reset the subroutine's symbol table
+        if subroutine.subroutine_kind == 'method':
+            # this is a dummy symbol added to the symbol_table's ARG, for the side effect that method's number of arguments will add 1. A method with k arguments operates on k+1 arguments actually, and the first argument (argument number 0) always refers to the this object
+            self.symbol_table.define('this', 'int', 'ARG')
+        for var_name, var_type in subroutine.parameters:
+            self.symbol_table.define(var_name, var_type, 'ARG')
+        for var_name, var_type in subroutine.local_vars:
+            self.symbol_table.define(var_name, var_type, 'VAR')
+        local_vars_num = self.symbol_table.count_symbol_by_kind('VAR')
+        self.subroutine_name = self.class_name + '.' + subroutine.subroutine_name
+        self.vm_writer.write_function(self.subroutine_name, local_vars_num)
+        if subroutine.subroutine_kind == 'constructor':
+            # translate this=Memory.alloc(fields_num)
+            fields_num = self.symbol_table.count_symbol_by_kind('FIELD')
+            self.vm_writer.write_push('constant', fields_num)
+            self.vm_writer.write_call('Memory.alloc', 1)
+            self.vm_writer.write_pop('pointer', 0)
+        elif subroutine.subroutine_kind == 'method':
+            # Point the virtual this segment to the current object (using pointer 0)
+            self.vm_writer.write_push('argument', 0)	# In method, this object address will always be stored in the first argument
+            self.vm_writer.write_pop('pointer', 0)
+        self.write_statements(subroutine.statements)
+
+    def write_statements(self, statements):
+        for statement in statements:
+            self.statement_dict[type(statement)](statement)
+
+    def write_statement_let(self, statement):
+        """
+        code:
+            varName = expression
+        vm:
+            push expression
+            pop varName
+        code:
+            arr[expression1] = expression2
+        vm:
+            push arr
+            push expression1
+            add
+            pop pointer 1
+            push expression2
+            pop that 0
+        If expression2 reads an array item, for example a[i]=b[j], it sets pointer 1 itself and would mess up the address to be modified. Then the address is kept on the stack while expression2 is computed, and the value of expression2 is rescued to temp 0 while pointer 1 is aligned:
+            push arr
+            push expression1
+            add
+            push expression2
+            pop temp 0
+            pop pointer 1
+            push temp 0
+            pop that 0
+        A constant index, or the constant added last to the index, is not added to arr but becomes the index of the that segment, for example arr[i+1]=x is push arr, push i, add, pop pointer 1, push x, pop that 1.
+        """
+        if statement.index is None:	# a varName
+            self.write_expression(statement.value)
+            self.write_pop_variable(statement.var_name)
+            return
+        offset = self.write_array_address(statement.var_name, statement.index)
+        if contains_array_access(statement.value):
+            self.write_expression(statement.value)
+            self.vm_writer.write_pop('temp', 0)
+            self.vm_writer.write_pop('pointer', 1)
+            self.vm_writer.write_push('temp', 0)
+        else:
+            self.vm_writer.write_pop('pointer', 1)
+            self.write_expression(statement.value)
+        self.vm_writer.write_pop('that', offset)
+
+    def write_statement_if(self, statement):
+        """
+        code:
+        	if (cond)
+                    s1
+                else
+                    s2
+        vm:
+        	VM code for computing ~(cond)
+                if-goto L1
+                VM code for executing s1
+                goto L2
+                label L1
+                VM code for executing s2
+                label L2
+        """
+        self.if_else_label_index += 1
+        else_start_label_name = 'ELSE_START_{}_{}'.format(self.class_name.upper(), self.if_else_label_index)
+        if_else_end_label_name = 'IF_ELSE_END_{}_{}'.format(self.class_name.upper(), self.if_else_label_index)
+        self.write_expression(self.constant_folder.fold_unary('~', statement.condition))
+        self.vm_writer.write_if_goto(else_start_label_name)
+        self.write_statements(statement.statements)
+        self.vm_writer.write_goto(if_else_end_label_name)
+        self.vm_writer.write_label(else_start_label_name)
+        self.write_statements(statement.else_statements)
+        self.vm_writer.write_label(if_else_end_label_name)
+
+    def write_statement_while(self, statement):
+        """
+        code:
+            while (cond)
+                s1
+        vm:
+            label L1
+            VM code for computing ~(cond)
+            if-goto L2
+            VM code for executing s1
+            goto L1
+            label L2
+        """
+        self.while_label_index += 1
+        while_start_label_name = 'WHILE_START_{}_{}'.format(self.class_name.upper(), self.while_label_index)
+        while_end_label_name = 'WHILE_END_{}_{}'.format(self.class_name.upper(), self.while_label_index)
+        self.vm_writer.write_label(while_start_label_name)
+        self.write_expression(self.constant_folder.fold_unary('~', statement.condition))
+        self.vm_writer.write_if_goto(while_end_label_name)
+        self.write_statements(statement.statements)
+        self.vm_writer.write_goto(while_start_label_name)
+        self.vm_writer.write_label(while_end_label_name)
+
+    def write_statement_do(self, statement):
+        self.write_expression(statement.call)
+        # When translating a do sub statement where sub is a void method or function, the caller of the corresponding VM function must pop (and ignore) the returned value (which is always the constant 0).
+        self.vm_writer.write_pop('temp', 0)
+
+    def write_statement_return(self, statement):
+        if statement.value is not None:
+            self.write_expression(statement.value)
+        else:
+            # void functions return the constant 0
+            self.vm_writer.write_push('constant', 0)
+        self.vm_writer.write_return()
+
+    def write_expression(self, expression):
+        """Write the vm code computing the expression tree and pushing its value to the working stack. The operands are pushed from left to right, so calls are made in the order they are written."""
+        # A long chain of operators makes a tree deep on its left, its left spine is walked with a loop
+        left_spine = []
+        while expression[0] == 'binary':
+            left_spine.append(expression)
+            expression = expression[2]
+        self.write_term(expression)
+        for binary in reversed(left_spine):
+            op, lhs, rhs = binary[1:]
+            if op == '*' and rhs == ('constant', 0):	# Left by the folder since lhs calls a subroutine, which is run for its side effects only
+                self.vm_writer.write_pop('temp', 0)
+                self.vm_writer.write_push('constant', 0)
+                continue
+            if op == '*' and rhs[0] == 'constant' and self.count_multiply_steps(rhs[1]) <= self.max_multiply_steps:
+                self.write_multiply_by_constant(lhs, rhs[1])
+                continue
+            if op == '/' and rhs[0] == 'constant' and rhs[1] > 1 and rhs[1] & (rhs[1] - 1) == 0 and non_negative_bits(lhs) is not None:
+                self.write_divide_by_power_of_two(lhs, rhs[1])
+                continue
+            self.write_expression(rhs)
+            # Write vm code for operator
+            if op == '*':
+                self.vm_writer.write_call('Math.multiply', 2)
+            elif op == '/':
+                self.vm_writer.write_call('Math.divide', 2)
+            else:
+                self.vm_writer.write_arithmetic(self.op_dict[op])
+
+    def count_multiply_steps(self, multiplier):
+        """Returns the number of doublings and additions computing x * multiplier from x, multiplier not being 0"""
+        bits = '{:b}'.format(abs(multiplier))
+        return len(bits) - 1 + bits.count('1') - 1
+
+    def write_multiply_by_constant(self, multiplicand, multiplier):
+        """
+        The value of the expression tree multiplicand is on top of the working stack, replace it by multiplicand * multiplier with a sequence of doublings and additions instead of calling Math.multiply.
+        code:
+            x * 10
+        vm (multiplier 10 is 1010 in binary, from its highest bit: double, double and add x, double):
+            push x
+            push x
+            add
+            pop temp 2
+            push temp 2
+            push temp 2
+            add
+            push x
+            add
+            pop temp 2
+            push temp 2
+            push temp 2
+            add
+        Doubling the top of the stack needs a copy of it, which is kept in temp 2. A multiplicand which is not a variable is computed only once and kept in temp 1.
+        """
+        if multiplicand[0] in {'variable', 'this'}:	# Pushed again whenever it is added
+            push_multiplicand = lambda: self.write_term(multiplicand)
+        else:
+            self.vm_writer.write_pop('temp', 1)
+            self.vm_writer.write_push('temp', 1)
+            push_multiplicand = lambda: self.vm_writer.write_push('temp', 1)
+        bits = '{:b}'.format(abs(multiplier))
+        for i, bit in enumerate(bits[1:]):
+            if i == 0:	# The top of the stack is still the multiplicand
+                push_multiplicand()
+            else:
+                self.vm_writer.write_pop('temp', 2)
+                self.vm_writer.write_push('temp', 2)
+                self.vm_writer.write_push('temp', 2)
+            self.vm_writer.write_arithmetic('add')
+            if bit == '1':
+                push_multiplicand()
+                self.vm_writer.write_arithmetic('add')
+        if multiplier < 0:
+            self.vm_writer.write_arithmetic('neg')
+
+    def write_divide_by_power_of_two(self, dividend, divisor):
+        """
+        The value of the expression tree dividend is on top of the working stack and known to be non-negative, replace it by dividend / divisor, divisor being 2 to the k, instead of calling Math.divide.
+        The Hack CPU has no shift, so the quotient is the sum of 2 to the (j-k) for every bit j >= k set in the dividend, and only the bits which may be set in the dividend are tested. This is not a shift for a negative dividend, as the quotient of Math.divide is rounded toward zero.
+        vm, for each bit j:
+            push temp 1
+            push constant 2^j
+            and
+            push constant 0
+            gt
+            push constant 2^(j-k)
+            and
+            add
+        """
+        dividend_bits = non_negative_bits(dividend)
+        k = divisor.bit_length() - 1
+        self.vm_writer.write_pop('temp', 1)
+        self.vm_writer.write_push('constant', 0)
+        for j in range(k, 15):
+            if dividend_bits & 1 << j:
+                self.vm_writer.write_push('temp', 1)
+                self.vm_writer.write_push('constant', 1 << j)
+                self.vm_writer.write_arithmetic('and')
+                self.vm_writer.write_push('constant', 0)
+                self.vm_writer.write_arithmetic('gt')
+                self.vm_writer.write_push('constant', 1 << j - k)
+                self.vm_writer.write_arithmetic('and')
+                self.vm_writer.write_arithmetic('add')
+
+    def write_term(self, term):
+        """Write the vm code of a term which is not a binary operation"""
+        kind = term[0]
+        if kind == 'constant':
+            value = term[1]
+            if value >= 0:
+                self.vm_writer.write_push('constant', value)
+            elif value == -0x8000:
+                # 32768 does not fit in a constant, -32768 is ~32767
+                self.vm_writer.write_push('constant', 0x7FFF)
+                self.vm_writer.write_arithmetic('not')
+            else:
+                self.vm_writer.write_push('constant', -value)
+                self.vm_writer.write_arithmetic('neg')
+        elif kind == 'variable':
+            self.write_push_variable(term[1])
+        elif kind == 'this':
+            self.vm_writer.write_push('pointer', 0)
+        elif kind == 'string':
+            self.write_string_constant(term[1])
+        elif kind == 'array':
+            """
+            code: 
+                a[i]
+            vm:
+                push a
+                push i
+                add
+                pop pointer 1
+                push that 0
+            """
+            offset = self.write_array_address(term[1], term[2])
+            self.vm_writer.write_pop('pointer', 1)
+            # Push the value of the array item to stack using segment that
+            self.vm_writer.write_push('that', offset)
+        elif kind == 'call':
+            function_name, receiver, arguments = term[1:]
+            args_num = len(arguments)
+            if receiver is not None:
+                # A method operates on one more argument, the base address of the object it is called on, which is pushed first
+                self.write_term(receiver)
+                args_num += 1
+            for argument in arguments:
+                if argument[0] == 'string':
+                    self.write_pooled_string_constant(argument[1])
+                else:
+                    self.write_expression(argument)
+            self.vm_writer.write_call(function_name, args_num)
+            if self.program_index is not None:
+                self.program_index.add_call(self.subroutine_name, function_name, receiver is not None, len(arguments))
+        else:	# unary
+            self.write_expression(term[2])
+            if term[1] == '-':
+                self.vm_writer.write_arithmetic('neg')
+            else:
+                self.vm_writer.write_arithmetic('not')
+
+    def write_array_address(self, symbol_name, index):
+        """Push the address of the item index of the array symbol_name, less the constant offset returned, which is left to the index of the that segment"""
+        base, offset = split_array_offset(index)
+        self.write_push_variable(symbol_name)
+        if base is not None:
+            self.write_expression(base)
+            self.vm_writer.write_arithmetic('add')
+        return offset
+
+    def write_string_constant(self, string):
+        """Push the string constant, a new String object every time it is evaluated"""
+        # Build string using OS String: String.new(length), String.appendChar(nextChar)
+        self.vm_writer.write_push('constant', len(string))
+        self.vm_writer.write_call('String.new', 1)
+        for char in string:
+            self.vm_writer.write_push('constant', ord(char))
+            self.vm_writer.write_call('String.appendChar', 2)
+
+    def write_pooled_string_constant(self, string):
+        """
+        Push the string constant passed straight as the argument of a call, as in Output.printString("Score: "). Each distinct string constant of the class passed so is built once, when it is first used, and kept in a static variable added after the static variables of the class, so such a call does not leak a new String every time it is made. A string constant which is assigned or returned may be disposed by the code it is given to, which the compiler cannot see, so it is built anew by write_string_constant every time it is evaluated.
+        code:
+            "Hi"
+        vm:
+            push static N
+            if-goto STRING_POOLED_MAIN_1
+            push constant 2
+            call String.new 1
+            push constant 72
+            call String.appendChar 2
+            push constant 105
+            call String.appendChar 2
+            pop static N
+            label STRING_POOLED_MAIN_1
+            push static N
+        """
+        if string not in self.string_pool:
+            # All the static variables of the class are declared before its subroutines, so their number is final here
+            self.string_pool[string] = self.symbol_table.count_symbol_by_kind('STATIC') + len(self.string_pool)
+        static_index = self.string_pool[string]
+        self.string_label_index += 1
+        string_pooled_label_name = 'STRING_POOLED_{}_{}'.format(self.class_name.upper(), self.string_label_index)
+        self.vm_writer.write_push('static', static_index)
+        self.vm_writer.write_if_goto(string_pooled_label_name)
+        self.write_string_constant(string)
+        self.vm_writer.write_pop('static', static_index)
+        self.vm_writer.write_label(string_pooled_label_name)
+        self.vm_writer.write_push('static', static_index)
+
+    def write_push_variable(self, symbol_name):
+        """Push the value of variable to working stack"""
+        index = self.symbol_table.get_symbol_index(symbol_name)
+        symbol_kind = self.symbol_table.get_symbol_kind(symbol_name)
+        segment = self.segment_dict[symbol_kind]
+        self.vm_writer.write_push(segment, index)
+
+    def write_pop_variable(self, symbol_name):
+        """Pop the top value of the working stack to variable"""
+        index = self.symbol_table.get_symbol_index(symbol_name)
+        symbol_kind = self.symbol_table.get_symbol_kind(symbol_name)
+        segment = self.segment_dict[symbol_kind]
+        self.vm_writer.write_pop(segment, index)
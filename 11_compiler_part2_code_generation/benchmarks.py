@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+
+import time
+import tracemalloc
+import tempfile
+from pathlib import Path
+
+from JackCompiler import create_pass_manager
+from JackTokenizer import JackTokenizer
+from CompilationEngine import CompilationEngine
+from SymbolTable import SymbolTable
+from VMCodeGenerator import VMCodeGenerator
+
+def compile_tokens(tokens, jackfile):
+    """Parse, optimize and generate the vm code of the class of tokens"""
+    class_node = create_pass_manager().run(CompilationEngine(tokens, jackfile).compile())
+    VMCodeGenerator(jackfile.with_suffix('.vm')).generate(class_node)
+
+def generate_jack_class(class_name, subroutines_num):
+    """Generate the source of a machine-generated Jack class with subroutines_num similar subroutines"""
+    lines = ['class {} {{'.format(class_name), '    static int total;']
+    for i in range(subroutines_num):
+        lines += [
+                '    function int f{}(int x, int y) {{'.format(i),
+                '        var int a, b;',
+                '        let a = x + {};'.format(i),
+                '        let b = (a * y) - (x / 2);',
+                '        if (a < b) {',
+                '            let total = total + a;',
+                '        }',
+                '        while (b > 0) {',
+                '            let b = b - 1;',
+                '        }',
+                '        return a + b;',
+                '    }',
+                ]
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def generate_jack_class_with_locals(class_name, locals_num):
+    """Generate the source of a Jack class with one function declaring locals_num local variables, and using each of them once"""
+    lines = ['class {} {{'.format(class_name), '    function int f() {']
+    lines += ['        var int v{};'.format(i) for i in range(locals_num)]
+    lines += ['        let v{} = {};'.format(i, i % 100) for i in range(locals_num)]
+    lines += ['        return v0;', '    }', '}']
+    return '\n'.join(lines) + '\n'
+
+def benchmark_symbol_table():
+    """Define thousands of locals per subroutine, the time per local should stay flat if defining a symbol is O(1)"""
+    print('Symbol table time by locals per subroutine:')
+    for locals_num in (1000, 2000, 4000, 8000):
+        symbol_table = SymbolTable()
+        names = ['v{}'.format(i) for i in range(locals_num)]
+        start = time.perf_counter()
+        for subroutine in range(10):
+            symbol_table.start_subroutine()
+            for name in names:
+                symbol_table.define(name, 'int', 'VAR')
+            for name in names:
+                symbol_table.get_symbol_index(name)
+        elapsed = time.perf_counter() - start
+        print('\t{:>6} locals: {:8.3f} s, {:6.2f} us/local'.format(locals_num, elapsed, elapsed / (10 * locals_num) * 1e6))
+    print('Compile time by locals per subroutine:')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for locals_num in (1000, 2000, 4000, 8000):
+            jackfile = Path(tmp_dir) / 'Main.jack'
+            jackfile.write_text(generate_jack_class_with_locals('Main', locals_num))
+            tokens = list(JackTokenizer(jackfile).tokenize())
+            start = time.perf_counter()
+            compile_tokens(tokens, jackfile)
+            elapsed = time.perf_counter() - start
+            print('\t{:>6} locals: {:8.3f} s, {:6.2f} us/local'.format(locals_num, elapsed, elapsed / locals_num * 1e6))
+
+def generate_jack_lookup_table_class(class_name, entries_num):
+    """Generate the source of a machine-generated Jack lookup table class, one line per entry of the table"""
+    lines = ['class {} {{'.format(class_name), '    static Array table;', '    function void init() {', '        let table = Array.new({});'.format(entries_num)]
+    lines += ['        let table[{}] = {};'.format(i, i * 7 % 32768) for i in range(entries_num)]
+    lines += ['        return;', '    }', '}']
+    return '\n'.join(lines) + '\n'
+
+def measure_compile_memory(jackfile):
+    """Compile jackfile, returns the time it took and the peak memory allocated meanwhile, in bytes"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    compile_tokens(JackTokenizer(jackfile).tokenize(), jackfile)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def benchmark_compile_memory():
+    """Compile classes of growing length, the tokens are consumed as they are scanned and each subroutine is generated before the next one is parsed, so the peak memory is the source text, which the tokenizer reads whole, and the abstract syntax tree of the largest subroutine: it grows with the source text only for classes of many subroutines, but with the whole tree of a lookup table class, made of one subroutine"""
+    print('Compile peak memory by class length:')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        jackfile = Path(tmp_dir) / 'Table.jack'
+        for subroutines_num in (1000, 2000, 4000):
+            jackfile.write_text(generate_jack_class('Table', subroutines_num))
+            elapsed, peak = measure_compile_memory(jackfile)
+            print('\t{:>6} lines in {:>4} subroutines: {:8.3f} s, {:8.1f} KiB peak'.format(12 * subroutines_num + 3, subroutines_num, elapsed, peak / 1024))
+        for entries_num in (12500, 25000, 50000):
+            jackfile.write_text(generate_jack_lookup_table_class('Table', entries_num))
+            elapsed, peak = measure_compile_memory(jackfile)
+            print('\t{:>6} lines in one subroutine: {:8.3f} s, {:8.1f} KiB peak'.format(entries_num, elapsed, peak / 1024))
+
+def benchmark_compile_time():
+    """Compile generated classes of growing size, the time per token should stay flat if compile time grows linearly with class size"""
+    print('Compile time by class size:')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for subroutines_num in (100, 200, 400, 800):
+            jackfile = Path(tmp_dir) / 'Main.jack'
+            jackfile.write_text(generate_jack_class('Main', subroutines_num))
+            tokens = list(JackTokenizer(jackfile).tokenize())
+            tokens_num = len(tokens)
+            start = time.perf_counter()
+            compile_tokens(tokens, jackfile)
+            elapsed = time.perf_counter() - start
+            print('\t{:>6} tokens: {:8.3f} s, {:6.2f} us/token'.format(tokens_num, elapsed, elapsed / tokens_num * 1e6))
+
+def benchmark_tokenize_time():
+    """Tokenize a large generated class"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        jackfile = Path(tmp_dir) / 'Main.jack'
+        jackfile.write_text(generate_jack_class('Main', 2000))
+        start = time.perf_counter()
+        tokens_num = sum(1 for token in JackTokenizer(jackfile).tokenize())
+        elapsed = time.perf_counter() - start
+        print('Tokenize time: {} tokens in {:.3f} s, {:.0f} tokens/s'.format(tokens_num, elapsed, tokens_num / elapsed))
+
+def main():
+    benchmark_tokenize_time()
+    benchmark_compile_time()
+    benchmark_symbol_table()
+    benchmark_compile_memory()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/python3
+
+import unittest
+import tempfile
+import threading
+from pathlib import Path
+
+from JackCompiler import compile_jack, compile_path
+from JackTokenizer import JackTokenizer
+from JackServer import JackServer, JackToolchain, send_request
+from JackAST import LetStatement, IfStatement, WhileStatement, DoStatement, ReturnStatement
+from ConstantFolder import ConstantFolder
+from DeadCodeEliminator import DeadCodeEliminator
+from benchmarks import generate_jack_class, generate_jack_lookup_table_class, measure_compile_memory
+
+def wrap_int16(value):
+    return (value + 0x8000 & 0xFFFF) - 0x8000
+
+def compile_source(source):
+    """Compile the source of the class Main, returns its vm commands"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        jackfile = Path(tmp_dir) / 'Main.jack'
+        jackfile.write_text(source)
+        compile_jack(jackfile)
+        return jackfile.with_suffix('.vm').read_text().splitlines()
+
+def run_function(commands, function_name, arguments=(), callees=None):
+    """Run the vm function function_name of commands on arguments, the subroutines it calls being the functions of callees {name: function(*arguments)} or Math.multiply and Math.divide. Returns its returned value and the list of the names of the subroutines called, in order."""
+    callees = {
+            'Math.multiply': lambda x, y: x * y,
+            'Math.divide': lambda x, y: abs(x) // abs(y) * (1 if (x < 0) == (y < 0) else -1),
+            **(callees or {}),
+            }
+    start = commands.index(next(command for command in commands if command.startswith('function {} '.format(function_name))))
+    labels = {command.split()[1]: i for i, command in enumerate(commands) if command.startswith('label ')}
+    segments = {'argument': list(arguments), 'local': [0] * int(commands[start].split()[2]), 'temp': [0] * 8, 'static': [0] * 16}
+    binary_operators = {
+            'add': lambda x, y: x + y, 'sub': lambda x, y: x - y, 'and': lambda x, y: x & y, 'or': lambda x, y: x | y,
+            'eq': lambda x, y: -1 if x == y else 0, 'gt': lambda x, y: -1 if x > y else 0, 'lt': lambda x, y: -1 if x < y else 0,
+            }
+    stack = []
+    calls = []
+    pc = start + 1
+    while True:
+        words = commands[pc].split()
+        pc += 1
+        if words[0] == 'push':
+            stack.append(int(words[2]) if words[1] == 'constant' else segments[words[1]][int(words[2])])
+        elif words[0] == 'pop':
+            segments[words[1]][int(words[2])] = stack.pop()
+        elif words[0] in binary_operators:
+            y = stack.pop()
+            stack.append(wrap_int16(binary_operators[words[0]](stack.pop(), y)))
+        elif words[0] in {'neg', 'not'}:
+            stack.append(wrap_int16(-stack.pop() if words[0] == 'neg' else ~stack.pop()))
+        elif words[0] == 'call':
+            arguments_num = int(words[2])
+            call_arguments = stack[len(stack) - arguments_num:]
+            del stack[len(stack) - arguments_num:]
+            calls.append(words[1])
+            stack.append(wrap_int16(callees[words[1]](*call_arguments)))
+        elif words[0] == 'goto':
+            pc = labels[words[1]]
+        elif words[0] == 'if-goto':
+            if stack.pop() != 0:
+                pc = labels[words[1]]
+        elif words[0] == 'return':
+            return stack.pop(), calls
+
+class Tokenizer(unittest.TestCase):
+
+    def tokenize_source(self, source):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jackfile = Path(tmp_dir) / 'Main.jack'
+            jackfile.write_text(source)
+            return [token[0] for token in JackTokenizer(jackfile).tokenize()]
+
+    def test_long_tail_of_white_space_and_comments(self):
+        # The white space and comments at the end of the file are matched once, without backtracking, which used to take seconds for 20 trailing spaces
+        for tail in (' ' * 10000, '\n' * 10000, '\t \n' * 5000, '// comment\n' * 5000, '/* comment */ \n' * 5000, ' // a b c', '\n/* a b */ // c d'):
+            with self.subTest(tail=tail[:20]):
+                self.assertEqual(self.tokenize_source('class Main {}' + tail), ['class', 'Main', '{', '}'])
+
+    def test_comments_between_tokens(self):
+        self.assertEqual(self.tokenize_source('class /* a */ Main // b\n { /** c\n d */ }  '), ['class', 'Main', '{', '}'])
+
+    def test_unterminated_block_comment(self):
+        with self.assertRaises(SyntaxError):
+            self.tokenize_source('class Main { /* a' + ' ' * 1000)
+
+class ProgramIndexCalls(unittest.TestCase):
+    main_source = 'class Main { function void main() { var Foo f; let f = Foo.new(); do f.bar(1); do Foo.baz(1, 2); do Math.abs(1); return; } }'
+
+    def compile_program(self, foo_source, jobs):
+        """Compile the classes Main and Foo, whose subroutines other than its constructor new are foo_source"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            program_dir = Path(tmp_dir)
+            (program_dir / 'Main.jack').write_text(self.main_source)
+            (program_dir / 'Foo.jack').write_text('class Foo {{ constructor Foo new() {{ return this; }} {} }}'.format(foo_source))
+            compile_path(program_dir, jobs)
+
+    def test_calls_checked_against_declarations(self):
+        wrong_declarations = {
+                'method void bar(int a, int b) { return; } function void baz(int a, int b) { return; }': 'calls Foo.bar with 1 arguments, it takes 2',
+                'function void bar(int a) { return; } function void baz(int a, int b) { return; }': 'calls the function Foo.bar on an object',
+                'method void bar(int a) { return; } method void baz(int a, int b) { return; }': 'calls the method Foo.baz without an object',
+                'method void bar(int a) { return; }': 'calls Foo.baz, which is not declared',
+                }
+        for jobs in (1, 2):
+            self.compile_program('method void bar(int a) { return; } function void baz(int a, int b) { return; }', jobs)
+            for foo_source, message in wrong_declarations.items():
+                with self.subTest(jobs=jobs, message=message):
+                    with self.assertRaisesRegex(SyntaxError, 'Main.main: ' + message):
+                        self.compile_program(foo_source, jobs)
+
+    def test_calls_checked_against_cached_classes(self):
+        foo_source = 'class Foo { constructor Foo new() { return this; } method void bar(int a) { return; } function void %s(int a, int b) { return; } }'
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs), tempfile.TemporaryDirectory() as tmp_dir:
+                program_dir = Path(tmp_dir)
+                (program_dir / 'Main.jack').write_text(self.main_source)
+                (program_dir / 'Foo.jack').write_text(foo_source % 'baz')
+                compile_path(program_dir, jobs)
+                # Only the callee changes, Main is up to date
+                (program_dir / 'Foo.jack').write_text(foo_source % 'qux')
+                with self.assertRaisesRegex(SyntaxError, 'Main.main: calls Foo.baz, which is not declared'):
+                    compile_path(program_dir, jobs)
+                with self.assertRaisesRegex(SyntaxError, 'Main.main: calls Foo.baz, which is not declared'):
+                    compile_path(program_dir, jobs)
+                # Only the caller changes, Foo is up to date
+                (program_dir / 'Main.jack').write_text(self.main_source.replace('Foo.baz', 'Foo.qux'))
+                self.assertEqual(sorted(jackfile.name for jackfile in compile_path(program_dir, jobs)), ['Foo.jack', 'Main.jack'])
+                self.assertEqual(compile_path(program_dir, jobs), [])
+                (program_dir / 'Main.jack').write_text(self.main_source.replace('Foo.baz(1, 2)', 'Foo.qux(1)'))
+                with self.assertRaisesRegex(SyntaxError, 'Main.main: calls Foo.qux with 1 arguments, it takes 2'):
+                    compile_path(program_dir, jobs)
+
+class Server(unittest.TestCase):
+
+    def test_error_answered_and_connection_kept(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            nested_dir = tmp_dir / 'Nested'
+            nested_dir.mkdir()
+            (nested_dir / 'Main.jack').write_text('class Main {{ function int f() {{ return {}1{}; }} }}'.format('(' * 5000, ')' * 5000))
+            program_dir = tmp_dir / 'Program'
+            program_dir.mkdir()
+            (program_dir / 'Main.jack').write_text('class Main { function int f() { return 1; } }')
+            socket_path = tmp_dir / 'jack.sock'
+            with JackServer(socket_path) as server:
+                server_thread = threading.Thread(target=server.serve_forever)
+                server_thread.start()
+                try:
+                    response = send_request(socket_path, 'compile', nested_dir)
+                    self.assertFalse(response['ok'])
+                    self.assertTrue(response['error'].startswith('RecursionError'))
+                    self.assertEqual(send_request(socket_path, 'compile', program_dir)['compiled'], ['Main.jack'])
+                finally:
+                    server.shutdown()
+                    server_thread.join()
+
+    def test_vanished_file_not_scanned(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            (tmp_dir / 'Main.jack').write_text('class Main {}')
+            (tmp_dir / 'Gone.jack').symlink_to(tmp_dir / 'Deleted.jack')	# Listed by glob, but stat fails as for a file deleted meanwhile
+            self.assertEqual(list(JackToolchain().scan_mtimes(tmp_dir)), ['Main.jack'])
+
+class StrengthReduction(unittest.TestCase):
+
+    def check_products(self, expression_format, multipliers):
+        """Compile Main.g returning the expression expression_format.format(multiplier), in which the call Main.f() returns 7, and check its value for each multiplier, Main.f being called once"""
+        for multiplier in multipliers:
+            with self.subTest(expression=expression_format.format(multiplier)):
+                source = 'class Main {{ function int g() {{ return {}; }} }}'.format(expression_format.format(multiplier))
+                value, calls = run_function(compile_source(source), 'Main.g', callees={'Main.f': lambda: 7})
+                self.assertEqual(value, wrap_int16(7 * multiplier))
+                self.assertEqual(calls.count('Main.f'), 1)
+
+    def test_call_multiplied_by_constant(self):
+        self.check_products('Main.f() * {}', [0, 1, -1] + list(range(-20, 21)) + [255, 256, 1000, -1000, 32767])
+
+    def test_constant_multiplied_by_call(self):
+        self.check_products('{} * Main.f()', [0, 1, -1] + list(range(-20, 21)) + [255, 256, 1000, -1000, 32767])
+
+    def test_call_multiplied_by_zero_is_run(self):
+        for expression in ('Main.f() * 0', '0 * Main.f()'):
+            with self.subTest(expression=expression):
+                commands = compile_source('class Main {{ function int g() {{ var int x; let x = {}; return x; }} }}'.format(expression))
+                self.assertEqual(commands[1:5], ['call Main.f 0', 'pop temp 0', 'push constant 0', 'pop local 0'])
+
+    def test_variable_multiplied_by_constant(self):
+        for multiplier in range(-40, 41):
+            with self.subTest(multiplier=multiplier):
+                source = 'class Main {{ function int g(int x) {{ return x * {}; }} }}'.format(multiplier)
+                for x in (0, 1, -3, 123, -32768, 32767):
+                    value, calls = run_function(compile_source(source), 'Main.g', [x])
+                    self.assertEqual(value, wrap_int16(x * multiplier))
+
+    def test_masked_divided_by_power_of_two(self):
+        for k in range(1, 15):
+            source = 'class Main {{ function int g(int x) {{ return (x & 32767) / {}; }} }}'.format(1 << k)
+            commands = compile_source(source)
+            for x in (0, 1, 5, 1000, 32767, -1):
+                with self.subTest(k=k, x=x):
+                    value, calls = run_function(commands, 'Main.g', [x])
+                    self.assertEqual(value, (x & 32767) >> k)
+                    self.assertNotIn('Math.divide', calls)
+
+class StringConstants(unittest.TestCase):
+    source = '''class Main {
+        function String h() { return "ab"; }
+        function int g() {
+            var String s; var int i;
+            while (i < 2) {
+                let s = "-32123";
+                do Output.printString(s);
+                do s.dispose();
+                do Output.printString("Score: ");
+                do Output.printString(Main.h());
+                let i = i + 1;
+            }
+            return 0;
+        }
+    }'''
+
+    def run_g(self):
+        """Run Main.g on a heap of Strings, returns the Strings printed, as (address, characters, is disposed), and the number of Strings built"""
+        strings = {}	# {address: [characters, is disposed]}
+        printed = []
+        commands = compile_source(self.source)
+        def string_new(length):
+            strings[len(strings) + 1] = [[], False]
+            return len(strings)
+        def append_char(address, char):
+            strings[address][0].append(chr(char))
+            return address
+        def dispose(address):
+            strings[address][1] = True
+            return 0
+        def print_string(address):
+            printed.append((address, ''.join(strings[address][0]), strings[address][1]))
+            return 0
+        callees = {
+                'String.new': string_new, 'String.appendChar': append_char, 'String.dispose': dispose, 'Output.printString': print_string,
+                'Main.h': lambda: run_function(commands, 'Main.h', callees=callees)[0],
+                }
+        run_function(commands, 'Main.g', callees=callees)
+        return printed, len(strings)
+
+    def test_disposed_constant_evaluated_again(self):
+        printed, strings_num = self.run_g()
+        self.assertEqual([(characters, is_disposed) for address, characters, is_disposed in printed], [('-32123', False), ('Score: ', False), ('ab', False)] * 2)
+        self.assertNotEqual(printed[0][0], printed[3][0])	# A new String each time the assigned constant is evaluated
+        self.assertNotEqual(printed[2][0], printed[5][0])	# And the returned one
+        self.assertEqual(printed[1][0], printed[4][0])	# The constant passed to a call is built once
+        self.assertEqual(strings_num, 5)
+
+class ConstantFolderTest(unittest.TestCase):
+    x = ('variable', 'x')
+    call = ('call', 'Main.f', None, [])
+
+    def fold(self, expression):
+        return ConstantFolder().fold_expression(expression)
+
+    def binary(self, op, lhs, rhs):
+        return ('binary', op, lhs, rhs)
+
+    def test_constants(self):
+        expressions = {	# {(op, x, y): value}, with the 16-bit wraparound and Math.divide rounding toward 0
+                ('+', 32767, 1): -32768, ('-', -32768, 1): 32767, ('*', 300, 300): 24464, ('*', -7, 6): -42,
+                ('/', 7, 2): 3, ('/', -7, 2): -3, ('/', 7, -2): -3, ('/', -7, -2): 3,
+                ('&', 12, 10): 8, ('|', 12, 10): 14, ('<', 1, 2): -1, ('>', 1, 2): 0, ('=', 3, 3): -1,
+                }
+        for (op, x, y), value in expressions.items():
+            with self.subTest(op=op, x=x, y=y):
+                self.assertEqual(self.fold(self.binary(op, ('constant', x), ('constant', y))), ('constant', value))
+        self.assertEqual(self.fold(('unary', '-', ('constant', -32768))), ('constant', -32768))
+        self.assertEqual(self.fold(('unary', '~', self.binary('+', ('constant', 1), ('constant', 2)))), ('constant', -4))
+
+    def test_division_by_zero_left(self):
+        expression = self.binary('/', ('constant', 1), ('constant', 0))
+        self.assertEqual(self.fold(expression), expression)
+
+    def test_identities(self):
+        x = self.x
+        expressions = {
+                self.binary('+', x, ('constant', 0)): x, self.binary('-', x, ('constant', 0)): x, self.binary('+', ('constant', 0), x): x,
+                self.binary('*', x, ('constant', 1)): x, self.binary('*', ('constant', 1), x): x, self.binary('/', x, ('constant', 1)): x,
+                self.binary('|', x, ('constant', 0)): x, self.binary('&', x, ('constant', -1)): x, self.binary('&', ('constant', -1), x): x,
+                self.binary('*', x, ('constant', 0)): ('constant', 0), self.binary('&', ('constant', 0), x): ('constant', 0), self.binary('|', x, ('constant', -1)): ('constant', -1),
+                ('unary', '-', ('unary', '-', x)): x, ('unary', '~', ('unary', '~', x)): x,
+                self.binary('-', ('constant', 0), x): ('unary', '-', x),
+                self.binary('*', ('constant', 5), x): self.binary('*', x, ('constant', 5)),
+                self.binary('-', self.binary('+', x, ('constant', 3)), ('constant', 5)): self.binary('-', x, ('constant', 2)),
+                self.binary('+', self.binary('-', x, ('constant', 3)), ('constant', 3)): x,
+                self.binary('+', self.binary('+', x, ('constant', 2)), self.binary('*', ('constant', 2), ('constant', 3))): self.binary('+', x, ('constant', 8)),
+                }
+        for expression, folded_expression in expressions.items():
+            with self.subTest(expression=expression):
+                self.assertEqual(self.fold(expression), folded_expression)
+
+    def test_calls_kept(self):
+        # A call is run for its side effects, even when its value is not needed
+        for expression in (self.binary('*', self.call, ('constant', 0)), self.binary('&', ('constant', 0), self.call), self.binary('|', self.call, ('constant', -1))):
+            with self.subTest(expression=expression):
+                self.assertEqual(self.fold(expression), expression)
+
+    def test_long_chain(self):
+        expression = ('constant', 0)
+        for i in range(5000):
+            expression = self.binary('+', expression, ('constant', 1))
+        self.assertEqual(self.fold(expression), ('constant', 5000))
+
+    def test_program(self):
+        value, calls = run_function(compile_source('class Main { function int g(int x) { return ((x + 3) - 5) * 1 + (2 * 3) - (0 - x) + (32767 + 1); } }'), 'Main.g', [10])
+        self.assertEqual(value, wrap_int16(10 - 2 + 6 + 10 - 32768))
+        self.assertEqual(calls, [])
+
+class DeadCodeEliminatorTest(unittest.TestCase):
+
+    def eliminate(self, statements):
+        return DeadCodeEliminator().eliminate_statements(statements)
+
+    def test_constant_if(self):
+        do_f = DoStatement(('call', 'Main.f', None, []))
+        do_g = DoStatement(('call', 'Main.g', None, []))
+        self.assertEqual(self.eliminate([IfStatement(('constant', -1), [do_f], [do_g])]), [do_f])
+        self.assertEqual(self.eliminate([IfStatement(('constant', 0), [do_f], [do_g])]), [do_g])
+        self.assertEqual(self.eliminate([IfStatement(('constant', 1), [do_f], [])]), [])	# Not true, ~1 is not 0
+        if_statement = IfStatement(('variable', 'x'), [IfStatement(('constant', 0), [do_f], [])], [do_g])
+        self.assertEqual(self.eliminate([if_statement]), [if_statement])
+        self.assertEqual(if_statement.statements, [])
+
+    def test_constant_while(self):
+        let_statement = LetStatement('x', None, ('constant', 1))
+        self.assertEqual(self.eliminate([WhileStatement(('constant', 0), [let_statement]), let_statement]), [let_statement])
+        return_statement = ReturnStatement(None)
+        while_statement = WhileStatement(('constant', -1), [let_statement, return_statement, let_statement])
+        self.assertEqual(self.eliminate([while_statement]), [while_statement])
+        self.assertEqual(while_statement.statements, [let_statement, return_statement])
+
+    def test_after_return(self):
+        return_statement = ReturnStatement(('constant', 1))
+        let_statement = LetStatement('x', None, ('constant', 1))
+        self.assertEqual(self.eliminate([let_statement, return_statement, let_statement]), [let_statement, return_statement])
+        # A return left by an if on a constant ends the statements too
+        self.assertEqual(self.eliminate([IfStatement(('constant', -1), [return_statement], []), let_statement]), [return_statement])
+        if_statement = IfStatement(('variable', 'x'), [return_statement], [])
+        self.assertEqual(self.eliminate([if_statement, let_statement]), [if_statement, let_statement])
+
+    def test_program(self):
+        commands = compile_source('''class Main {
+            function int g(int x) {
+                if ((1 + 1) = 2) { let x = x + 1; } else { do Main.f(); }
+                while (false) { do Main.f(); }
+                if (x > 0) { return x; }
+                return -x;
+                do Main.f();
+            }
+        }''')
+        self.assertNotIn('call Main.f 0', commands)
+        self.assertEqual(sum(1 for command in commands if command.startswith('if-goto')), 1)
+        self.assertEqual(run_function(commands, 'Main.g', [4])[0], 5)
+        self.assertEqual(run_function(commands, 'Main.g', [-4])[0], 3)
+
+class CompileMemory(unittest.TestCase):
+
+    def measure_peak_growth(self, generate_source, sizes):
+        """Compile the classes generate_source(size) of both sizes, returns the growth of the peak memory and of the source text in bytes"""
+        peaks = []
+        source_lengths = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jackfile = Path(tmp_dir) / 'Table.jack'
+            for size in sizes:
+                jackfile.write_text(generate_source(size))
+                peaks.append(measure_compile_memory(jackfile)[1])
+                source_lengths.append(jackfile.stat().st_size)
+        return peaks[1] - peaks[0], source_lengths[1] - source_lengths[0]
+
+    def test_subroutines_freed_once_generated(self):
+        # The tree of each subroutine is freed before the next one is parsed, so the peak grows with the source text only, which the tokenizer reads whole, decoded from the bytes read: the tree of the whole class took 12 bytes per byte of source
+        peak_growth, source_growth = self.measure_peak_growth(lambda subroutines_num: generate_jack_class('Table', subroutines_num), (200, 800))
+        self.assertLess(peak_growth, 3 * source_growth)
+
+    def test_tree_of_one_subroutine_held(self):
+        # The trade-off of optimizing whole subroutines: the tree of a subroutine is held until its vm code is generated, about 330 bytes per statement of a lookup table
+        peak_growth, source_growth = self.measure_peak_growth(lambda entries_num: generate_jack_lookup_table_class('Table', entries_num), (2000, 8000))
+        self.assertLess(peak_growth / 6000, 512)
+
+if __name__ == '__main__':
+    unittest.main()